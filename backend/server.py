@@ -1,15 +1,20 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, BackgroundTasks, Query, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, BackgroundTasks, Query, UploadFile, File, Form, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from bson import Int64
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 import uuid
+from email.utils import formatdate, parsedate_to_datetime
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
@@ -17,7 +22,19 @@ import httpx
 import aiofiles
 import asyncio
 import json
+import re
+import calendar
 import base64
+import hmac
+import math
+import hashlib
+import importlib.util
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 # Amadeus and SendGrid
 from amadeus import Client as AmadeusClient, ResponseError as AmadeusResponseError
@@ -37,6 +54,18 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'travel_tours_secret_key_2024')
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24 * 7  # 7 days
 
+# Password hashing: bcrypt work factor and the pool that runs it off the event loop
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+BCRYPT_MAX_WORKERS = int(os.environ.get('BCRYPT_MAX_WORKERS', str(min(4, os.cpu_count() or 1))))
+BCRYPT_MAX_PENDING = int(os.environ.get('BCRYPT_MAX_PENDING', '64'))
+
+# Stateless sessions: signed, self-describing session cookies checked without Mongo
+STATELESS_SESSIONS = os.environ.get('STATELESS_SESSIONS', 'false').lower() == 'true'
+SESSION_SIGNING_KEY = os.environ.get('SESSION_SIGNING_KEY', JWT_SECRET).encode()
+SESSION_TTL_DAYS = 7
+SESSION_REVOCATION_SYNC_SECONDS = float(os.environ.get('SESSION_REVOCATION_SYNC_SECONDS', '5'))
+SESSION_REVOCATION_CAPACITY = int(os.environ.get('SESSION_REVOCATION_CAPACITY', '100000'))
+
 # Amadeus Client
 amadeus_client = None
 AMADEUS_API_KEY = os.environ.get('AMADEUS_API_KEY')
@@ -52,6 +81,424 @@ if AMADEUS_API_KEY and AMADEUS_API_SECRET:
     except Exception as e:
         logging.error(f"Failed to initialize Amadeus client: {e}")
 
+# Circuit breakers: fail fast to local fallbacks while an upstream is unhealthy
+CIRCUIT_WINDOW_SIZE = int(os.environ.get('CIRCUIT_WINDOW_SIZE', '50'))
+CIRCUIT_MIN_CALLS = int(os.environ.get('CIRCUIT_MIN_CALLS', '10'))
+CIRCUIT_FAILURE_RATE = float(os.environ.get('CIRCUIT_FAILURE_RATE', '0.5'))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get('CIRCUIT_OPEN_SECONDS', '30'))
+CIRCUIT_TIMEOUT_MULTIPLIER = float(os.environ.get('CIRCUIT_TIMEOUT_MULTIPLIER', '3'))
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+class CircuitBreaker:
+    """Rolling-window breaker with latency percentiles and a p95-derived timeout"""
+
+    def __init__(self, name: str, min_timeout: float, max_timeout: float):
+        self.name = name
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._lock = threading.Lock()
+        self._window = deque(maxlen=CIRCUIT_WINDOW_SIZE)
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._rejected = 0
+        self._trips = 0
+
+    def allow(self) -> bool:
+        """True if a call may go upstream; half-open admits a single probe"""
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= CIRCUIT_OPEN_SECONDS:
+                self._state = "half_open"
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, ok: bool, latency: float):
+        with self._lock:
+            if self._state == "half_open":
+                self._probe_in_flight = False
+                if ok:
+                    self._state = "closed"
+                    self._window.clear()
+                else:
+                    self._trip()
+                    return
+            self._window.append((ok, latency))
+            if self._state == "closed" and len(self._window) >= CIRCUIT_MIN_CALLS:
+                failures = sum(1 for success, _ in self._window if not success)
+                if failures / len(self._window) >= CIRCUIT_FAILURE_RATE:
+                    self._trip()
+
+    def _trip(self):
+        self._state = "open"
+        self._opened_at = time.monotonic()
+        self._trips += 1
+        logger.warning(f"Circuit {self.name} opened")
+
+    def _percentile(self, latencies: list, pct: float) -> Optional[float]:
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * pct))]
+
+    def timeout(self) -> float:
+        """Deadline for the next call: a multiple of recent p95, within [min, max]"""
+        with self._lock:
+            latencies = sorted(latency for ok, latency in self._window if ok)
+        if len(latencies) < CIRCUIT_MIN_CALLS:
+            return self.max_timeout
+        p95 = self._percentile(latencies, 0.95)
+        return min(self.max_timeout, max(self.min_timeout, p95 * CIRCUIT_TIMEOUT_MULTIPLIER))
+
+    async def run(self, fn, *args, timeout: Optional[float] = None, **kwargs):
+        """Await fn(*args) under the breaker and its adaptive deadline"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(*args, **kwargs), timeout or self.timeout())
+        except BaseException:
+            self.record(False, time.monotonic() - started)
+            raise
+        self.record(True, time.monotonic() - started)
+        return result
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def stats(self) -> dict:
+        with self._lock:
+            window = list(self._window)
+            state = self._state
+            rejected, trips = self._rejected, self._trips
+        latencies = sorted(latency for _, latency in window)
+        failures = sum(1 for ok, _ in window if not ok)
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+        return {
+            "state": state,
+            "window_calls": len(window),
+            "error_rate": round(failures / len(window), 3) if window else 0.0,
+            "latency_p50_ms": ms(self._percentile(latencies, 0.5)),
+            "latency_p95_ms": ms(self._percentile(latencies, 0.95)),
+            "latency_p99_ms": ms(self._percentile(latencies, 0.99)),
+            "timeout_seconds": round(self.timeout(), 3),
+            "rejected": rejected,
+            "trips": trips
+        }
+
+# Amadeus SDK calls are blocking, so they run on a dedicated, bounded pool
+AMADEUS_MAX_WORKERS = int(os.environ.get('AMADEUS_MAX_WORKERS', '8'))
+AMADEUS_TIMEOUT_SECONDS = float(os.environ.get('AMADEUS_TIMEOUT_SECONDS', '8'))
+
+class AmadeusAdapter:
+    """Runs synchronous Amadeus SDK calls off the event loop with a deadline"""
+
+    def __init__(self, max_workers: int, timeout: float, breaker: CircuitBreaker):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.breaker = breaker
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="amadeus")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._errors = 0
+        self._timeouts = 0
+
+    def _run(self, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    async def call(self, fn, *args, timeout: Optional[float] = None, **kwargs):
+        """Run fn in the pool; raises asyncio.TimeoutError once the deadline passes
+        and CircuitOpenError without calling Amadeus while its breaker is open"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("amadeus circuit is open")
+        with self._lock:
+            self._queued += 1
+        started = time.monotonic()
+        future = self._executor.submit(self._run, fn, args, kwargs)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.breaker.timeout())
+        except asyncio.TimeoutError:
+            # A queued call that never started is dropped; a running one finishes in the background
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            with self._lock:
+                self._timeouts += 1
+            self.breaker.record(False, time.monotonic() - started)
+            raise
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            # 4xx responses are bad input, not an unhealthy upstream
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            self.breaker.record(status is not None and status < 500, time.monotonic() - started)
+            raise
+        except asyncio.CancelledError:
+            # Still settle the call, or a cancelled half-open probe would wedge the breaker
+            self.breaker.record(False, time.monotonic() - started)
+            raise
+        self.breaker.record(True, time.monotonic() - started)
+        with self._lock:
+            self._completed += 1
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "timeout_seconds": self.timeout,
+                "queue_depth": self._queued,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "errors": self._errors,
+                "timeouts": self._timeouts
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+amadeus_breaker = CircuitBreaker("amadeus", 1.0, AMADEUS_TIMEOUT_SECONDS)
+amadeus_adapter = AmadeusAdapter(AMADEUS_MAX_WORKERS, AMADEUS_TIMEOUT_SECONDS, amadeus_breaker)
+
+# Outbound HTTP (OAuth, Paystack): one long-lived client per upstream host
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '20'))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', '10'))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY_SECONDS', '60'))
+HTTP_TIMEOUT_SECONDS = float(os.environ.get('HTTP_TIMEOUT_SECONDS', '30'))
+
+class HTTPClientPool:
+    """Application-lifetime httpx clients, one connection pool per host"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        # HTTP/2 needs the optional h2 package
+        self.http2 = importlib.util.find_spec("h2") is not None
+
+    def get(self, host: str) -> httpx.AsyncClient:
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=HTTP_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+                )
+            )
+            self._clients[host] = client
+        return client
+
+    def stats(self) -> dict:
+        return {"http2": self.http2, "hosts": sorted(self._clients)}
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+http_clients = HTTPClientPool()
+
+LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', '90'))
+
+paystack_breaker = CircuitBreaker("paystack", 2.0, HTTP_TIMEOUT_SECONDS)
+sendgrid_breaker = CircuitBreaker("sendgrid", 2.0, HTTP_TIMEOUT_SECONDS)
+llm_breaker = CircuitBreaker("llm", 10.0, LLM_TIMEOUT_SECONDS)
+circuit_breakers = {
+    breaker.name: breaker
+    for breaker in (amadeus_breaker, paystack_breaker, sendgrid_breaker, llm_breaker)
+}
+
+class SingleFlight:
+    """Coalesces concurrent identical calls onto one shared in-flight future"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._stats = {"calls": 0, "shared": 0}
+
+    def _forget(self, key: str, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # Mark the result as retrieved even if every waiter went away
+        if not future.cancelled():
+            future.exception()
+
+    async def do(self, key: str, fetch):
+        self._stats["calls"] += 1
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fetch())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+        else:
+            self._stats["shared"] += 1
+        # Shielded so one disconnecting client doesn't cancel the call for everyone else
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        return {**self._stats, "in_flight": len(self._calls)}
+
+upstream_searches = SingleFlight()
+
+# Search result caching
+FLIGHT_CACHE_MAX_ENTRIES = int(os.environ.get('FLIGHT_CACHE_MAX_ENTRIES', '2048'))
+FLIGHT_CACHE_TTL_SECONDS = float(os.environ.get('FLIGHT_CACHE_TTL_SECONDS', '300'))
+FLIGHT_CACHE_STALE_SECONDS = float(os.environ.get('FLIGHT_CACHE_STALE_SECONDS', '600'))
+FLIGHT_CACHE_MONGO = os.environ.get('FLIGHT_CACHE_MONGO', 'false').lower() == 'true'
+
+class ResultCache:
+    """In-process LRU cache with TTL, stale-while-revalidate and an optional Mongo tier"""
+
+    def __init__(self, name: str, max_entries: int, ttl: float, stale_ttl: float = 0,
+                 collection=None, cacheable=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.collection = collection
+        self.cacheable = cacheable or (lambda value: value is not None)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._index_ready = False
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "mongo_hits": 0,
+                       "refreshes": 0, "refresh_errors": 0, "evictions": 0}
+
+    def _remember(self, key: str, value, stored_at: float):
+        self._entries[key] = (value, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    async def _load_remote(self, key: str) -> Optional[tuple]:
+        if self.collection is None:
+            return None
+        try:
+            doc = await self.collection.find_one({"key": key}, {"_id": 0, "value": 1, "stored_at": 1})
+        except Exception as e:
+            logger.error(f"{self.name} cache read failed: {e}")
+            return None
+        if not doc:
+            return None
+        return doc["value"], doc["stored_at"]
+
+    async def _store(self, key: str, value):
+        stored_at = time.time()
+        self._remember(key, value, stored_at)
+        if self.collection is None:
+            return
+        try:
+            if not self._index_ready:
+                await self.collection.create_index("key", unique=True)
+                await self.collection.create_index("expires_at", expireAfterSeconds=0)
+                self._index_ready = True
+            await self.collection.update_one(
+                {"key": key},
+                {"$set": {
+                    "value": value,
+                    "stored_at": stored_at,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl + self.stale_ttl)
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"{self.name} cache write failed: {e}")
+
+    async def _fetch_and_store(self, key: str, fetch):
+        value = await fetch()
+        if self.cacheable(value):
+            await self._store(key, value)
+        return value
+
+    def _schedule_refresh(self, key: str, fetch):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self._fetch_and_store(key, fetch)
+                self._stats["refreshes"] += 1
+            except Exception as e:
+                self._stats["refresh_errors"] += 1
+                logger.error(f"{self.name} cache refresh failed for {key}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def get_or_fetch(self, key: str, fetch):
+        """Return a cached value, serving stale entries while one refresh runs in the background"""
+        entry = self._entries.get(key)
+        from_remote = False
+        if entry is None:
+            entry = await self._load_remote(key)
+            from_remote = entry is not None
+
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age <= self.ttl + self.stale_ttl:
+                if from_remote:
+                    self._stats["mongo_hits"] += 1
+                    self._remember(key, value, stored_at)
+                else:
+                    self._entries.move_to_end(key)
+                if age <= self.ttl:
+                    self._stats["hits"] += 1
+                else:
+                    self._stats["stale_hits"] += 1
+                    self._schedule_refresh(key, fetch)
+                return value
+            self._entries.pop(key, None)
+
+        self._stats["misses"] += 1
+        return await self._fetch_and_store(key, fetch)
+
+    def invalidate(self, key: Optional[str] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["stale_hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "stale_seconds": self.stale_ttl,
+            "mongo_tier": self.collection is not None,
+            "hit_ratio": round((self._stats["hits"] + self._stats["stale_hits"]) / lookups, 4) if lookups else 0.0
+        }
+
+flight_search_cache = ResultCache(
+    "flight_search",
+    FLIGHT_CACHE_MAX_ENTRIES,
+    FLIGHT_CACHE_TTL_SECONDS,
+    FLIGHT_CACHE_STALE_SECONDS,
+    collection=db.flight_search_cache if FLIGHT_CACHE_MONGO else None,
+    # Don't pin the local fallback in place of live fares while Amadeus is configured
+    cacheable=lambda result: result.get("source") == "amadeus" or amadeus_client is None
+)
+
 # SendGrid Client
 SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY')
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'noreply@fostertours.com')
@@ -146,6 +593,8 @@ class TokenResponse(BaseModel):
     user: UserResponse
 
 # Flight Models
+FLIGHT_PAGE_MAX = 100
+
 class FlightSearch(BaseModel):
     origin: str
     destination: str
@@ -153,6 +602,25 @@ class FlightSearch(BaseModel):
     return_date: Optional[str] = None
     passengers: int = 1
     cabin_class: str = "economy"
+    # Optional server-side filtering, sorting and pagination over the cached results
+    max_stops: Optional[int] = None
+    airlines: Optional[List[str]] = None
+    departure_time_from: Optional[str] = None  # HH:MM
+    departure_time_to: Optional[str] = None  # HH:MM
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    refundable: Optional[bool] = None
+    sort_by: Optional[str] = None  # price, duration, departure_time
+    sort_order: Literal["asc", "desc"] = "asc"
+    limit: Optional[int] = Field(default=None, ge=1, le=FLIGHT_PAGE_MAX)
+    cursor: Optional[str] = None
+
+class FlightCalendarSearch(BaseModel):
+    origin: str
+    destination: str
+    departure_date: str
+    window_days: int = 3
+    passengers: int = 1
 
 class Flight(BaseModel):
     flight_id: str
@@ -177,7 +645,14 @@ class HotelSearch(BaseModel):
     check_in: str
     check_out: str
     guests: int = 2
-    rooms: int = 1
+    rooms: int = Field(default=1, ge=1)
+
+class HotelAvailabilityRequest(BaseModel):
+    hotel_ids: List[str]
+    check_in: str
+    check_out: str
+    rooms: int = Field(default=1, ge=1)
+    room_types: Optional[List[str]] = None
 
 class Hotel(BaseModel):
     hotel_id: str
@@ -466,11 +941,74 @@ class UserLocation(BaseModel):
 
 # =============== HELPER FUNCTIONS ===============
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool and sheds load once too much work is queued"""
+
+    def __init__(self, rounds: int, max_workers: int, max_pending: int):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        # bcrypt releases the GIL, so threads hash in parallel
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._pending = 0
+        self._stats = {"hashed": 0, "verified": 0, "rejected": 0}
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            self._stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+        self._stats["hashed"] += 1
+        return hashed.decode('utf-8')
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        valid = await self._run(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+        self._stats["verified"] += 1
+        return valid
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True when the stored hash was made with a different work factor"""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def stats(self) -> dict:
+        return {**self._stats, "rounds": self.rounds, "max_workers": self.max_workers,
+                "pending": self._pending, "max_pending": self.max_pending}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher(BCRYPT_ROUNDS, BCRYPT_MAX_WORKERS, BCRYPT_MAX_PENDING)
+password_rehash_tasks: set = set()
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_hasher.verify(password, hashed)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def rehash_password(user_id: str, password: str, old_hash: str):
+    """Upgrade a stored hash to the current work factor after a successful login"""
+    try:
+        # Only replace the hash that was verified, so a password change made meanwhile wins
+        await db.users.update_one(
+            {"user_id": user_id, "$or": [
+                {"password": old_hash},
+                {"password": {"$exists": False}, "hashed_password": old_hash}
+            ]},
+            {"$set": {"password": await hash_password(password)}}
+        )
+    except Exception as e:
+        logger.warning(f"Password rehash failed for {user_id}: {e}")
 
 def create_token(user_id: str, email: str, is_admin: bool = False) -> str:
     payload = {
@@ -481,10 +1019,211 @@ def create_token(user_id: str, email: str, is_admin: bool = False) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+AUTH_CACHE_TTL_SECONDS = float(os.environ.get('AUTH_CACHE_TTL_SECONDS', '30'))
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', '10000'))
+
+# Balances change outside the auth path, so they are never served from the auth cache
+AUTH_USER_PROJECTION = {"_id": 0, "password": 0, "wallet_balance": 0, "reward_points": 0, "total_spent": 0}
+
+class AuthCache:
+    """Per-worker cache of resolved users, keyed by a hash of the session token or JWT"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._keys_by_user: Dict[str, set] = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def key(kind: str, token: str) -> str:
+        return f"{kind}:{hashlib.sha256(token.encode()).hexdigest()}"
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                self._drop(key)
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return dict(entry[0])
+
+    def put(self, key: str, user: dict, expires_at: float):
+        """Cache until the credential expires or the TTL runs out, whichever is first"""
+        self._drop(key)
+        self._entries[key] = (dict(user), min(expires_at, time.time() + self.ttl))
+        self._keys_by_user.setdefault(user["user_id"], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[0]["user_id"])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[0]["user_id"]]
+
+    def evict_token(self, kind: str, token: str):
+        self._drop(self.key(kind, token))
+
+    def evict_user(self, user_id: str):
+        for key in list(self._keys_by_user.get(user_id, ())):
+            self._drop(key)
+
+    def stats(self) -> dict:
+        return {**self._stats, "size": len(self._entries), "ttl_seconds": self.ttl}
+
+auth_cache = AuthCache(AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES)
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings; no false negatives, rare false positives"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def create_session_token(user: dict, session_id: Optional[str] = None) -> str:
+    """Signed session cookie carrying the identity fields get_current_user needs"""
+    now = time.time()
+    claims = {
+        "sid": session_id or uuid.uuid4().hex,
+        "user_id": user["user_id"],
+        "email": user.get("email"),
+        "name": user.get("name"),
+        "picture": user.get("picture"),
+        "is_admin": user.get("is_admin", False),
+        "created_at": user.get("created_at"),
+        "iat": now,
+        "exp": now + SESSION_TTL_DAYS * 86400
+    }
+    body = b64url(json.dumps(claims, separators=(",", ":"), default=str).encode())
+    signature = b64url(hmac.new(SESSION_SIGNING_KEY, body.encode(), hashlib.sha256).digest())
+    return f"v1.{body}.{signature}"
+
+def verify_session_token(token: str) -> Optional[dict]:
+    """Claims of a validly signed, unexpired session token, else None"""
+    try:
+        version, body, signature = token.split(".")
+    except ValueError:
+        return None
+    expected = b64url(hmac.new(SESSION_SIGNING_KEY, body.encode(), hashlib.sha256).digest())
+    if version != "v1" or not hmac.compare_digest(signature, expected):
+        return None
+    try:
+        claims = json.loads(b64url_decode(body))
+    except ValueError:
+        return None
+    return claims if claims.get("exp", 0) > time.time() else None
+
+# Revoked sessions ("sid:<id>") and users ("user:<id>", revoking every token issued
+# before revoked_at) are mirrored into a Bloom filter, so only tokens that might
+# be revoked cost a Mongo lookup
+session_revocations = {
+    "filter": BloomFilter(SESSION_REVOCATION_CAPACITY),
+    "synced_through": None,
+    "checks": 0,
+    "confirmations": 0,
+    "last_sync": None
+}
+
+async def load_session_revocations(full: bool = False):
+    """Pull revocations into the filter; a full load rebuilds it from scratch"""
+    query = {}
+    if not full and session_revocations["synced_through"] is not None:
+        query["revoked_at"] = {"$gte": session_revocations["synced_through"]}
+    docs = await db.session_revocations.find(query, {"_id": 0, "key": 1, "revoked_at": 1}).to_list(None)
+    
+    if full:
+        capacity = max(SESSION_REVOCATION_CAPACITY, 2 * len(docs))
+        session_revocations["filter"] = BloomFilter(capacity)
+    for doc in docs:
+        session_revocations["filter"].add(doc["key"])
+        if session_revocations["synced_through"] is None or doc["revoked_at"] > session_revocations["synced_through"]:
+            session_revocations["synced_through"] = doc["revoked_at"]
+    session_revocations["last_sync"] = datetime.now(timezone.utc).isoformat()
+
+async def record_session_revocation(key: str):
+    now = time.time()
+    await db.session_revocations.update_one(
+        {"key": key},
+        {"$set": {
+            "key": key,
+            "revoked_at": now,
+            # Nothing signed before this can still be valid once a full session lifetime has passed
+            "expires_at": datetime.now(timezone.utc) + timedelta(days=SESSION_TTL_DAYS)
+        }},
+        upsert=True
+    )
+    session_revocations["filter"].add(key)
+
+async def is_session_revoked(claims: dict) -> bool:
+    session_revocations["checks"] += 1
+    keys = [key for key in (f"sid:{claims['sid']}", f"user:{claims['user_id']}") if key in session_revocations["filter"]]
+    if not keys:
+        return False
+    session_revocations["confirmations"] += 1
+    docs = await db.session_revocations.find({"key": {"$in": keys}}, {"_id": 0}).to_list(len(keys))
+    return any(doc["key"].startswith("sid:") or doc["revoked_at"] >= claims["iat"] for doc in docs)
+
+async def revoke_user_sessions(user_id: str):
+    """Force re-login after privilege or account changes; only needed for signed sessions"""
+    if STATELESS_SESSIONS:
+        await record_session_revocation(f"user:{user_id}")
+
+def invalidate_user_caches(user_id: str):
+    """Drop a user's cached auth and profile entries after their account changes"""
+    auth_cache.evict_user(user_id)
+    user_profiles.invalidate(user_id)
+
 async def get_current_user(request: Request) -> Optional[dict]:
     # Check cookie first
     session_token = request.cookies.get("session_token")
+    if session_token and STATELESS_SESSIONS and session_token.startswith("v1."):
+        claims = verify_session_token(session_token)
+        if claims and not await is_session_revoked(claims):
+            # The cookie proves identity; the user document still comes from the cache or Mongo
+            # so handlers see the same fields in both session modes
+            cache_key = auth_cache.key("user", claims["user_id"])
+            user = auth_cache.get(cache_key)
+            if user:
+                return user
+            user = await db.users.find_one({"user_id": claims["user_id"]}, AUTH_USER_PROJECTION)
+            if user:
+                auth_cache.put(cache_key, user, claims["exp"])
+            return user
+        session_token = None
     if session_token:
+        cache_key = auth_cache.key("session", session_token)
+        user = auth_cache.get(cache_key)
+        if user:
+            return user
         session = await db.user_sessions.find_one(
             {"session_token": session_token},
             {"_id": 0}
@@ -498,20 +1237,28 @@ async def get_current_user(request: Request) -> Optional[dict]:
             if expires_at > datetime.now(timezone.utc):
                 user = await db.users.find_one(
                     {"user_id": session["user_id"]},
-                    {"_id": 0, "password": 0}
+                    AUTH_USER_PROJECTION
                 )
+                if user:
+                    auth_cache.put(cache_key, user, expires_at.timestamp())
                 return user
     
     # Check Authorization header
     auth_header = request.headers.get("Authorization")
     if auth_header and auth_header.startswith("Bearer "):
         token = auth_header.split(" ")[1]
+        cache_key = auth_cache.key("jwt", token)
+        user = auth_cache.get(cache_key)
+        if user:
+            return user
         try:
             payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
             user = await db.users.find_one(
                 {"user_id": payload["user_id"]},
-                {"_id": 0, "password": 0}
+                AUTH_USER_PROJECTION
             )
+            if user:
+                auth_cache.put(cache_key, user, payload["exp"])
             return user
         except jwt.ExpiredSignatureError:
             return None
@@ -532,6 +1279,99 @@ async def require_admin(request: Request) -> dict:
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
 
+def encode_cursor(data: dict) -> str:
+    """Opaque pagination cursor"""
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return data
+
+async def page_comments(collection, query: dict, limit: int, cursor: Optional[str] = None) -> tuple:
+    """Newest-first keyset page over (created_at, comment_id), as (comments, next_cursor)"""
+    if cursor:
+        position = decode_cursor(cursor)
+        if not isinstance(position.get("created_at"), str) or not isinstance(position.get("comment_id"), str):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = {**query, "$or": [
+            {"created_at": {"$lt": position["created_at"]}},
+            {"created_at": position["created_at"], "comment_id": {"$lt": position["comment_id"]}}
+        ]}
+    
+    comments = await collection.find(query, {"_id": 0}).sort(
+        [("created_at", -1), ("comment_id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        last = comments[-1]
+        next_cursor = encode_cursor({"created_at": last["created_at"], "comment_id": last["comment_id"]})
+    return comments, next_cursor
+
+USER_PROFILE_CACHE_TTL_SECONDS = float(os.environ.get('USER_PROFILE_CACHE_TTL_SECONDS', '30'))
+USER_PROFILE_CACHE_MAX_ENTRIES = int(os.environ.get('USER_PROFILE_CACHE_MAX_ENTRIES', '10000'))
+
+class UserProfileLoader:
+    """Resolves display profiles for many users with one $in query, behind a short-TTL cache"""
+
+    PROJECTION = {"_id": 0, "user_id": 1, "name": 1, "picture": 1, "avatar": 1}
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "queries": 0}
+
+    async def load(self, user_ids) -> Dict[str, dict]:
+        """Map each known user_id to its profile; unknown users are left out"""
+        now = time.time()
+        profiles = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            if not user_id:
+                continue
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._stats["hits"] += 1
+                if entry[0] is not None:
+                    profiles[user_id] = entry[0]
+            else:
+                missing.append(user_id)
+        
+        if missing:
+            self._stats["misses"] += len(missing)
+            self._stats["queries"] += 1
+            found = await db.users.find({"user_id": {"$in": missing}}, self.PROJECTION).to_list(len(missing))
+            found = {user["user_id"]: user for user in found}
+            for user_id in missing:
+                # Unknown IDs are cached too so they don't hit Mongo on every list
+                self._entries[user_id] = (found.get(user_id), now)
+                self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            profiles.update(found)
+        return profiles
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {**self._stats, "size": len(self._entries), "ttl_seconds": self.ttl}
+
+user_profiles = UserProfileLoader(USER_PROFILE_CACHE_TTL_SECONDS, USER_PROFILE_CACHE_MAX_ENTRIES)
+
+def profile_name(profile: Optional[dict]) -> str:
+    return profile.get("name", "User") if profile else "User"
+
+def profile_avatar(profile: Optional[dict]) -> Optional[str]:
+    return profile.get("picture") or profile.get("avatar") if profile else None
+
 # =============== AUTH ROUTES ===============
 
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -545,7 +1385,7 @@ async def register(user_data: UserCreate):
     user_doc = {
         "user_id": user_id,
         "email": user_data.email,
-        "password": hash_password(user_data.password),
+        "password": await hash_password(user_data.password),
         "name": user_data.name,
         "phone": user_data.phone,
         "picture": None,
@@ -554,7 +1394,10 @@ async def register(user_data: UserCreate):
         "is_admin": False
     }
     
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     token = create_token(user_id, user_data.email)
     user_response = UserResponse(
@@ -586,8 +1429,10 @@ async def login(credentials: UserLogin):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     try:
-        is_valid = verify_password(credentials.password, stored_password)
+        is_valid = await verify_password(credentials.password, stored_password)
         logger.info(f"Password verification result: {is_valid}")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Password verification error: {e}")
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -595,6 +1440,12 @@ async def login(credentials: UserLogin):
     if not is_valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Move old hashes to the current work factor without holding up the response
+    if password_hasher.needs_rehash(stored_password):
+        task = asyncio.create_task(rehash_password(user["user_id"], credentials.password, stored_password))
+        password_rehash_tasks.add(task)
+        task.add_done_callback(password_rehash_tasks.discard)
+    
     token = create_token(user["user_id"], user["email"], user.get("is_admin", False))
     
     created_at = user.get("created_at")
@@ -627,21 +1478,20 @@ async def create_session(request: Request):
         raise HTTPException(status_code=400, detail="session_id required")
     
     # Exchange session_id with Emergent Auth
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-                headers={"X-Session-ID": session_id},
-                timeout=30.0
-            )
-            if response.status_code != 200:
-                raise HTTPException(status_code=401, detail="Invalid session")
-            
-            auth_data = response.json()
-        except httpx.HTTPError as e:
-            logger.error(f"Auth exchange error: {e}")
-            raise HTTPException(status_code=500, detail="Authentication service error")
-    
+    client = http_clients.get("demobackend.emergentagent.com")
+    try:
+        response = await client.get(
+            "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
+            headers={"X-Session-ID": session_id}
+        )
+        if response.status_code != 200:
+            raise HTTPException(status_code=401, detail="Invalid session")
+        
+        auth_data = response.json()
+    except httpx.HTTPError as e:
+        logger.error(f"Auth exchange error: {e}")
+        raise HTTPException(status_code=500, detail="Authentication service error")
+
     email = auth_data.get("email")
     name = auth_data.get("name")
     picture = auth_data.get("picture")
@@ -657,6 +1507,7 @@ async def create_session(request: Request):
             {"user_id": user_id},
             {"$set": {"name": name, "picture": picture}}
         )
+        invalidate_user_caches(user_id)
     else:
         user_id = f"user_{uuid.uuid4().hex[:12]}"
         user_doc = {
@@ -671,6 +1522,11 @@ async def create_session(request: Request):
         }
         await db.users.insert_one(user_doc)
     
+    # Get user data
+    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "password": 0})
+    if STATELESS_SESSIONS:
+        session_token = create_session_token(user)
+    
     # Store session
     session_doc = {
         "user_id": user_id,
@@ -680,9 +1536,6 @@ async def create_session(request: Request):
     }
     await db.user_sessions.insert_one(session_doc)
     
-    # Get user data
-    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "password": 0})
-    
     response = JSONResponse(content={
         "user_id": user["user_id"],
         "email": user["email"],
@@ -721,28 +1574,27 @@ async def google_auth(request: Request):
     
     # Verify the Google ID token
     try:
-        async with httpx.AsyncClient() as client:
-            # Verify token with Google
-            response = await client.get(
-                f"https://oauth2.googleapis.com/tokeninfo?id_token={credential}",
-                timeout=30.0
-            )
-            
-            logger.info(f"Google auth: Token verification response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                logger.error(f"Google auth: Token verification failed: {response.text}")
-                raise HTTPException(status_code=401, detail="Invalid Google token")
-            
-            google_data = response.json()
-            logger.info(f"Google auth: Token verified for email: {google_data.get('email')}")
-            
-            # Verify the audience matches our client ID
-            token_aud = google_data.get("aud")
-            if token_aud != GOOGLE_CLIENT_ID:
-                logger.error(f"Google auth: Audience mismatch. Token aud: {token_aud}, Expected: {GOOGLE_CLIENT_ID}")
-                raise HTTPException(status_code=401, detail="Token not intended for this application")
-            
+        client = http_clients.get("oauth2.googleapis.com")
+        # Verify token with Google
+        response = await client.get(
+            f"https://oauth2.googleapis.com/tokeninfo?id_token={credential}"
+        )
+        
+        logger.info(f"Google auth: Token verification response status: {response.status_code}")
+        
+        if response.status_code != 200:
+            logger.error(f"Google auth: Token verification failed: {response.text}")
+            raise HTTPException(status_code=401, detail="Invalid Google token")
+        
+        google_data = response.json()
+        logger.info(f"Google auth: Token verified for email: {google_data.get('email')}")
+        
+        # Verify the audience matches our client ID
+        token_aud = google_data.get("aud")
+        if token_aud != GOOGLE_CLIENT_ID:
+            logger.error(f"Google auth: Audience mismatch. Token aud: {token_aud}, Expected: {GOOGLE_CLIENT_ID}")
+            raise HTTPException(status_code=401, detail="Token not intended for this application")
+        
     except httpx.HTTPError as e:
         logger.error(f"Google token verification error: {e}")
         raise HTTPException(status_code=500, detail="Failed to verify Google token")
@@ -773,6 +1625,7 @@ async def google_auth(request: Request):
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }}
         )
+        invalidate_user_caches(user_id)
     else:
         # Create new user
         user_id = f"user_{uuid.uuid4().hex[:12]}"
@@ -806,8 +1659,11 @@ async def google_auth(request: Request):
     }
     access_token = jwt.encode(token_payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
     
+    # Get user data
+    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "password": 0})
+    
     # Create session
-    session_token = str(uuid.uuid4())
+    session_token = create_session_token(user) if STATELESS_SESSIONS else str(uuid.uuid4())
     session_doc = {
         "user_id": user_id,
         "session_token": session_token,
@@ -816,9 +1672,6 @@ async def google_auth(request: Request):
     }
     await db.user_sessions.insert_one(session_doc)
     
-    # Get user data
-    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "password": 0})
-    
     response = JSONResponse(content={
         "access_token": access_token,
         "user": {
@@ -857,13 +1710,16 @@ async def get_me(request: Request):
     if isinstance(created_at, str):
         created_at = datetime.fromisoformat(created_at)
     
+    # The resolved user comes from the auth cache, which leaves out balances
+    balance = await db.users.find_one({"user_id": user["user_id"]}, {"_id": 0, "wallet_balance": 1})
+    
     return {
         "user_id": user["user_id"],
         "email": user["email"],
         "name": user["name"],
         "phone": user.get("phone"),
         "picture": user.get("picture"),
-        "wallet_balance": user.get("wallet_balance", 0.0),
+        "wallet_balance": balance.get("wallet_balance", 0.0) if balance else 0.0,
         "is_admin": user.get("is_admin", False),
         "created_at": created_at.isoformat() if created_at else None
     }
@@ -873,6 +1729,10 @@ async def logout(request: Request):
     session_token = request.cookies.get("session_token")
     if session_token:
         await db.user_sessions.delete_one({"session_token": session_token})
+        auth_cache.evict_token("session", session_token)
+        claims = verify_session_token(session_token) if STATELESS_SESSIONS else None
+        if claims:
+            await record_session_revocation(f"sid:{claims['sid']}")
     
     response = JSONResponse(content={"message": "Logged out successfully"})
     response.delete_cookie("session_token", path="/")
@@ -991,125 +1851,144 @@ ROUTE_CONFIGS = {
 import random
 from datetime import datetime, timedelta
 
-def generate_mock_flights(origin: str, destination: str, date: str, passengers: int) -> List[dict]:
-    """Generate comprehensive mock flight data"""
+def generate_flight_amenities(airline_class: str) -> List[str]:
+    """Generate amenities based on airline class"""
+    basic = ["USB Charging", "In-flight Entertainment"]
+    standard = basic + ["WiFi Available", "Snacks"]
+    premium = standard + ["Gourmet Meals", "Premium Entertainment", "Extra Legroom", "Priority Boarding", "Lounge Access"]
+    
+    if airline_class == "premium":
+        return premium
+    return standard
+
+# Lookup tables for the local flight generator, built once at import
+MOCK_DEPARTURE_TIMES = ["06:00", "07:30", "09:00", "10:30", "12:00", "14:00", "16:30", "18:00", "20:00", "22:30"]
+MOCK_SLOT_MINUTES = np.array([int(t[:2]) * 60 + int(t[3:]) for t in MOCK_DEPARTURE_TIMES], dtype=np.int32)
+MOCK_SLOT_PRICE_FACTOR = np.array([
+    1.15 if 6 <= minutes // 60 <= 9 else 1.1 if 18 <= minutes // 60 <= 21 else 1.0  # Morning / evening premium
+    for minutes in MOCK_SLOT_MINUTES
+])
+MOCK_AIRLINE_PREMIUM = np.array([a["class"] == "premium" for a in AIRLINE_DATABASE])
+MOCK_AIRLINE_PRICE_LOW = np.where(MOCK_AIRLINE_PREMIUM, 1.2, 0.8)
+MOCK_AIRLINE_PRICE_HIGH = np.where(MOCK_AIRLINE_PREMIUM, 1.6, 1.1)
+MOCK_AIRLINE_AMENITIES = [generate_flight_amenities(a["class"]) for a in AIRLINE_DATABASE]
+MOCK_AIRLINE_BAGGAGE = [
+    {"cabin": "1 x 7kg", "checked": "1 x 23kg" if a["class"] == "premium" else "1 x 20kg"}
+    for a in AIRLINE_DATABASE
+]
+MOCK_AIRLINE_LOGOS = [AIRLINE_LOGOS.get(a["code"], "") for a in AIRLINE_DATABASE]
+MOCK_STOP_CITIES = ["FRA", "IST", "DXB", "DOH", "AMS", "LHR"]
+MOCK_AIRCRAFT = ["Boeing 777-300ER", "Airbus A380", "Boeing 787 Dreamliner", "Airbus A350-900", "Boeing 737 MAX"]
+MOCK_DEFAULT_ROUTE = {"duration_min": 300, "base_price": 400, "distance": 3000}
+
+def get_route_config(origin: str, destination: str) -> dict:
+    return ROUTE_CONFIGS.get((origin, destination)) or ROUTE_CONFIGS.get((destination, origin)) or MOCK_DEFAULT_ROUTE
+
+def mock_search_seed(origin: str, destination: str, date: str) -> int:
+    """Stable seed for a route and date, so identical searches get identical fares"""
+    digest = hashlib.blake2b(f"{origin.upper()}|{destination.upper()}|{date}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+def generate_mock_fare_grid(origin: str, destination: str, date: str,
+                            size: Optional[int] = None, seed: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Generate per-person fares for a route as column arrays in one vectorized pass.
+
+    Without size this mirrors the search listing: 8 airlines with 1-2 flights each.
+    With size it draws that many fares across all airlines and departure slots.
+    """
     origin = origin.upper()
     destination = destination.upper()
+    config = get_route_config(origin, destination)
+    rng = np.random.default_rng(mock_search_seed(origin, destination, date) if seed is None else seed)
+    
+    if size is None:
+        selected = rng.permutation(len(AIRLINE_DATABASE))[:8]
+        per_airline = rng.integers(1, 3, len(selected))
+        airline_idx = np.repeat(selected, per_airline)
+        rank = np.repeat(np.arange(len(selected)), per_airline)
+        nth = np.arange(len(airline_idx)) - np.repeat(np.cumsum(per_airline) - per_airline, per_airline)
+        slot_idx = (rank * 2 + nth) % len(MOCK_DEPARTURE_TIMES)
+    else:
+        airline_idx = rng.integers(0, len(AIRLINE_DATABASE), size)
+        slot_idx = rng.integers(0, len(MOCK_DEPARTURE_TIMES), size)
+    n = len(airline_idx)
     
-    # Get route config or generate default
-    route_key = (origin, destination)
-    reverse_key = (destination, origin)
+    multiplier = rng.uniform(MOCK_AIRLINE_PRICE_LOW[airline_idx], MOCK_AIRLINE_PRICE_HIGH[airline_idx])
+    stops = (rng.random(n) < 0.3).astype(np.int8)  # 30% chance of 1 stop
+    price = config["base_price"] * multiplier * MOCK_SLOT_PRICE_FACTOR[slot_idx] * np.where(stops, 0.85, 1.0)
+    duration = config["duration_min"] + stops * rng.integers(90, 181, n)
     
-    if route_key in ROUTE_CONFIGS:
-        config = ROUTE_CONFIGS[route_key]
-    elif reverse_key in ROUTE_CONFIGS:
-        config = ROUTE_CONFIGS[reverse_key]
-    else:
-        # Generate default config based on assumed distance
-        config = {"duration_min": 300, "base_price": 400, "distance": 3000}
+    return {
+        "airline_idx": airline_idx,
+        "slot_idx": slot_idx,
+        "price_per_person": np.round(price, 2),
+        "stops": stops,
+        "duration_minutes": duration,
+        "arrival_minutes": MOCK_SLOT_MINUTES[slot_idx] + duration,
+        "flight_number": rng.integers(100, 1000, n),
+        "available_seats": rng.integers(3, 46, n),
+        "aircraft_idx": rng.integers(0, len(MOCK_AIRCRAFT), n),
+        "stop_city_idx": rng.integers(0, len(MOCK_STOP_CITIES), n),
+        "refundable": rng.random(n) < 0.5,
+        "meal_included": MOCK_AIRLINE_PREMIUM[airline_idx] | (rng.random(n) < 0.5),
+    }
+
+def generate_mock_flights(origin: str, destination: str, date: str, passengers: int) -> List[dict]:
+    """Generate comprehensive mock flight data, deterministic per route and date"""
+    origin = origin.upper()
+    destination = destination.upper()
     
     origin_city = CITY_DATABASE.get(origin, {"name": origin, "airport": origin})
     dest_city = CITY_DATABASE.get(destination, {"name": destination, "airport": destination})
     
-    flights = []
-    
-    # Select 6-8 random airlines for this route
-    selected_airlines = random.sample(AIRLINE_DATABASE, min(8, len(AIRLINE_DATABASE)))
+    grid = generate_mock_fare_grid(origin, destination, date)
+    order = np.argsort(grid["price_per_person"], kind="stable")
+    columns = {name: values[order].tolist() for name, values in grid.items()}
+    id_prefix = f"{mock_search_seed(origin, destination, date):016x}"
     
-    departure_times = ["06:00", "07:30", "09:00", "10:30", "12:00", "14:00", "16:30", "18:00", "20:00", "22:30"]
-    
-    for idx, airline in enumerate(selected_airlines):
-        # Generate 1-2 flights per airline
-        num_flights = random.randint(1, 2)
+    flights = []
+    for i in range(len(order)):
+        airline_idx = columns["airline_idx"][i]
+        airline = AIRLINE_DATABASE[airline_idx]
+        duration_mins = columns["duration_minutes"][i]
+        arr_mins = columns["arrival_minutes"][i]
+        price_per_person = columns["price_per_person"][i]
+        stops = columns["stops"][i]
         
-        for flight_idx in range(num_flights):
-            # Calculate price with variations
-            price_multiplier = 1.0
-            if airline["class"] == "premium":
-                price_multiplier = random.uniform(1.2, 1.6)
-            else:
-                price_multiplier = random.uniform(0.8, 1.1)
-            
-            # Add time-of-day pricing
-            dep_time = departure_times[(idx * 2 + flight_idx) % len(departure_times)]
-            hour = int(dep_time.split(":")[0])
-            if 6 <= hour <= 9:  # Morning premium
-                price_multiplier *= 1.15
-            elif 18 <= hour <= 21:  # Evening premium
-                price_multiplier *= 1.1
-            
-            base_price = config["base_price"] * price_multiplier
-            
-            # Calculate duration with variations
-            stops = 0
-            if random.random() < 0.3:  # 30% chance of 1 stop
-                stops = 1
-                base_price *= 0.85  # Cheaper with stops
-            
-            duration_mins = config["duration_min"] + (stops * random.randint(90, 180))
-            duration_hours = duration_mins // 60
-            duration_remaining_mins = duration_mins % 60
-            
-            # Calculate arrival time
-            dep_hour, dep_min = map(int, dep_time.split(":"))
-            arr_mins = dep_hour * 60 + dep_min + duration_mins
-            arr_hour = (arr_mins // 60) % 24
-            arr_min = arr_mins % 60
-            next_day = arr_mins >= 1440
-            arrival_time = f"{arr_hour:02d}:{arr_min:02d}" + ("+1" if next_day else "")
-            
-            flight = {
-                "flight_id": f"fl_{uuid.uuid4().hex[:8]}",
-                "airline": airline["name"],
-                "airline_code": airline["code"],
-                "airline_logo": AIRLINE_LOGOS.get(airline["code"], ""),
-                "airline_rating": airline["rating"],
-                "flight_number": f"{airline['code']}{random.randint(100, 999)}",
-                "origin": origin,
-                "origin_city": origin_city["name"],
-                "origin_airport": origin_city.get("airport", origin),
-                "destination": destination,
-                "destination_city": dest_city["name"],
-                "destination_airport": dest_city.get("airport", destination),
-                "departure_date": date,
-                "departure_time": dep_time,
-                "arrival_time": arrival_time,
-                "duration": f"{duration_hours}h {duration_remaining_mins}m",
-                "duration_minutes": duration_mins,
-                "price": round(base_price * passengers, 2),
-                "price_per_person": round(base_price, 2),
-                "currency": "USD",
-                "stops": stops,
-                "stop_cities": [random.choice(["FRA", "IST", "DXB", "DOH", "AMS", "LHR"])] if stops > 0 else [],
-                "cabin_class": "economy",
-                "available_seats": random.randint(3, 45),
-                "aircraft": random.choice(["Boeing 777-300ER", "Airbus A380", "Boeing 787 Dreamliner", "Airbus A350-900", "Boeing 737 MAX"]),
-                "amenities": generate_flight_amenities(airline["class"]),
-                "baggage": {
-                    "cabin": "1 x 7kg",
-                    "checked": "1 x 23kg" if airline["class"] == "premium" else "1 x 20kg"
-                },
-                "refundable": random.choice([True, False]),
-                "meal_included": airline["class"] == "premium" or random.random() < 0.5
-            }
-            
-            flights.append(flight)
-    
-    # Sort by price
-    flights.sort(key=lambda x: x["price"])
+        flights.append({
+            "flight_id": f"fl_{id_prefix}{i:02d}",
+            "airline": airline["name"],
+            "airline_code": airline["code"],
+            "airline_logo": MOCK_AIRLINE_LOGOS[airline_idx],
+            "airline_rating": airline["rating"],
+            "flight_number": f"{airline['code']}{columns['flight_number'][i]}",
+            "origin": origin,
+            "origin_city": origin_city["name"],
+            "origin_airport": origin_city.get("airport", origin),
+            "destination": destination,
+            "destination_city": dest_city["name"],
+            "destination_airport": dest_city.get("airport", destination),
+            "departure_date": date,
+            "departure_time": MOCK_DEPARTURE_TIMES[columns["slot_idx"][i]],
+            "arrival_time": f"{(arr_mins // 60) % 24:02d}:{arr_mins % 60:02d}" + ("+1" if arr_mins >= 1440 else ""),
+            "duration": f"{duration_mins // 60}h {duration_mins % 60}m",
+            "duration_minutes": duration_mins,
+            "price": round(price_per_person * passengers, 2),
+            "price_per_person": price_per_person,
+            "currency": "USD",
+            "stops": stops,
+            "stop_cities": [MOCK_STOP_CITIES[columns["stop_city_idx"][i]]] if stops > 0 else [],
+            "cabin_class": "economy",
+            "available_seats": columns["available_seats"][i],
+            "aircraft": MOCK_AIRCRAFT[columns["aircraft_idx"][i]],
+            "amenities": list(MOCK_AIRLINE_AMENITIES[airline_idx]),
+            "baggage": dict(MOCK_AIRLINE_BAGGAGE[airline_idx]),
+            "refundable": columns["refundable"][i],
+            "meal_included": columns["meal_included"][i]
+        })
     
     return flights
 
-def generate_flight_amenities(airline_class: str) -> List[str]:
-    """Generate amenities based on airline class"""
-    basic = ["USB Charging", "In-flight Entertainment"]
-    standard = basic + ["WiFi Available", "Snacks"]
-    premium = standard + ["Gourmet Meals", "Premium Entertainment", "Extra Legroom", "Priority Boarding", "Lounge Access"]
-    
-    if airline_class == "premium":
-        return premium
-    return standard
-
 def parse_amadeus_flights(response_data: list, origin: str, destination: str) -> List[dict]:
     """Parse Amadeus flight offers response into our format"""
     flights = []
@@ -1137,6 +2016,8 @@ def parse_amadeus_flights(response_data: list, origin: str, destination: str) ->
             
             # Parse duration (PT2H30M -> 2h 30m)
             duration = first_itinerary.get("duration", "")
+            duration_match = re.match(r"PT(?:(\d+)H)?(?:(\d+)M)?", duration)
+            duration_minutes = int(duration_match.group(1) or 0) * 60 + int(duration_match.group(2) or 0) if duration_match else None
             if duration.startswith("PT"):
                 duration = duration[2:].lower().replace("h", "h ").replace("m", "m").strip()
             
@@ -1153,6 +2034,7 @@ def parse_amadeus_flights(response_data: list, origin: str, destination: str) ->
             flights.append({
                 "flight_id": f"fl_{offer.get('id', uuid.uuid4().hex[:8])}",
                 "airline": airline_name,
+                "airline_code": airline_code,
                 "airline_logo": AIRLINE_LOGOS.get(airline_code, ""),
                 "flight_number": f"{airline_code}{first_segment.get('number', '')}",
                 "origin": first_segment.get("departure", {}).get("iataCode", origin),
@@ -1162,6 +2044,7 @@ def parse_amadeus_flights(response_data: list, origin: str, destination: str) ->
                 "departure_time": dep_time,
                 "arrival_time": arr_time,
                 "duration": duration,
+                "duration_minutes": duration_minutes,
                 "price": float(price_info.get("total", 0)),
                 "currency": price_info.get("currency", "USD"),
                 "stops": len(segments) - 1,
@@ -1174,8 +2057,16 @@ def parse_amadeus_flights(response_data: list, origin: str, destination: str) ->
     
     return flights
 
-@api_router.post("/flights/search")
-async def search_flights(search: FlightSearch):
+def flight_search_key(search: FlightSearch) -> str:
+    return "|".join([
+        search.origin.upper(),
+        search.destination.upper(),
+        search.departure_date,
+        str(search.passengers),
+        search.return_date or ""
+    ])
+
+async def fetch_flight_results(search: FlightSearch) -> dict:
     """Search for flights using Amadeus API with fallback to mock data"""
     
     # Try Amadeus API first
@@ -1193,7 +2084,9 @@ async def search_flights(search: FlightSearch):
             if search.return_date:
                 search_params["returnDate"] = search.return_date
             
-            response = amadeus_client.shopping.flight_offers_search.get(**search_params)
+            response = await amadeus_adapter.call(
+                amadeus_client.shopping.flight_offers_search.get, **search_params
+            )
             
             if response.data:
                 flights = parse_amadeus_flights(response.data, search.origin, search.destination)
@@ -1213,6 +2106,10 @@ async def search_flights(search: FlightSearch):
                 
                 return {"flights": flights, "total": len(flights), "source": "amadeus"}
             
+        except CircuitOpenError:
+            logger.info("Amadeus circuit open, skipping live flight search")
+        except asyncio.TimeoutError:
+            logger.error("Amadeus flight search timed out")
         except AmadeusResponseError as e:
             logger.error(f"Amadeus API error: {e}")
         except Exception as e:
@@ -1228,6 +2125,154 @@ async def search_flights(search: FlightSearch):
     )
     return {"flights": flights, "total": len(flights), "source": "local"}
 
+async def cached_flight_search(search: FlightSearch) -> dict:
+    key = flight_search_key(search)
+    return await flight_search_cache.get_or_fetch(
+        key,
+        lambda: upstream_searches.do(f"flights:{key}", lambda: fetch_flight_results(search))
+    )
+
+FLIGHT_SORT_KEYS = {
+    "price": lambda f: f.get("price") or 0,
+    "duration": lambda f: f.get("duration_minutes") or 0,
+    "departure_time": lambda f: f.get("departure_time") or ""
+}
+# Type a cursor's sort value must have for each key
+FLIGHT_SORT_VALUE_TYPES = {
+    "price": (int, float),
+    "duration": (int, float),
+    "departure_time": (str,)
+}
+
+def filter_flights(flights: List[dict], search: FlightSearch) -> List[dict]:
+    airlines = {a.lower() for a in search.airlines} if search.airlines else None
+    matched = []
+    for flight in flights:
+        if search.max_stops is not None and flight.get("stops", 0) > search.max_stops:
+            continue
+        if airlines and (flight.get("airline_code") or "").lower() not in airlines and (flight.get("airline") or "").lower() not in airlines:
+            continue
+        departure_time = flight.get("departure_time") or ""
+        if search.departure_time_from and departure_time < search.departure_time_from:
+            continue
+        if search.departure_time_to and departure_time > search.departure_time_to:
+            continue
+        if search.min_price is not None and flight.get("price", 0) < search.min_price:
+            continue
+        if search.max_price is not None and flight.get("price", 0) > search.max_price:
+            continue
+        if search.refundable is not None and bool(flight.get("refundable")) != search.refundable:
+            continue
+        matched.append(flight)
+    return matched
+
+def page_flights(flights: List[dict], search: FlightSearch) -> dict:
+    """Sort and keyset-paginate flights on (sort value, flight_id)"""
+    sort_by = search.sort_by or "price"
+    if sort_by not in FLIGHT_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of: {', '.join(FLIGHT_SORT_KEYS)}")
+    descending = search.sort_order == "desc"
+    value_of = FLIGHT_SORT_KEYS[sort_by]
+    ordered = sorted(flights, key=lambda f: (value_of(f), f["flight_id"]), reverse=descending)
+    
+    if search.cursor:
+        cursor = decode_cursor(search.cursor)
+        if cursor.get("sort") != [sort_by, search.sort_order]:
+            raise HTTPException(status_code=400, detail="Cursor does not match the requested sort")
+        after = cursor.get("after")
+        if (not isinstance(after, list) or len(after) != 2 or isinstance(after[0], bool)
+                or not isinstance(after[0], FLIGHT_SORT_VALUE_TYPES[sort_by]) or not isinstance(after[1], str)):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        last = tuple(after)
+        ordered = [f for f in ordered if ((value_of(f), f["flight_id"]) < last if descending else (value_of(f), f["flight_id"]) > last)]
+    
+    limit = min(search.limit or FLIGHT_PAGE_MAX, FLIGHT_PAGE_MAX)
+    page = ordered[:limit]
+    next_cursor = None
+    if len(ordered) > limit:
+        tail = page[-1]
+        next_cursor = encode_cursor({"sort": [sort_by, search.sort_order], "after": [value_of(tail), tail["flight_id"]]})
+    return {"flights": page, "next_cursor": next_cursor}
+
+@api_router.post("/flights/search")
+async def search_flights(search: FlightSearch):
+    """Search for flights, served from the result cache when possible"""
+    result = await cached_flight_search(search)
+    
+    has_query = any(v is not None for v in (
+        search.max_stops, search.airlines, search.departure_time_from, search.departure_time_to,
+        search.min_price, search.max_price, search.refundable, search.sort_by, search.limit, search.cursor
+    ))
+    if not has_query:
+        return result
+    
+    # Filter, sort and page the cached set; later pages never go upstream
+    flights = filter_flights(result["flights"], search)
+    page = page_flights(flights, search)
+    return {
+        "flights": page["flights"],
+        "total": len(flights),
+        "next_cursor": page["next_cursor"],
+        "source": result["source"]
+    }
+
+FARE_CALENDAR_MAX_WINDOW_DAYS = 15
+FARE_CALENDAR_CONCURRENCY = int(os.environ.get('FARE_CALENDAR_CONCURRENCY', '4'))
+
+@api_router.post("/flights/calendar")
+async def get_fare_calendar(search: FlightCalendarSearch):
+    """Cheapest fare per day for a window around the departure date"""
+    try:
+        center = datetime.strptime(search.departure_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="departure_date must be YYYY-MM-DD")
+    if not 0 <= search.window_days <= FARE_CALENDAR_MAX_WINDOW_DAYS:
+        raise HTTPException(status_code=400, detail=f"window_days must be between 0 and {FARE_CALENDAR_MAX_WINDOW_DAYS}")
+    
+    today = datetime.now(timezone.utc).date()
+    dates = [
+        center + timedelta(days=offset)
+        for offset in range(-search.window_days, search.window_days + 1)
+        if center + timedelta(days=offset) >= today
+    ]
+    semaphore = asyncio.Semaphore(FARE_CALENDAR_CONCURRENCY)
+    
+    async def cheapest_fare(day) -> dict:
+        # One-passenger searches share cache entries with regular searches for the same day
+        async with semaphore:
+            result = await cached_flight_search(FlightSearch(
+                origin=search.origin,
+                destination=search.destination,
+                departure_date=day.isoformat(),
+                passengers=1
+            ))
+        flights = result.get("flights", [])
+        if not flights:
+            return {"date": day.isoformat(), "available": False, "source": result.get("source")}
+        cheapest = min(flights, key=lambda f: f["price"])
+        return {
+            "date": day.isoformat(),
+            "available": True,
+            "price": cheapest["price"],
+            "total_price": round(cheapest["price"] * search.passengers, 2),
+            "currency": cheapest.get("currency", "USD"),
+            "airline": cheapest.get("airline"),
+            "flight_id": cheapest.get("flight_id"),
+            "source": result.get("source")
+        }
+    
+    days = await asyncio.gather(*(cheapest_fare(day) for day in dates))
+    priced = [d for d in days if d["available"]]
+    
+    return {
+        "origin": search.origin.upper(),
+        "destination": search.destination.upper(),
+        "departure_date": search.departure_date,
+        "passengers": search.passengers,
+        "days": days,
+        "cheapest": min(priced, key=lambda d: d["price"]) if priced else None
+    }
+
 @api_router.get("/flights/{flight_id}")
 async def get_flight(flight_id: str):
     # Generate a comprehensive mock flight detail
@@ -1266,25 +2311,120 @@ async def get_flight(flight_id: str):
         "meal_included": True
     }
 
+def normalize_search_text(text: str) -> str:
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join("".join(c if c.isalnum() else " " for c in stripped.lower()).split())
+
+class AirportIndex:
+    """Prefix and trigram index over airport code, city, country and name"""
+
+    # Fields in ranking order: a code prefix beats a city prefix, and so on
+    FIELDS = ("code", "city", "airport", "country")
+
+    def __init__(self, cities: Dict[str, dict]):
+        self.airports = sorted(
+            [
+                {"code": code, "city": data["name"], "country": data["country"], "airport": data["airport"]}
+                for code, data in cities.items()
+            ],
+            key=lambda x: x["city"]
+        )
+        self._codes: Dict[str, int] = {}
+        self._fields: List[dict] = []
+        self._haystacks: List[str] = []
+        # prefix -> entry ids per field, appended in city order so each list is pre-ranked
+        self._field_prefixes: Dict[str, Dict[str, List[int]]] = {name: {} for name in self.FIELDS}
+        self._prefixes: Dict[str, set] = {}
+        self._trigrams: Dict[str, set] = {}
+        for i, airport in enumerate(self.airports):
+            fields = {name: normalize_search_text(airport[name]) for name in self.FIELDS}
+            self._fields.append(fields)
+            self._codes.setdefault(fields["code"], i)
+            for name, value in fields.items():
+                index = self._field_prefixes[name]
+                for token in value.split():
+                    for end in range(1, len(token) + 1):
+                        ids = index.setdefault(token[:end], [])
+                        if not ids or ids[-1] != i:
+                            ids.append(i)
+                        self._prefixes.setdefault(token[:end], set()).add(i)
+            haystack = " | ".join(fields.values())
+            self._haystacks.append(haystack)
+            for gram in self._grams(haystack):
+                self._trigrams.setdefault(gram, set()).add(i)
+
+    @staticmethod
+    def _grams(text: str) -> set:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _rank(self, i: int, tokens: List[str]) -> tuple:
+        fields = self._fields[i]
+        for rank, name in enumerate(self.FIELDS):
+            words = fields[name].split()
+            if all(any(w.startswith(t) for w in words) for t in tokens):
+                return rank, i
+        return len(self.FIELDS), i
+
+    def _single_token_matches(self, token: str, limit: int) -> List[int]:
+        ranked = []
+        seen = set()
+        exact = self._codes.get(token)
+        tiers = [[exact] if exact is not None else []]
+        tiers += [self._field_prefixes[name].get(token, []) for name in self.FIELDS]
+        for ids in tiers:
+            for i in ids:
+                if i not in seen:
+                    seen.add(i)
+                    ranked.append(i)
+                    if len(ranked) == limit:
+                        return ranked
+        return ranked
+
+    def _infix_matches(self, query: str, exclude: set) -> List[int]:
+        candidates = None
+        for gram in self._grams(query):
+            ids = self._trigrams.get(gram, set())
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        return sorted(i for i in candidates if i not in exclude and query in self._haystacks[i])
+
+    def search(self, q: Optional[str], limit: int) -> tuple:
+        """Return (ranked matches up to limit, total match count)"""
+        query = normalize_search_text(q or "")
+        if not query:
+            return self.airports[:limit], len(self.airports)
+        tokens = query.split()
+
+        # Every query token must prefix some word of the entry
+        if len(tokens) == 1:
+            matched = self._prefixes.get(query, set())
+            ranked = self._single_token_matches(query, limit)
+        else:
+            matched = set.intersection(*(self._prefixes.get(t, set()) for t in tokens))
+            ranked = sorted(matched, key=lambda i: self._rank(i, tokens))[:limit]
+        total = len(matched)
+
+        # Fall back to infix matches such as "ondon" when prefixes come up short
+        if total < limit and len(query) >= 3:
+            extra = self._infix_matches(query, matched)
+            ranked += extra[:limit - len(ranked)]
+            total += len(extra)
+
+        return [self.airports[i] for i in ranked], total
+
+airport_index = AirportIndex(CITY_DATABASE)
+
 @api_router.get("/airports")
-async def get_airports(q: str = Query(None, description="Search query")):
+async def get_airports(
+    q: str = Query(None, description="Search query"),
+    limit: int = Query(default=50, ge=1, le=500)
+):
     """Get list of available airports with search functionality"""
-    airports = [
-        {"code": code, "city": data["name"], "country": data["country"], "airport": data["airport"]}
-        for code, data in CITY_DATABASE.items()
-    ]
-    
-    if q:
-        q_lower = q.lower()
-        airports = [
-            a for a in airports
-            if q_lower in a["code"].lower() 
-            or q_lower in a["city"].lower() 
-            or q_lower in a["country"].lower()
-            or q_lower in a["airport"].lower()
-        ]
-    
-    return {"airports": sorted(airports, key=lambda x: x["city"]), "total": len(airports)}
+    airports, total = airport_index.search(q, limit)
+    return {"airports": airports, "total": total}
 
 @api_router.get("/airlines")
 async def get_airlines():
@@ -1502,117 +2642,163 @@ LOCATION_PRICING = {
     "default": 1.0
 }
 
-def generate_mock_hotels(location: str, check_in: str = None, check_out: str = None, guests: int = 2, rooms: int = 1) -> List[dict]:
-    """Generate comprehensive mock hotel data"""
-    
-    location_lower = location.lower()
-    price_multiplier = LOCATION_PRICING.get(location_lower, LOCATION_PRICING["default"])
+def generate_hotel_highlights(hotel_type: str) -> List[str]:
+    """Generate highlights based on hotel type"""
+    highlights = {
+        "luxury": ["Award-winning spa", "Michelin-starred dining", "Butler service", "Private beach access"],
+        "resort": ["All-inclusive options", "Multiple pools", "Kids activities", "Water sports"],
+        "boutique": ["Unique design", "Personalized service", "Local art collection", "Rooftop terrace"],
+        "business": ["Executive lounge", "Meeting facilities", "Airport shuttle", "24h business center"],
+        "mid-range": ["Great value", "Central location", "Comfortable rooms", "Friendly staff"],
+        "budget-friendly": ["Budget-friendly", "Free breakfast", "Clean rooms", "Good location"],
+        "economy": ["Best price guarantee", "Essential amenities", "Free WiFi", "Parking included"],
+        "lifestyle": ["Trendy atmosphere", "Vibrant nightlife", "Instagram-worthy", "Celebrity hotspot"],
+        "upscale": ["Premium amenities", "Fine dining", "Spa services", "Elegant rooms"]
+    }
+    return highlights.get(hotel_type, ["Great location", "Comfortable stay", "Good amenities"])
+
+# Room types offered by every template, priced off the hotel's nightly base;
+# capacity is the number of rooms of that type the inventory starts with
+HOTEL_ROOM_TIERS = [
+    {"type": "Standard Room", "capacity": 20, "description": "Comfortable room with essential amenities", "multiplier": 1.0,
+     "beds": "1 Queen Bed", "max_guests": 2, "size": "28 sq m", "view": "City View"},
+    {"type": "Deluxe Room", "capacity": 12, "description": "Spacious room with premium amenities", "multiplier": 1.4,
+     "beds": "1 King Bed", "max_guests": 2, "size": "35 sq m", "view": "City/Pool View"},
+    {"type": "Superior Suite", "capacity": 6, "description": "Luxurious suite with separate living area", "multiplier": 2.0,
+     "beds": "1 King Bed + Sofa Bed", "max_guests": 3, "size": "50 sq m", "view": "Premium View"},
+    {"type": "Executive Suite", "capacity": 4, "description": "Premium suite with executive lounge access", "multiplier": 2.8,
+     "beds": "1 King Bed", "max_guests": 2, "size": "65 sq m", "view": "Panoramic View",
+     "extras": ["Lounge Access", "Free Minibar", "Late Checkout"]}
+]
+
+HOTEL_IMAGE_IDS = ["1566073771259-6a8506099945", "1582719508461-905c673771fd", "1520250497591-112f2f40a3f4",
+                   "1551882547-ff40c63fe5fa", "1564501049412-61c2a3083791", "1571003123894-1f0594d2b5d9"]
+
+# Extra names for locations in CITY_DATABASE, including IATA metropolitan codes
+HOTEL_LOCATION_ALIASES = {
+    "nyc": "JFK", "new york city": "JFK", "lon": "LHR", "par": "CDG", "tyo": "NRT",
+    "rom": "FCO", "chi": "ORD", "sel": "ICN", "bjs": "PEK", "yto": "YYZ", "sao": "GRU",
+    "delhi": "DEL", "bombay": "BOM", "peking": "PEK"
+}
+
+def build_hotel_catalog() -> List[dict]:
+    """Everything about each hotel template that doesn't depend on the request"""
+    catalog = []
+    for idx, template in enumerate(HOTEL_DATABASE["default"]):
+        hotel_type = template["type"]
+        images = [
+            f"https://images.unsplash.com/photo-{HOTEL_IMAGE_IDS[(idx + i) % len(HOTEL_IMAGE_IDS)]}?w=800"
+            for i in range(4)
+        ]
+        catalog.append({
+            "template": template,
+            "slug": normalize_search_text(template["name"]).replace(" ", "-"),
+            "images": images,
+            "room_tiers": [{k: v for k, v in tier.items() if k != "multiplier"} for tier in HOTEL_ROOM_TIERS],
+            "room_multipliers": [tier["multiplier"] for tier in HOTEL_ROOM_TIERS],
+            "star_rating": 5 if hotel_type == "luxury" else 4 if hotel_type in ["resort", "upscale", "boutique"] else 3,
+            "highlights": generate_hotel_highlights(hotel_type),
+            "cancellation": "Free cancellation up to 24 hours before check-in" if hotel_type in ["luxury", "resort"] else "Free cancellation up to 48 hours before check-in",
+            "free_cancellation": hotel_type in ["luxury", "resort", "upscale"],
+            "always_breakfast": hotel_type in ["economy", "budget-friendly"],
+            "pitch": "Our luxury property offers world-class amenities and unparalleled service." if hotel_type == "luxury" else "Enjoy comfortable accommodations with modern amenities for a memorable stay."
+        })
+    return catalog
+
+def build_hotel_location_index() -> Dict[str, dict]:
+    """Normalized city names, airport names, IATA codes and aliases -> city and price multiplier"""
+    index = {}
+    for code, data in CITY_DATABASE.items():
+        multiplier = LOCATION_PRICING.get(code.lower(), LOCATION_PRICING.get(data["name"].lower(), LOCATION_PRICING["default"]))
+        entry = {"code": code, "city": data["name"], "country": data["country"], "multiplier": multiplier}
+        for name in (code, data["name"], data["airport"]):
+            index.setdefault(normalize_search_text(name), entry)
+    for alias, code in HOTEL_LOCATION_ALIASES.items():
+        index.setdefault(normalize_search_text(alias), index[normalize_search_text(code)])
+    # Priced locations without an airport of their own
+    for name, multiplier in LOCATION_PRICING.items():
+        key = normalize_search_text(name)
+        if name != "default" and key not in index:
+            index[key] = {"code": None, "city": name.title(), "country": "Unknown", "multiplier": multiplier}
+    return index
+
+HOTEL_CATALOG = build_hotel_catalog()
+HOTEL_LOCATION_INDEX = build_hotel_location_index()
+
+def resolve_hotel_location(location: str) -> dict:
+    key = normalize_search_text(location)
+    entry = HOTEL_LOCATION_INDEX.get(key)
+    if entry is None and "," in location:
+        # "Paris, France" -> "Paris"
+        entry = HOTEL_LOCATION_INDEX.get(normalize_search_text(location.split(",")[0]))
+    return entry or {"code": None, "city": location, "country": "Unknown", "multiplier": LOCATION_PRICING["default"]}
+
+def generate_mock_hotels(location: str, check_in: str = None, check_out: str = None, guests: int = 2, rooms: int = 1) -> List[dict]:
+    """Generate comprehensive mock hotel data from the prebuilt catalog"""
     
-    # Get city info
-    city_code = location.upper()
-    city_info = CITY_DATABASE.get(city_code, {"name": location, "country": "Unknown"})
-    city_name = city_info["name"] if isinstance(city_info, dict) else location
+    place = resolve_hotel_location(location)
+    city_name = place["city"]
+    price_multiplier = place["multiplier"]
+    location_key = normalize_search_text(place["code"] or city_name)
     
     hotels = []
-    hotel_templates = HOTEL_DATABASE["default"]
     
-    for idx, template in enumerate(hotel_templates):
-        # Calculate dynamic pricing
-        base_price = template["base_price"] * price_multiplier
+    for entry in HOTEL_CATALOG:
+        template = entry["template"]
+        # Address and surroundings stay fixed for a hotel; prices and availability vary by stay
+        place_rng = random.Random(f"{location_key}|{entry['slug']}")
+        stay_rng = random.Random(f"{location_key}|{entry['slug']}|{check_in}|{check_out}")
         
-        # Add seasonal variation (random for demo)
-        seasonal_factor = random.uniform(0.9, 1.2)
-        base_price *= seasonal_factor
+        # Calculate dynamic pricing with a seasonal variation
+        base_price = template["base_price"] * price_multiplier * stay_rng.uniform(0.9, 1.2)
         
-        # Room type pricing
         room_types = [
-            {
-                "type": "Standard Room",
-                "description": "Comfortable room with essential amenities",
-                "price": round(base_price, 2),
-                "beds": "1 Queen Bed",
-                "max_guests": 2,
-                "size": "28 sq m",
-                "view": "City View"
-            },
-            {
-                "type": "Deluxe Room",
-                "description": "Spacious room with premium amenities",
-                "price": round(base_price * 1.4, 2),
-                "beds": "1 King Bed",
-                "max_guests": 2,
-                "size": "35 sq m",
-                "view": "City/Pool View"
-            },
-            {
-                "type": "Superior Suite",
-                "description": "Luxurious suite with separate living area",
-                "price": round(base_price * 2.0, 2),
-                "beds": "1 King Bed + Sofa Bed",
-                "max_guests": 3,
-                "size": "50 sq m",
-                "view": "Premium View"
-            },
-            {
-                "type": "Executive Suite",
-                "description": "Premium suite with executive lounge access",
-                "price": round(base_price * 2.8, 2),
-                "beds": "1 King Bed",
-                "max_guests": 2,
-                "size": "65 sq m",
-                "view": "Panoramic View",
-                "extras": ["Lounge Access", "Free Minibar", "Late Checkout"]
-            }
+            {**tier, "price": round(base_price * multiplier, 2)}
+            for tier, multiplier in zip(entry["room_tiers"], entry["room_multipliers"])
         ]
         
-        # Generate multiple images
-        image_ids = ["1566073771259-6a8506099945", "1582719508461-905c673771fd", "1520250497591-112f2f40a3f4", 
-                     "1551882547-ff40c63fe5fa", "1564501049412-61c2a3083791", "1571003123894-1f0594d2b5d9"]
-        images = [
-            f"https://images.unsplash.com/photo-{image_ids[(idx + i) % len(image_ids)]}?w=800"
-            for i in range(4)
-        ]
+        hotel_id_hash = hashlib.blake2b(f"{location_key}|{entry['slug']}".encode(), digest_size=8).hexdigest()
         
         hotel = {
-            "hotel_id": f"htl_{uuid.uuid4().hex[:8]}",
+            "hotel_id": f"htl_{hotel_id_hash}",
             "name": template["name"],
             "chain": template["chain"],
             "location": city_name,
             "city": city_name,
-            "country": city_info.get("country", "Unknown") if isinstance(city_info, dict) else "Unknown",
-            "address": f"{random.randint(1, 999)} {random.choice(['Main', 'Park', 'Ocean', 'Central', 'Grand'])} {random.choice(['Street', 'Avenue', 'Boulevard', 'Road'])}, {city_name}",
+            "country": place["country"],
+            "address": f"{place_rng.randint(1, 999)} {place_rng.choice(['Main', 'Park', 'Ocean', 'Central', 'Grand'])} {place_rng.choice(['Street', 'Avenue', 'Boulevard', 'Road'])}, {city_name}",
             "coordinates": {
-                "latitude": random.uniform(-60, 60),
-                "longitude": random.uniform(-180, 180)
+                "latitude": place_rng.uniform(-60, 60),
+                "longitude": place_rng.uniform(-180, 180)
             },
             "rating": template["rating"],
-            "reviews_count": template["reviews"] + random.randint(-100, 500),
-            "star_rating": 5 if template["type"] == "luxury" else 4 if template["type"] in ["resort", "upscale", "boutique"] else 3,
+            "reviews_count": template["reviews"] + place_rng.randint(-100, 500),
+            "star_rating": entry["star_rating"],
             "type": template["type"],
             "price_per_night": round(base_price * rooms, 2),
-            "original_price": round(base_price * rooms * 1.15, 2) if random.random() < 0.4 else None,
+            "original_price": round(base_price * rooms * 1.15, 2) if stay_rng.random() < 0.4 else None,
             "currency": "USD",
-            "image_url": images[0],
-            "images": images,
-            "amenities": template["amenities"],
-            "description": f"Experience exceptional hospitality at {template['name']} in the heart of {city_name}. {'Our luxury property offers world-class amenities and unparalleled service.' if template['type'] == 'luxury' else 'Enjoy comfortable accommodations with modern amenities for a memorable stay.'}",
+            "image_url": entry["images"][0],
+            "images": list(entry["images"]),
+            "amenities": list(template["amenities"]),
+            "description": f"Experience exceptional hospitality at {template['name']} in the heart of {city_name}. {entry['pitch']}",
             "room_types": room_types,
             "policies": {
                 "check_in": "15:00",
                 "check_out": "11:00",
-                "cancellation": "Free cancellation up to 24 hours before check-in" if template["type"] in ["luxury", "resort"] else "Free cancellation up to 48 hours before check-in",
-                "pets_allowed": random.choice([True, False]),
+                "cancellation": entry["cancellation"],
+                "pets_allowed": place_rng.choice([True, False]),
                 "smoking": "Non-smoking property"
             },
             "nearby": [
-                {"name": "City Center", "distance": f"{random.uniform(0.5, 3):.1f} km"},
-                {"name": "Airport", "distance": f"{random.uniform(10, 40):.0f} km"},
-                {"name": "Beach" if random.random() < 0.5 else "Shopping District", "distance": f"{random.uniform(1, 5):.1f} km"}
+                {"name": "City Center", "distance": f"{place_rng.uniform(0.5, 3):.1f} km"},
+                {"name": "Airport", "distance": f"{place_rng.uniform(10, 40):.0f} km"},
+                {"name": "Beach" if place_rng.random() < 0.5 else "Shopping District", "distance": f"{place_rng.uniform(1, 5):.1f} km"}
             ],
-            "highlights": generate_hotel_highlights(template["type"]),
-            "available_rooms": random.randint(2, 15),
-            "free_cancellation": template["type"] in ["luxury", "resort", "upscale"],
-            "breakfast_included": template["type"] in ["economy", "budget-friendly"] or random.random() < 0.3
+            "highlights": list(entry["highlights"]),
+            "available_rooms": stay_rng.randint(2, 15),
+            "free_cancellation": entry["free_cancellation"],
+            "breakfast_included": entry["always_breakfast"] or place_rng.random() < 0.3
         }
         
         hotels.append(hotel)
@@ -1622,23 +2808,60 @@ def generate_mock_hotels(location: str, check_in: str = None, check_out: str = N
     
     return hotels
 
-def generate_hotel_highlights(hotel_type: str) -> List[str]:
-    """Generate highlights based on hotel type"""
-    highlights = {
-        "luxury": ["Award-winning spa", "Michelin-starred dining", "Butler service", "Private beach access"],
-        "resort": ["All-inclusive options", "Multiple pools", "Kids activities", "Water sports"],
-        "boutique": ["Unique design", "Personalized service", "Local art collection", "Rooftop terrace"],
-        "business": ["Executive lounge", "Meeting facilities", "Airport shuttle", "24h business center"],
-        "mid-range": ["Great value", "Central location", "Comfortable rooms", "Friendly staff"],
-        "budget-friendly": ["Budget-friendly", "Free breakfast", "Clean rooms", "Good location"],
-        "economy": ["Best price guarantee", "Essential amenities", "Free WiFi", "Parking included"],
-        "lifestyle": ["Trendy atmosphere", "Vibrant nightlife", "Instagram-worthy", "Celebrity hotspot"],
-        "upscale": ["Premium amenities", "Fine dining", "Spa services", "Elegant rooms"]
-    }
-    return highlights.get(hotel_type, ["Great location", "Comfortable stay", "Good amenities"])
-
-@api_router.post("/hotels/search")
-async def search_hotels(search: HotelSearch):
+HOTEL_SEARCH_MAX_HOTELS = int(os.environ.get('HOTEL_SEARCH_MAX_HOTELS', '10'))
+# A default search fits in one offers call; lower this only if the upstream's
+# URL length or latency forces the IDs to be split into concurrent batches
+HOTEL_OFFER_BATCH_SIZE = int(os.environ.get('HOTEL_OFFER_BATCH_SIZE', str(HOTEL_SEARCH_MAX_HOTELS)))
+HOTEL_OFFERS_TIMEOUT_SECONDS = float(os.environ.get('HOTEL_OFFERS_TIMEOUT_SECONDS', str(AMADEUS_TIMEOUT_SECONDS)))
+
+# Reference data changes rarely; "" caches a location Amadeus doesn't know
+hotel_city_code_cache = ResultCache("hotel_city_codes", 4096, ttl=24 * 3600, stale_ttl=7 * 24 * 3600)
+city_hotel_ids_cache = ResultCache("city_hotel_ids", 1024, ttl=6 * 3600, stale_ttl=24 * 3600)
+
+async def resolve_hotel_city_code(location: str) -> str:
+    city_search = await amadeus_adapter.call(
+        amadeus_client.reference_data.locations.get,
+        keyword=location,
+        subType="CITY"
+    )
+    if city_search.data:
+        return city_search.data[0].get("iataCode") or ""
+    return ""
+
+async def fetch_city_hotel_ids(city_code: str) -> List[str]:
+    hotels_by_city = await amadeus_adapter.call(
+        amadeus_client.reference_data.locations.hotels.by_city.get,
+        cityCode=city_code
+    )
+    return [h.get("hotelId") for h in (hotels_by_city.data or [])[:50] if h.get("hotelId")]
+
+async def fetch_hotel_offers(hotel_ids: List[str], search: HotelSearch) -> List[dict]:
+    """Fetch offers for hotel ID batches concurrently; a failed batch only loses its own hotels"""
+    batches = [hotel_ids[i:i + HOTEL_OFFER_BATCH_SIZE] for i in range(0, len(hotel_ids), HOTEL_OFFER_BATCH_SIZE)]
+    results = await asyncio.gather(*(
+        amadeus_adapter.call(
+            amadeus_client.shopping.hotel_offers_search.get,
+            timeout=HOTEL_OFFERS_TIMEOUT_SECONDS,
+            hotelIds=batch,
+            adults=search.guests,
+            checkInDate=search.check_in,
+            checkOutDate=search.check_out
+        )
+        for batch in batches
+    ), return_exceptions=True)
+    
+    offers = []
+    failures = [r for r in results if isinstance(r, BaseException)]
+    for result in results:
+        if not isinstance(result, BaseException) and result.data:
+            offers.extend(result.data)
+    if failures and not offers:
+        raise failures[0]
+    for failure in failures:
+        logger.error(f"Hotel offers batch failed: {failure!r}")
+    return offers
+
+async def fetch_hotel_results(search: HotelSearch) -> dict:
     """Search for hotels using Amadeus API with fallback to mock data"""
     
     # Try Amadeus API first
@@ -1646,36 +2869,25 @@ async def search_hotels(search: HotelSearch):
         try:
             logger.info(f"Searching hotels in: {search.location} for {search.check_in} - {search.check_out}")
             
-            # First, get city code from location
-            city_search = amadeus_client.reference_data.locations.get(
-                keyword=search.location,
-                subType="CITY"
+            # City code and the city's hotel list are near-static, so both come from long-lived caches
+            location_key = normalize_search_text(search.location)
+            city_code = await hotel_city_code_cache.get_or_fetch(
+                location_key,
+                lambda: upstream_searches.do(f"hotel-city:{location_key}", lambda: resolve_hotel_city_code(search.location))
             )
             
-            city_code = None
-            if city_search.data and len(city_search.data) > 0:
-                city_code = city_search.data[0].get("iataCode")
-            
             if city_code:
-                # Get hotels by city
-                hotels_by_city = amadeus_client.reference_data.locations.hotels.by_city.get(
-                    cityCode=city_code
+                hotel_ids = await city_hotel_ids_cache.get_or_fetch(
+                    city_code,
+                    lambda: upstream_searches.do(f"city-hotels:{city_code}", lambda: fetch_city_hotel_ids(city_code))
                 )
                 
-                if hotels_by_city.data:
-                    hotel_ids = [h.get("hotelId") for h in hotels_by_city.data[:10]]
+                if hotel_ids:
+                    hotel_offers = await fetch_hotel_offers(hotel_ids[:HOTEL_SEARCH_MAX_HOTELS], search)
                     
-                    # Get hotel offers
-                    hotel_offers = amadeus_client.shopping.hotel_offers_search.get(
-                        hotelIds=hotel_ids,
-                        adults=search.guests,
-                        checkInDate=search.check_in,
-                        checkOutDate=search.check_out
-                    )
-                    
-                    if hotel_offers.data:
+                    if hotel_offers:
                         hotels = []
-                        for offer in hotel_offers.data[:10]:
+                        for offer in hotel_offers[:HOTEL_SEARCH_MAX_HOTELS]:
                             hotel_info = offer.get("hotel", {})
                             offers = offer.get("offers", [])
                             price = offers[0].get("price", {}).get("total", "0") if offers else "0"
@@ -1693,7 +2905,7 @@ async def search_hotels(search: HotelSearch):
                                 "amenities": hotel_info.get("amenities", ["WiFi", "Restaurant"]),
                                 "description": f"Book your stay at {hotel_info.get('name', 'this hotel')} in {search.location}.",
                                 "room_types": [
-                                    {"type": "Standard", "price": float(price), "beds": "1 Queen"}
+                                    {"type": "Standard Room", "price": float(price), "beds": "1 Queen"}
                                 ]
                             })
                         
@@ -1711,6 +2923,10 @@ async def search_hotels(search: HotelSearch):
                         
                         return {"hotels": hotels, "total": len(hotels), "source": "amadeus"}
                         
+        except CircuitOpenError:
+            logger.info("Amadeus circuit open, skipping live hotel search")
+        except asyncio.TimeoutError:
+            logger.error("Amadeus hotel search timed out")
         except AmadeusResponseError as e:
             logger.error(f"Amadeus Hotel API error: {e}")
         except Exception as e:
@@ -1727,9 +2943,32 @@ async def search_hotels(search: HotelSearch):
     )
     return {"hotels": hotels, "total": len(hotels), "source": "local"}
 
+@api_router.post("/hotels/search")
+async def search_hotels(search: HotelSearch):
+    """Search for hotels, sharing one upstream call across identical concurrent searches"""
+    key = "|".join([
+        search.location.strip().lower(),
+        search.check_in,
+        search.check_out,
+        str(search.guests),
+        str(search.rooms)
+    ])
+    return await upstream_searches.do(f"hotels:{key}", lambda: fetch_hotel_results(search))
+
+FEATURED_HOTEL_ROOM_TYPES = [
+    {"type": "Beach Villa", "capacity": 10, "price": 299, "beds": "1 King", "size": "45 sqm"},
+    {"type": "Overwater Villa", "capacity": 8, "price": 499, "beds": "1 King", "size": "65 sqm"},
+    {"type": "Presidential Suite", "capacity": 2, "price": 899, "beds": "1 King + Living", "size": "120 sqm"}
+]
+
 @api_router.get("/hotels/{hotel_id}")
-async def get_hotel(hotel_id: str):
-    return {
+async def get_hotel(
+    hotel_id: str,
+    check_in: Optional[str] = None,
+    check_out: Optional[str] = None,
+    rooms: int = Query(default=1, ge=1)
+):
+    hotel = {
         "hotel_id": hotel_id,
         "name": "The Grand Resort & Spa",
         "location": "Maldives",
@@ -1744,97 +2983,196 @@ async def get_hotel(hotel_id: str):
         ],
         "amenities": ["Pool", "Spa", "Restaurant", "Gym", "WiFi", "Beach Access", "Water Sports"],
         "description": "Experience paradise at The Grand Resort & Spa. Nestled in pristine waters with overwater villas and world-class amenities.",
-        "room_types": [
-            {"type": "Beach Villa", "price": 299, "beds": "1 King", "size": "45 sqm"},
-            {"type": "Overwater Villa", "price": 499, "beds": "1 King", "size": "65 sqm"},
-            {"type": "Presidential Suite", "price": 899, "beds": "1 King + Living", "size": "120 sqm"}
-        ]
+        "room_types": [dict(room) for room in FEATURED_HOTEL_ROOM_TYPES]
     }
+    
+    if check_in and check_out:
+        room_types = [r["type"] for r in hotel["room_types"]]
+        availability = await get_hotel_availability([hotel_id], check_in, check_out, rooms, room_types)
+        hotel["availability"] = availability[hotel_id]
+    
+    return hotel
 
-# =============== EVENTS ROUTES ===============
+# Per-night room counts live in db.hotel_inventory, one document per
+# (hotel_id, room_type, month) with a "remaining" counter for each day, so a
+# stay is a single-document range check per month instead of a read per night
+# Built from the room lists above so booked room types always have a real capacity
+HOTEL_DEFAULT_ROOM_CAPACITY = {room["type"]: room["capacity"] for room in HOTEL_ROOM_TIERS + FEATURED_HOTEL_ROOM_TYPES}
+HOTEL_FALLBACK_ROOM_CAPACITY = 10
+HOTEL_MAX_STAY_NIGHTS = 30
+HOTEL_AVAILABILITY_MAX_HOTELS = 5000
 
-@api_router.get("/events")
-async def get_events(
-    category: Optional[str] = None,
-    city: Optional[str] = None,
-    limit: int = Query(default=10, le=50)
-):
-    events = [
-        {
-            "event_id": f"evt_{uuid.uuid4().hex[:8]}",
-            "title": "Sunset Safari Experience",
-            "description": "Witness the African savanna come alive at sunset with our exclusive safari tour.",
-            "location": "Serengeti National Park",
-            "city": "Tanzania",
-            "date": "2025-02-15",
-            "time": "16:00",
-            "duration": "4 hours",
-            "price": 150.00,
-            "image_url": "https://images.unsplash.com/photo-1516426122078-c23e76319801?w=800",
-            "category": "Safari",
-            "available_spots": 12,
-            "organizer": "African Adventures"
-        },
-        {
-            "event_id": f"evt_{uuid.uuid4().hex[:8]}",
-            "title": "Tokyo Food Walking Tour",
-            "description": "Explore the hidden culinary gems of Tokyo with local guides.",
-            "location": "Shibuya District",
-            "city": "Tokyo",
-            "date": "2025-02-20",
-            "time": "18:00",
-            "duration": "3 hours",
-            "price": 85.00,
-            "image_url": "https://images.unsplash.com/photo-1540959733332-eab4deabeeaf?w=800",
-            "category": "Food & Culture",
-            "available_spots": 8,
-            "organizer": "Tokyo Tastes"
-        },
-        {
-            "event_id": f"evt_{uuid.uuid4().hex[:8]}",
-            "title": "Northern Lights Adventure",
-            "description": "Chase the Aurora Borealis across the Arctic wilderness.",
-            "location": "Tromsø",
-            "city": "Norway",
-            "date": "2025-03-01",
-            "time": "20:00",
-            "duration": "6 hours",
-            "price": 220.00,
-            "image_url": "https://images.unsplash.com/photo-1531366936337-7c912a4589a7?w=800",
-            "category": "Nature",
-            "available_spots": 15,
-            "organizer": "Arctic Expeditions"
-        },
-        {
-            "event_id": f"evt_{uuid.uuid4().hex[:8]}",
-            "title": "Machu Picchu Sunrise Trek",
-            "description": "Witness the sunrise over the ancient Incan citadel.",
-            "location": "Machu Picchu",
-            "city": "Peru",
-            "date": "2025-03-10",
-            "time": "04:00",
-            "duration": "8 hours",
-            "price": 180.00,
-            "image_url": "https://images.unsplash.com/photo-1587595431973-160d0d94add1?w=800",
-            "category": "Adventure",
-            "available_spots": 10,
-            "organizer": "Inca Trail Tours"
+def hotel_room_capacity(room_type: str) -> int:
+    return HOTEL_DEFAULT_ROOM_CAPACITY.get(room_type, HOTEL_FALLBACK_ROOM_CAPACITY)
+
+def stay_nights_by_month(check_in: str, check_out: str) -> Dict[str, List[int]]:
+    """Map "YYYY-MM" to the zero-based days of that month covered by the stay"""
+    try:
+        start = datetime.strptime(check_in, "%Y-%m-%d").date()
+        end = datetime.strptime(check_out, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    nights = (end - start).days
+    if nights < 1 or nights > HOTEL_MAX_STAY_NIGHTS:
+        raise HTTPException(status_code=400, detail=f"Stay must be between 1 and {HOTEL_MAX_STAY_NIGHTS} nights")
+    months: Dict[str, List[int]] = {}
+    for offset in range(nights):
+        night = start + timedelta(days=offset)
+        months.setdefault(night.strftime("%Y-%m"), []).append(night.day - 1)
+    return months
+
+async def get_hotel_availability(hotel_ids: List[str], check_in: str, check_out: str,
+                                 rooms: int = 1, room_types: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Rooms left per hotel and room type for a stay, from a single $in query"""
+    months = stay_nights_by_month(check_in, check_out)
+    room_types = room_types or [tier["type"] for tier in HOTEL_ROOM_TIERS]
+    
+    query = {"hotel_id": {"$in": hotel_ids}, "month": {"$in": list(months)}, "room_type": {"$in": room_types}}
+    docs = await db.hotel_inventory.find(
+        query,
+        {"_id": 0, "hotel_id": 1, "room_type": 1, "month": 1, "remaining": 1}
+    ).to_list(None)
+    remaining = {(d["hotel_id"], d["room_type"], d["month"]): d["remaining"] for d in docs}
+    
+    availability = {}
+    for hotel_id in hotel_ids:
+        rooms_left = {}
+        for room_type in room_types:
+            left = hotel_room_capacity(room_type)
+            for month, days in months.items():
+                counts = remaining.get((hotel_id, room_type, month))
+                if counts is not None:
+                    left = min(left, min(counts[d] for d in days))
+            rooms_left[room_type] = left
+        availability[hotel_id] = {
+            "available": any(left >= rooms for left in rooms_left.values()),
+            "room_types": rooms_left
         }
-    ]
-    
-    if category:
-        events = [e for e in events if e["category"].lower() == category.lower()]
-    if city:
-        events = [e for e in events if city.lower() in e["city"].lower()]
+    return availability
+
+async def adjust_hotel_rooms(hotel_id: str, room_type: str, month: str, days: List[int], delta: int) -> bool:
+    """Add delta to each night's remaining count, refusing to go below zero"""
+    capacity = hotel_room_capacity(room_type)
+    key = {"hotel_id": hotel_id, "room_type": room_type, "month": month}
+    try:
+        year, month_number = map(int, month.split("-"))
+        await db.hotel_inventory.update_one(
+            key,
+            {"$setOnInsert": {
+                "capacity": capacity,
+                "remaining": [capacity] * calendar.monthrange(year, month_number)[1],
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass
     
-    return {"events": events[:limit], "total": len(events)}
+    guard = {f"remaining.{d}": {"$gte": -delta} for d in days} if delta < 0 else {}
+    result = await db.hotel_inventory.update_one(
+        {**key, **guard},
+        {"$inc": {f"remaining.{d}": delta for d in days}}
+    )
+    return result.matched_count == 1
+
+async def reserve_hotel_rooms(hotel_id: str, room_type: str, check_in: str, check_out: str, rooms: int = 1) -> bool:
+    """Take rooms for every night of the stay, or none if any night is full"""
+    reserved = []
+    for month, days in stay_nights_by_month(check_in, check_out).items():
+        if not await adjust_hotel_rooms(hotel_id, room_type, month, days, -rooms):
+            for done_month, done_days in reserved:
+                await adjust_hotel_rooms(hotel_id, room_type, done_month, done_days, rooms)
+            return False
+        reserved.append((month, days))
+    return True
+
+async def release_hotel_rooms(hotel_id: str, room_type: str, check_in: str, check_out: str, rooms: int = 1):
+    for month, days in stay_nights_by_month(check_in, check_out).items():
+        await adjust_hotel_rooms(hotel_id, room_type, month, days, rooms)
+
+@api_router.post("/hotels/availability")
+async def check_hotel_availability(data: HotelAvailabilityRequest):
+    """Availability for many hotels over one stay, e.g. every hotel in a search result"""
+    if len(data.hotel_ids) > HOTEL_AVAILABILITY_MAX_HOTELS:
+        raise HTTPException(status_code=400, detail=f"At most {HOTEL_AVAILABILITY_MAX_HOTELS} hotels per request")
+    availability = await get_hotel_availability(
+        list(dict.fromkeys(data.hotel_ids)), data.check_in, data.check_out, data.rooms, data.room_types
+    )
+    return {"check_in": data.check_in, "check_out": data.check_out, "rooms": data.rooms, "availability": availability}
+
+# =============== CATALOGS ===============
+
+# Events, vehicles, visa packages, products and gallery items are seeded into
+# their collections with stable IDs, filtered in Mongo, and served through a
+# per-worker cache. Direct edits to the collections show up once entries age
+# out (TTL-bounded staleness); the refresh endpoint only clears the cache of
+# the worker that handles it
+CATALOG_CACHE_TTL_SECONDS = float(os.environ.get('CATALOG_CACHE_TTL_SECONDS', '300'))
+catalog_cache = ResultCache("catalogs", 1024, ttl=CATALOG_CACHE_TTL_SECONDS)
+
+# Fields added at seed time for filtering and ordering, never returned
+CATALOG_INTERNAL_FIELDS = {"_id": 0, "sort_order": 0, "category_key": 0, "effective_price": 0}
+
+def catalog_id(prefix: str, name: str) -> str:
+    return f"{prefix}_{hashlib.blake2b(name.encode(), digest_size=4).hexdigest()}"
+
+def catalog_seed_documents(name: str) -> List[dict]:
+    config = CATALOGS[name]
+    documents = []
+    for position, item in enumerate(config["seed"]):
+        fields = config["name_field"] if isinstance(config["name_field"], tuple) else (config["name_field"],)
+        name_key = "|".join(item[field] for field in fields)
+        doc = {config["id_field"]: catalog_id(config["prefix"], name_key), **item, "sort_order": position}
+        if "category" in doc:
+            doc["category_key"] = doc["category"].lower()
+        if "price" in doc:
+            doc["effective_price"] = doc.get("sale_price") or doc["price"]
+        documents.append(doc)
+    return documents
+
+async def seed_catalogs():
+    """Insert any missing catalog items; existing documents are left as they are"""
+    for name, config in CATALOGS.items():
+        collection = db[config["collection"]]
+        for doc in catalog_seed_documents(name):
+            await collection.update_one(
+                {config["id_field"]: doc[config["id_field"]]},
+                {"$setOnInsert": doc},
+                upsert=True
+            )
+    catalog_cache.invalidate()
+
+async def query_catalog(name: str, query: dict, limit: Optional[int] = None) -> tuple:
+    """Filtered catalog listing as (items, total), served from the catalog cache"""
+    key = f"{name}|{json.dumps(query, sort_keys=True)}|{limit}"
+    
+    async def fetch():
+        collection = db[CATALOGS[name]["collection"]]
+        cursor = collection.find(query, CATALOG_INTERNAL_FIELDS).sort("sort_order", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        items = await cursor.to_list(limit)
+        total = len(items) if not limit or len(items) < limit else await collection.count_documents(query)
+        return items, total
+    
+    return await catalog_cache.get_or_fetch(key, fetch)
+
+async def get_catalog_item(name: str, item_id: str, not_found: str) -> dict:
+    config = CATALOGS[name]
+    item = await catalog_cache.get_or_fetch(
+        f"{name}|id|{item_id}",
+        lambda: db[config["collection"]].find_one({config["id_field"]: item_id}, CATALOG_INTERNAL_FIELDS)
+    )
+    if not item:
+        raise HTTPException(status_code=404, detail=not_found)
+    return item
 
-@api_router.get("/events/{event_id}")
-async def get_event(event_id: str):
-    return {
-        "event_id": event_id,
+# =============== EVENTS ROUTES ===============
+
+EVENT_CATALOG = [
+    {
         "title": "Sunset Safari Experience",
-        "description": "Witness the African savanna come alive at sunset with our exclusive safari tour. Expert guides will take you through the heart of Serengeti, where you'll encounter lions, elephants, zebras, and more in their natural habitat.",
+        "description": "Witness the African savanna come alive at sunset with our exclusive safari tour.",
         "location": "Serengeti National Park",
         "city": "Tanzania",
         "date": "2025-02-15",
@@ -1842,99 +3180,83 @@ async def get_event(event_id: str):
         "duration": "4 hours",
         "price": 150.00,
         "image_url": "https://images.unsplash.com/photo-1516426122078-c23e76319801?w=800",
+        "category": "Safari",
+        "available_spots": 12,
+        "organizer": "African Adventures",
         "images": [
             "https://images.unsplash.com/photo-1516426122078-c23e76319801?w=800",
             "https://images.unsplash.com/photo-1534177616064-ef1dcaabdfc9?w=800"
         ],
-        "category": "Safari",
-        "available_spots": 12,
-        "organizer": "African Adventures",
         "includes": ["Transport", "Guide", "Refreshments", "Binoculars"],
         "meeting_point": "Serengeti Park Gate"
+    },
+    {
+        "title": "Tokyo Food Walking Tour",
+        "description": "Explore the hidden culinary gems of Tokyo with local guides.",
+        "location": "Shibuya District",
+        "city": "Tokyo",
+        "date": "2025-02-20",
+        "time": "18:00",
+        "duration": "3 hours",
+        "price": 85.00,
+        "image_url": "https://images.unsplash.com/photo-1540959733332-eab4deabeeaf?w=800",
+        "category": "Food & Culture",
+        "available_spots": 8,
+        "organizer": "Tokyo Tastes"
+    },
+    {
+        "title": "Northern Lights Adventure",
+        "description": "Chase the Aurora Borealis across the Arctic wilderness.",
+        "location": "Tromsø",
+        "city": "Norway",
+        "date": "2025-03-01",
+        "time": "20:00",
+        "duration": "6 hours",
+        "price": 220.00,
+        "image_url": "https://images.unsplash.com/photo-1531366936337-7c912a4589a7?w=800",
+        "category": "Nature",
+        "available_spots": 15,
+        "organizer": "Arctic Expeditions"
+    },
+    {
+        "title": "Machu Picchu Sunrise Trek",
+        "description": "Witness the sunrise over the ancient Incan citadel.",
+        "location": "Machu Picchu",
+        "city": "Peru",
+        "date": "2025-03-10",
+        "time": "04:00",
+        "duration": "8 hours",
+        "price": 180.00,
+        "image_url": "https://images.unsplash.com/photo-1587595431973-160d0d94add1?w=800",
+        "category": "Adventure",
+        "available_spots": 10,
+        "organizer": "Inca Trail Tours"
     }
+]
 
-# =============== VEHICLES ROUTES ===============
-
-@api_router.get("/vehicles")
-async def get_vehicles(
-    location: Optional[str] = None,
-    vehicle_type: Optional[str] = None,
+@api_router.get("/events")
+async def get_events(
+    category: Optional[str] = None,
+    city: Optional[str] = None,
     limit: int = Query(default=10, le=50)
 ):
-    vehicles = [
-        {
-            "vehicle_id": f"veh_{uuid.uuid4().hex[:8]}",
-            "name": "Toyota Land Cruiser",
-            "type": "suv",
-            "brand": "Toyota",
-            "model": "Land Cruiser",
-            "year": 2024,
-            "price_per_day": 120.00,
-            "image_url": "https://images.unsplash.com/photo-1674476459501-47466da1dbbc?w=800",
-            "location": "Dubai",
-            "features": ["4WD", "GPS", "Air Conditioning", "Bluetooth"],
-            "available": True,
-            "seats": 7,
-            "transmission": "Automatic"
-        },
-        {
-            "vehicle_id": f"veh_{uuid.uuid4().hex[:8]}",
-            "name": "Mercedes-Benz S-Class",
-            "type": "car",
-            "brand": "Mercedes-Benz",
-            "model": "S-Class",
-            "year": 2024,
-            "price_per_day": 250.00,
-            "image_url": "https://images.unsplash.com/photo-1618843479313-40f8afb4b4d8?w=800",
-            "location": "Paris",
-            "features": ["Leather Seats", "GPS", "Premium Audio", "Sunroof"],
-            "available": True,
-            "seats": 5,
-            "transmission": "Automatic"
-        },
-        {
-            "vehicle_id": f"veh_{uuid.uuid4().hex[:8]}",
-            "name": "Vespa Primavera",
-            "type": "bike",
-            "brand": "Vespa",
-            "model": "Primavera 150",
-            "year": 2024,
-            "price_per_day": 45.00,
-            "image_url": "https://images.unsplash.com/photo-1558981285-6f0c94958bb6?w=800",
-            "location": "Rome",
-            "features": ["Helmet Included", "Storage Box"],
-            "available": True,
-            "seats": 2,
-            "transmission": "Automatic"
-        },
-        {
-            "vehicle_id": f"veh_{uuid.uuid4().hex[:8]}",
-            "name": "Ford Transit Van",
-            "type": "van",
-            "brand": "Ford",
-            "model": "Transit",
-            "year": 2023,
-            "price_per_day": 85.00,
-            "image_url": "https://images.unsplash.com/photo-1532593400-3f0b1f3b2c2a?w=800",
-            "location": "London",
-            "features": ["Large Cargo", "GPS", "Air Conditioning"],
-            "available": True,
-            "seats": 9,
-            "transmission": "Automatic"
-        }
-    ]
-    
-    if location:
-        vehicles = [v for v in vehicles if location.lower() in v["location"].lower()]
-    if vehicle_type:
-        vehicles = [v for v in vehicles if v["type"] == vehicle_type]
+    query = {}
+    if category:
+        query["category_key"] = category.lower()
+    if city:
+        query["city"] = {"$regex": re.escape(city), "$options": "i"}
     
-    return {"vehicles": vehicles[:limit], "total": len(vehicles)}
+    events, total = await query_catalog("events", query, limit)
+    return {"events": events, "total": total}
 
-@api_router.get("/vehicles/{vehicle_id}")
-async def get_vehicle(vehicle_id: str):
-    return {
-        "vehicle_id": vehicle_id,
+@api_router.get("/events/{event_id}")
+async def get_event(event_id: str):
+    return await get_catalog_item("events", event_id, "Event not found")
+
+# =============== VEHICLES ROUTES ===============
+
+VEHICLE_CATALOG = [
+    {
         "name": "Toyota Land Cruiser",
         "type": "suv",
         "brand": "Toyota",
@@ -1942,71 +3264,131 @@ async def get_vehicle(vehicle_id: str):
         "year": 2024,
         "price_per_day": 120.00,
         "image_url": "https://images.unsplash.com/photo-1674476459501-47466da1dbbc?w=800",
-        "images": [
-            "https://images.unsplash.com/photo-1674476459501-47466da1dbbc?w=800"
-        ],
         "location": "Dubai",
-        "features": ["4WD", "GPS", "Air Conditioning", "Bluetooth", "Cruise Control", "Backup Camera"],
+        "features": ["4WD", "GPS", "Air Conditioning", "Bluetooth"],
         "available": True,
         "seats": 7,
         "transmission": "Automatic",
+        "images": [
+            "https://images.unsplash.com/photo-1674476459501-47466da1dbbc?w=800"
+        ],
         "fuel_type": "Petrol",
         "mileage_limit": "Unlimited",
         "insurance_included": True,
         "deposit_required": 500.00
+    },
+    {
+        "name": "Mercedes-Benz S-Class",
+        "type": "car",
+        "brand": "Mercedes-Benz",
+        "model": "S-Class",
+        "year": 2024,
+        "price_per_day": 250.00,
+        "image_url": "https://images.unsplash.com/photo-1618843479313-40f8afb4b4d8?w=800",
+        "location": "Paris",
+        "features": ["Leather Seats", "GPS", "Premium Audio", "Sunroof"],
+        "available": True,
+        "seats": 5,
+        "transmission": "Automatic"
+    },
+    {
+        "name": "Vespa Primavera",
+        "type": "bike",
+        "brand": "Vespa",
+        "model": "Primavera 150",
+        "year": 2024,
+        "price_per_day": 45.00,
+        "image_url": "https://images.unsplash.com/photo-1558981285-6f0c94958bb6?w=800",
+        "location": "Rome",
+        "features": ["Helmet Included", "Storage Box"],
+        "available": True,
+        "seats": 2,
+        "transmission": "Automatic"
+    },
+    {
+        "name": "Ford Transit Van",
+        "type": "van",
+        "brand": "Ford",
+        "model": "Transit",
+        "year": 2023,
+        "price_per_day": 85.00,
+        "image_url": "https://images.unsplash.com/photo-1532593400-3f0b1f3b2c2a?w=800",
+        "location": "London",
+        "features": ["Large Cargo", "GPS", "Air Conditioning"],
+        "available": True,
+        "seats": 9,
+        "transmission": "Automatic"
     }
+]
+
+@api_router.get("/vehicles")
+async def get_vehicles(
+    location: Optional[str] = None,
+    vehicle_type: Optional[str] = None,
+    limit: int = Query(default=10, le=50)
+):
+    query = {}
+    if location:
+        query["location"] = {"$regex": re.escape(location), "$options": "i"}
+    if vehicle_type:
+        query["type"] = vehicle_type
+    
+    vehicles, total = await query_catalog("vehicles", query, limit)
+    return {"vehicles": vehicles, "total": total}
+
+@api_router.get("/vehicles/{vehicle_id}")
+async def get_vehicle(vehicle_id: str):
+    return await get_catalog_item("vehicles", vehicle_id, "Vehicle not found")
 
 # =============== VISA PACKAGES ROUTES ===============
 
+VISA_PACKAGE_CATALOG = [
+    {
+        "country": "United States",
+        "visa_type": "Tourist (B1/B2)",
+        "processing_time": "3-5 business days",
+        "price": 199.00,
+        "documents_required": ["Valid Passport", "Photo", "Bank Statement", "Travel Itinerary", "Employment Letter"],
+        "description": "Complete US tourist visa assistance including application review and interview preparation.",
+        "image_url": "https://images.unsplash.com/photo-1485738422979-f5c462d49f74?w=800"
+    },
+    {
+        "country": "United Kingdom",
+        "visa_type": "Standard Visitor",
+        "processing_time": "15 working days",
+        "price": 149.00,
+        "documents_required": ["Valid Passport", "Photo", "Bank Statement", "Accommodation Proof", "Return Ticket"],
+        "description": "UK visitor visa processing with document verification and submission support.",
+        "image_url": "https://images.unsplash.com/photo-1513635269975-59663e0ac1ad?w=800"
+    },
+    {
+        "country": "Schengen Area",
+        "visa_type": "Short Stay (C)",
+        "processing_time": "10-15 working days",
+        "price": 129.00,
+        "documents_required": ["Valid Passport", "Photo", "Travel Insurance", "Hotel Booking", "Flight Itinerary"],
+        "description": "Schengen visa for travel across 27 European countries.",
+        "image_url": "https://images.unsplash.com/photo-1467269204594-9661b134dd2b?w=800"
+    },
+    {
+        "country": "Australia",
+        "visa_type": "Visitor (subclass 600)",
+        "processing_time": "20-30 days",
+        "price": 179.00,
+        "documents_required": ["Valid Passport", "Photo", "Financial Evidence", "Health Insurance", "Character Documents"],
+        "description": "Australian visitor visa with comprehensive application support.",
+        "image_url": "https://images.unsplash.com/photo-1523482580672-f109ba8cb9be?w=800"
+    }
+]
+
 @api_router.get("/visa-packages")
 async def get_visa_packages(country: Optional[str] = None):
-    packages = [
-        {
-            "package_id": f"visa_{uuid.uuid4().hex[:8]}",
-            "country": "United States",
-            "visa_type": "Tourist (B1/B2)",
-            "processing_time": "3-5 business days",
-            "price": 199.00,
-            "documents_required": ["Valid Passport", "Photo", "Bank Statement", "Travel Itinerary", "Employment Letter"],
-            "description": "Complete US tourist visa assistance including application review and interview preparation.",
-            "image_url": "https://images.unsplash.com/photo-1485738422979-f5c462d49f74?w=800"
-        },
-        {
-            "package_id": f"visa_{uuid.uuid4().hex[:8]}",
-            "country": "United Kingdom",
-            "visa_type": "Standard Visitor",
-            "processing_time": "15 working days",
-            "price": 149.00,
-            "documents_required": ["Valid Passport", "Photo", "Bank Statement", "Accommodation Proof", "Return Ticket"],
-            "description": "UK visitor visa processing with document verification and submission support.",
-            "image_url": "https://images.unsplash.com/photo-1513635269975-59663e0ac1ad?w=800"
-        },
-        {
-            "package_id": f"visa_{uuid.uuid4().hex[:8]}",
-            "country": "Schengen Area",
-            "visa_type": "Short Stay (C)",
-            "processing_time": "10-15 working days",
-            "price": 129.00,
-            "documents_required": ["Valid Passport", "Photo", "Travel Insurance", "Hotel Booking", "Flight Itinerary"],
-            "description": "Schengen visa for travel across 27 European countries.",
-            "image_url": "https://images.unsplash.com/photo-1467269204594-9661b134dd2b?w=800"
-        },
-        {
-            "package_id": f"visa_{uuid.uuid4().hex[:8]}",
-            "country": "Australia",
-            "visa_type": "Visitor (subclass 600)",
-            "processing_time": "20-30 days",
-            "price": 179.00,
-            "documents_required": ["Valid Passport", "Photo", "Financial Evidence", "Health Insurance", "Character Documents"],
-            "description": "Australian visitor visa with comprehensive application support.",
-            "image_url": "https://images.unsplash.com/photo-1523482580672-f109ba8cb9be?w=800"
-        }
-    ]
-    
+    query = {}
     if country:
-        packages = [p for p in packages if country.lower() in p["country"].lower()]
+        query["country"] = {"$regex": re.escape(country), "$options": "i"}
     
-    return {"packages": packages, "total": len(packages)}
+    packages, total = await query_catalog("visa_packages", query)
+    return {"packages": packages, "total": total}
 
 # =============== BLOG ROUTES ===============
 
@@ -2110,31 +3492,73 @@ async def get_blog_post(slug: str, request: Request):
         "related_posts": []
     }
     
-    # Get like count and check if user liked
-    likes_count = await db.post_likes.count_documents({"post_id": post["post_id"]})
+    stats = await get_post_stats(post["post_id"])
     user_liked = False
     if user_id:
         user_liked = await db.post_likes.find_one({"post_id": post["post_id"], "user_id": user_id}) is not None
     
-    # Get comments
-    comments = await db.post_comments.find(
-        {"post_id": post["post_id"]},
-        {"_id": 0}
-    ).sort("created_at", -1).limit(50).to_list(50)
-    
-    # Get share count
-    shares_count = await db.post_shares.count_documents({"post_id": post["post_id"]})
+    # First page of comments; the rest come from /social/comments with the cursor
+    comments, comments_next_cursor = await page_comments(db.post_comments, {"post_id": post["post_id"]}, 50)
     
-    post["likes_count"] = likes_count
+    post["likes_count"] = stats["likes_count"]
     post["user_liked"] = user_liked
     post["comments"] = comments
-    post["comments_count"] = len(comments)
-    post["shares_count"] = shares_count
+    post["comments_next_cursor"] = comments_next_cursor
+    post["comments_count"] = stats["comments_count"]
+    post["shares_count"] = stats["shares_count"]
     
     return post
 
 # =============== SOCIAL FEATURES ===============
 
+# Engagement counters live on one post_stats document per post and are kept
+# current with $inc. A post's first counter write seeds the document from the
+# raw collections, so posts that predate the counters need no migration
+POST_STATS_FIELDS = {"_id": 0, "likes_count": 1, "shares_count": 1, "comments_count": 1}
+
+async def count_post_stats(post_id: str) -> dict:
+    return {
+        "likes_count": await db.post_likes.count_documents({"post_id": post_id}),
+        "shares_count": await db.post_shares.count_documents({"post_id": post_id}),
+        "comments_count": await db.post_comments.count_documents({"post_id": post_id})
+    }
+
+async def get_post_stats(post_id: str) -> dict:
+    stats = await db.post_stats.find_one({"post_id": post_id}, POST_STATS_FIELDS)
+    return stats or await count_post_stats(post_id)
+
+async def bump_post_stat(post_id: str, field: str, delta: int) -> dict:
+    """Apply a counter change and return the updated stats"""
+    stats = await db.post_stats.find_one_and_update(
+        {"post_id": post_id},
+        {"$inc": {field: delta}},
+        projection=POST_STATS_FIELDS,
+        return_document=ReturnDocument.AFTER
+    )
+    if stats:
+        return stats
+    
+    # First counter write for this post: the counts already include the row just
+    # written. $max lets racing first writers converge on the highest count
+    # instead of one seeding from zero or adding its row twice
+    counts = await count_post_stats(post_id)
+    try:
+        stats = await db.post_stats.find_one_and_update(
+            {"post_id": post_id},
+            {"$max": counts, "$setOnInsert": {"post_id": post_id}},
+            projection=POST_STATS_FIELDS,
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        stats = await db.post_stats.find_one_and_update(
+            {"post_id": post_id},
+            {"$max": counts},
+            projection=POST_STATS_FIELDS,
+            return_document=ReturnDocument.AFTER
+        )
+    return stats or counts
+
 # Follow/Unfollow
 @api_router.post("/social/follow/{target_user_id}")
 async def follow_user(request: Request, target_user_id: str):
@@ -2158,7 +3582,10 @@ async def follow_user(request: Request, target_user_id: str):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.follows.insert_one(follow_doc)
+    try:
+        await db.follows.insert_one(follow_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Already following this user")
     
     return {"message": "Successfully followed user", "following": True}
 
@@ -2241,11 +3668,14 @@ async def like_post(request: Request, post_id: str):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.post_likes.insert_one(like_doc)
+    try:
+        await db.post_likes.insert_one(like_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Already liked this post")
     
-    likes_count = await db.post_likes.count_documents({"post_id": post_id})
+    stats = await bump_post_stat(post_id, "likes_count", 1)
     
-    return {"message": "Post liked", "liked": True, "likes_count": likes_count}
+    return {"message": "Post liked", "liked": True, "likes_count": stats["likes_count"]}
 
 @api_router.delete("/social/like/{post_id}")
 async def unlike_post(request: Request, post_id: str):
@@ -2259,9 +3689,9 @@ async def unlike_post(request: Request, post_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Haven't liked this post")
     
-    likes_count = await db.post_likes.count_documents({"post_id": post_id})
+    stats = await bump_post_stat(post_id, "likes_count", -1)
     
-    return {"message": "Post unliked", "liked": False, "likes_count": likes_count}
+    return {"message": "Post unliked", "liked": False, "likes_count": stats["likes_count"]}
 
 # Comments
 @api_router.post("/social/comment/{post_id}")
@@ -2286,6 +3716,7 @@ async def add_comment(request: Request, post_id: str):
     }
     
     await db.post_comments.insert_one(comment_doc)
+    await bump_post_stat(post_id, "comments_count", 1)
     
     # Return without _id
     comment_doc.pop("_id", None)
@@ -2293,26 +3724,25 @@ async def add_comment(request: Request, post_id: str):
     return {"message": "Comment added", "comment": comment_doc}
 
 @api_router.get("/social/comments/{post_id}")
-async def get_comments(post_id: str, limit: int = Query(default=50, le=100)):
-    comments = await db.post_comments.find(
-        {"post_id": post_id},
-        {"_id": 0}
-    ).sort("created_at", -1).limit(limit).to_list(limit)
+async def get_comments(post_id: str, limit: int = Query(default=50, ge=1, le=100), cursor: Optional[str] = None):
+    comments, next_cursor = await page_comments(db.post_comments, {"post_id": post_id}, limit, cursor)
     
-    return {"comments": comments, "count": len(comments)}
+    return {"comments": comments, "count": len(comments), "next_cursor": next_cursor}
 
 @api_router.delete("/social/comment/{comment_id}")
 async def delete_comment(request: Request, comment_id: str):
     user = await require_auth(request)
     
-    result = await db.post_comments.delete_one({
+    comment = await db.post_comments.find_one_and_delete({
         "comment_id": comment_id,
         "user_id": user["user_id"]
     })
     
-    if result.deleted_count == 0:
+    if not comment:
         raise HTTPException(status_code=404, detail="Comment not found or not authorized")
     
+    await bump_post_stat(comment["post_id"], "comments_count", -1)
+    
     return {"message": "Comment deleted"}
 
 # Shares
@@ -2331,9 +3761,9 @@ async def share_post(request: Request, post_id: str):
     
     await db.post_shares.insert_one(share_doc)
     
-    shares_count = await db.post_shares.count_documents({"post_id": post_id})
+    stats = await bump_post_stat(post_id, "shares_count", 1)
     
-    return {"message": "Share recorded", "shares_count": shares_count}
+    return {"message": "Share recorded", "shares_count": stats["shares_count"]}
 
 # =============== USER PROFILE ===============
 
@@ -2387,7 +3817,7 @@ async def get_user_profile(user_id: str, request: Request):
     }
 
 @api_router.put("/users/profile")
-async def update_profile(request: Request):
+async def update_profile(request: Request, response: Response):
     user = await require_auth(request)
     body = await request.json()
     
@@ -2407,6 +3837,7 @@ async def update_profile(request: Request):
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_caches(user["user_id"])
     
     # Return updated user
     updated_user = await db.users.find_one(
@@ -2414,6 +3845,19 @@ async def update_profile(request: Request):
         {"_id": 0, "password": 0}
     )
     
+    # Signed session cookies carry the name and picture, so reissue under the same session id
+    claims = verify_session_token(request.cookies.get("session_token", "")) if STATELESS_SESSIONS else None
+    if claims:
+        response.set_cookie(
+            key="session_token",
+            value=create_session_token(updated_user, claims["sid"]),
+            httponly=True,
+            secure=True,
+            samesite="none",
+            path="/",
+            max_age=7 * 24 * 60 * 60  # 7 days
+        )
+    
     return {"message": "Profile updated", "user": updated_user}
 
 @api_router.put("/users/password")
@@ -2436,14 +3880,14 @@ async def change_password(request: Request):
     if not full_user.get("password"):
         raise HTTPException(status_code=400, detail="OAuth users cannot change password")
     
-    if not verify_password(current_password, full_user["password"]):
+    if not await verify_password(current_password, full_user["password"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
     # Update password
     await db.users.update_one(
         {"user_id": user["user_id"]},
         {"$set": {
-            "password": hash_password(new_password),
+            "password": await hash_password(new_password),
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
@@ -2544,7 +3988,7 @@ Please create a detailed day-by-day itinerary with activities, restaurants, and
     
     try:
         user_msg = UserMessage(text=initial_message)
-        response = await chat.send_message(user_msg)
+        response = await llm_breaker.run(chat.send_message, user_msg)
         
         # Save messages
         await db.ai_sessions.update_one(
@@ -2562,6 +4006,8 @@ Please create a detailed day-by-day itinerary with activities, restaurants, and
             "message": response,
             "destination": destination
         }
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="AI planner is temporarily unavailable, please try again shortly")
     except Exception as e:
         logger.error(f"AI error: {e}")
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
@@ -2605,7 +4051,7 @@ async def chat_with_ai(request: Request, session_id: str):
     
     try:
         user_msg = UserMessage(text=message)
-        response = await chat.send_message(user_msg)
+        response = await llm_breaker.run(chat.send_message, user_msg)
         
         # Save messages
         await db.ai_sessions.update_one(
@@ -2622,6 +4068,8 @@ async def chat_with_ai(request: Request, session_id: str):
         )
         
         return {"message": response}
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="AI planner is temporarily unavailable, please try again shortly")
     except Exception as e:
         logger.error(f"AI chat error: {e}")
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
@@ -2719,109 +4167,10 @@ async def delete_ai_session(request: Request, session_id: str):
 
 # =============== STORE (E-COMMERCE) ROUTES ===============
 
-@api_router.get("/store/products")
-async def get_products(
-    category: Optional[str] = None,
-    min_price: Optional[float] = None,
-    max_price: Optional[float] = None,
-    limit: int = Query(default=12, le=50)
-):
-    products = [
-        {
-            "product_id": f"prod_{uuid.uuid4().hex[:8]}",
-            "name": "Travel Backpack 40L",
-            "description": "Durable, waterproof backpack perfect for extended travel.",
-            "price": 129.99,
-            "sale_price": 99.99,
-            "image_url": "https://images.unsplash.com/photo-1553062407-98eeb64c6a62?w=800",
-            "images": ["https://images.unsplash.com/photo-1553062407-98eeb64c6a62?w=800"],
-            "category": "Bags",
-            "stock": 45,
-            "rating": 4.7,
-            "reviews_count": 128
-        },
-        {
-            "product_id": f"prod_{uuid.uuid4().hex[:8]}",
-            "name": "Noise Cancelling Headphones",
-            "description": "Premium wireless headphones for peaceful travels.",
-            "price": 249.99,
-            "sale_price": None,
-            "image_url": "https://images.unsplash.com/photo-1505740420928-5e560c06d30e?w=800",
-            "images": ["https://images.unsplash.com/photo-1505740420928-5e560c06d30e?w=800"],
-            "category": "Electronics",
-            "stock": 32,
-            "rating": 4.9,
-            "reviews_count": 256
-        },
-        {
-            "product_id": f"prod_{uuid.uuid4().hex[:8]}",
-            "name": "Packing Cubes Set",
-            "description": "Keep your luggage organized with this 6-piece packing cube set.",
-            "price": 34.99,
-            "sale_price": 24.99,
-            "image_url": "https://images.unsplash.com/photo-1558618666-fcd25c85cd64?w=800",
-            "images": ["https://images.unsplash.com/photo-1558618666-fcd25c85cd64?w=800"],
-            "category": "Accessories",
-            "stock": 120,
-            "rating": 4.5,
-            "reviews_count": 89
-        },
-        {
-            "product_id": f"prod_{uuid.uuid4().hex[:8]}",
-            "name": "Travel Journal - Leather Bound",
-            "description": "Document your adventures in this premium leather journal.",
-            "price": 45.99,
-            "sale_price": None,
-            "image_url": "https://images.unsplash.com/photo-1544947950-fa07a98d237f?w=800",
-            "images": ["https://images.unsplash.com/photo-1544947950-fa07a98d237f?w=800"],
-            "category": "Books",
-            "stock": 78,
-            "rating": 4.8,
-            "reviews_count": 67
-        },
-        {
-            "product_id": f"prod_{uuid.uuid4().hex[:8]}",
-            "name": "Universal Travel Adapter",
-            "description": "Works in 150+ countries with USB-C and USB-A ports.",
-            "price": 39.99,
-            "sale_price": 29.99,
-            "image_url": "https://images.unsplash.com/photo-1558089687-f282ffcbc126?w=800",
-            "images": ["https://images.unsplash.com/photo-1558089687-f282ffcbc126?w=800"],
-            "category": "Electronics",
-            "stock": 200,
-            "rating": 4.6,
-            "reviews_count": 312
-        },
-        {
-            "product_id": f"prod_{uuid.uuid4().hex[:8]}",
-            "name": "Quick-Dry Travel Towel",
-            "description": "Compact, super absorbent microfiber towel.",
-            "price": 24.99,
-            "sale_price": None,
-            "image_url": "https://images.unsplash.com/photo-1620574387735-3624d75b2dbc?w=800",
-            "images": ["https://images.unsplash.com/photo-1620574387735-3624d75b2dbc?w=800"],
-            "category": "Accessories",
-            "stock": 95,
-            "rating": 4.4,
-            "reviews_count": 54
-        }
-    ]
-    
-    if category:
-        products = [p for p in products if category.lower() in p["category"].lower()]
-    if min_price:
-        products = [p for p in products if (p.get("sale_price") or p["price"]) >= min_price]
-    if max_price:
-        products = [p for p in products if (p.get("sale_price") or p["price"]) <= max_price]
-    
-    return {"products": products[:limit], "total": len(products)}
-
-@api_router.get("/store/products/{product_id}")
-async def get_product(product_id: str):
-    return {
-        "product_id": product_id,
+PRODUCT_CATALOG = [
+    {
         "name": "Travel Backpack 40L",
-        "description": "Durable, waterproof backpack perfect for extended travel. Features include padded laptop compartment, multiple organization pockets, and comfortable ergonomic straps.",
+        "description": "Durable, waterproof backpack perfect for extended travel.",
         "price": 129.99,
         "sale_price": 99.99,
         "image_url": "https://images.unsplash.com/photo-1553062407-98eeb64c6a62?w=800",
@@ -2839,7 +4188,91 @@ async def get_product(product_id: str):
             "Weight": "1.2 kg",
             "Dimensions": "55 x 35 x 25 cm"
         }
+    },
+    {
+        "name": "Noise Cancelling Headphones",
+        "description": "Premium wireless headphones for peaceful travels.",
+        "price": 249.99,
+        "sale_price": None,
+        "image_url": "https://images.unsplash.com/photo-1505740420928-5e560c06d30e?w=800",
+        "images": ["https://images.unsplash.com/photo-1505740420928-5e560c06d30e?w=800"],
+        "category": "Electronics",
+        "stock": 32,
+        "rating": 4.9,
+        "reviews_count": 256
+    },
+    {
+        "name": "Packing Cubes Set",
+        "description": "Keep your luggage organized with this 6-piece packing cube set.",
+        "price": 34.99,
+        "sale_price": 24.99,
+        "image_url": "https://images.unsplash.com/photo-1558618666-fcd25c85cd64?w=800",
+        "images": ["https://images.unsplash.com/photo-1558618666-fcd25c85cd64?w=800"],
+        "category": "Accessories",
+        "stock": 120,
+        "rating": 4.5,
+        "reviews_count": 89
+    },
+    {
+        "name": "Travel Journal - Leather Bound",
+        "description": "Document your adventures in this premium leather journal.",
+        "price": 45.99,
+        "sale_price": None,
+        "image_url": "https://images.unsplash.com/photo-1544947950-fa07a98d237f?w=800",
+        "images": ["https://images.unsplash.com/photo-1544947950-fa07a98d237f?w=800"],
+        "category": "Books",
+        "stock": 78,
+        "rating": 4.8,
+        "reviews_count": 67
+    },
+    {
+        "name": "Universal Travel Adapter",
+        "description": "Works in 150+ countries with USB-C and USB-A ports.",
+        "price": 39.99,
+        "sale_price": 29.99,
+        "image_url": "https://images.unsplash.com/photo-1558089687-f282ffcbc126?w=800",
+        "images": ["https://images.unsplash.com/photo-1558089687-f282ffcbc126?w=800"],
+        "category": "Electronics",
+        "stock": 200,
+        "rating": 4.6,
+        "reviews_count": 312
+    },
+    {
+        "name": "Quick-Dry Travel Towel",
+        "description": "Compact, super absorbent microfiber towel.",
+        "price": 24.99,
+        "sale_price": None,
+        "image_url": "https://images.unsplash.com/photo-1620574387735-3624d75b2dbc?w=800",
+        "images": ["https://images.unsplash.com/photo-1620574387735-3624d75b2dbc?w=800"],
+        "category": "Accessories",
+        "stock": 95,
+        "rating": 4.4,
+        "reviews_count": 54
     }
+]
+
+@api_router.get("/store/products")
+async def get_products(
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    limit: int = Query(default=12, le=50)
+):
+    query = {}
+    if category:
+        query["category"] = {"$regex": re.escape(category), "$options": "i"}
+    # Price filters apply to the sale price when there is one
+    if min_price:
+        query.setdefault("effective_price", {})["$gte"] = min_price
+    if max_price:
+        query.setdefault("effective_price", {})["$lte"] = max_price
+    
+    products, total = await query_catalog("products", query, limit)
+    return {"products": products, "total": total}
+
+@api_router.get("/store/products/{product_id}")
+async def get_product(product_id: str):
+    return await get_catalog_item("products", product_id, "Product not found")
 
 # =============== CART ROUTES ===============
 
@@ -3039,7 +4472,33 @@ async def get_bookings(request: Request):
 async def create_booking(request: Request, booking: BookingCreate):
     user = await require_auth(request)
     
-    booking_id = f"bk_{uuid.uuid4().hex[:12]}"
+    booking_id = f"bk_{uuid.uuid4().hex[:12]}"
+    
+    # Hotel stays with dates take rooms from inventory up front
+    hotel_reservation = None
+    details = booking.item_details or {}
+    if booking.booking_type == "hotel" and details.get("check_in") and details.get("check_out"):
+        # item_details is free-form, so rooms is checked here rather than by the model
+        rooms = details.get("rooms", 1)
+        if isinstance(rooms, str) and rooms.strip().isdigit():
+            rooms = int(rooms)
+        if not isinstance(rooms, int) or isinstance(rooms, bool) or rooms < 1:
+            raise HTTPException(status_code=400, detail="rooms must be a whole number of at least 1")
+        hotel_reservation = {
+            "hotel_id": booking.item_id,
+            "room_type": details.get("room_type") or "Standard Room",
+            "check_in": details["check_in"],
+            "check_out": details["check_out"],
+            "rooms": rooms,
+            "released": False
+        }
+        reserved = await reserve_hotel_rooms(
+            hotel_reservation["hotel_id"], hotel_reservation["room_type"],
+            hotel_reservation["check_in"], hotel_reservation["check_out"], hotel_reservation["rooms"]
+        )
+        if not reserved:
+            raise HTTPException(status_code=400, detail="No rooms available for the selected dates")
+    
     booking_doc = {
         "booking_id": booking_id,
         "user_id": user["user_id"],
@@ -3054,11 +4513,36 @@ async def create_booking(request: Request, booking: BookingCreate):
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
+    if hotel_reservation:
+        booking_doc["hotel_reservation"] = hotel_reservation
     
-    await db.bookings.insert_one(booking_doc)
+    try:
+        await db.bookings.insert_one(booking_doc)
+    except Exception:
+        # No booking means nothing would ever release the rooms, so give them back now
+        if hotel_reservation:
+            await release_hotel_rooms(
+                hotel_reservation["hotel_id"], hotel_reservation["room_type"],
+                hotel_reservation["check_in"], hotel_reservation["check_out"], hotel_reservation["rooms"]
+            )
+        raise
     
     return {"booking_id": booking_id, "status": "pending", "message": "Booking created successfully"}
 
+async def release_booking_inventory(booking_id: str):
+    """Give a cancelled hotel booking's rooms back, once"""
+    booking = await db.bookings.find_one_and_update(
+        {"booking_id": booking_id, "hotel_reservation.released": False},
+        {"$set": {"hotel_reservation.released": True}},
+        projection={"_id": 0, "hotel_reservation": 1}
+    )
+    if booking:
+        reservation = booking["hotel_reservation"]
+        await release_hotel_rooms(
+            reservation["hotel_id"], reservation["room_type"],
+            reservation["check_in"], reservation["check_out"], reservation["rooms"]
+        )
+
 @api_router.get("/bookings/{booking_id}")
 async def get_booking(request: Request, booking_id: str):
     user = await require_auth(request)
@@ -3088,6 +4572,16 @@ class PaystackVerify(BaseModel):
 PAYSTACK_SECRET_KEY = os.environ.get('PAYSTACK_SECRET_KEY')
 PAYSTACK_PUBLIC_KEY = os.environ.get('PAYSTACK_PUBLIC_KEY')
 
+async def paystack_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Call Paystack through its breaker; transport errors and 5xx count as failures"""
+    async def send():
+        client = http_clients.get("api.paystack.co")
+        response = await client.request(method, url, timeout=paystack_breaker.timeout(), **kwargs)
+        if response.status_code >= 500:
+            response.raise_for_status()
+        return response
+    return await paystack_breaker.run(send)
+
 @api_router.post("/payments/paystack/initialize")
 async def initialize_paystack_payment(request: Request, payment: PaystackInitialize):
     """Initialize a Paystack payment transaction"""
@@ -3100,42 +4594,43 @@ async def initialize_paystack_payment(request: Request, payment: PaystackInitial
     if PAYSTACK_SECRET_KEY and PAYSTACK_SECRET_KEY.startswith('sk_'):
         # Real Paystack integration
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.paystack.co/transaction/initialize",
-                    json={
-                        "email": payment.email,
-                        "amount": payment.amount,
-                        "reference": reference,
-                        "callback_url": payment.callback_url,
-                        "metadata": {
-                            "booking_id": payment.booking_id,
-                            "user_id": user["user_id"],
-                            **(payment.metadata or {})
-                        }
-                    },
-                    headers={
-                        "Authorization": f"Bearer {PAYSTACK_SECRET_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                paystack_data = response.json()
-                
-                if paystack_data.get("status"):
-                    return {
-                        "status": True,
-                        "message": "Payment initialized",
-                        "data": {
-                            "authorization_url": paystack_data["data"]["authorization_url"],
-                            "access_code": paystack_data["data"]["access_code"],
-                            "reference": reference
-                        }
+            response = await paystack_request(
+                "POST",
+                "https://api.paystack.co/transaction/initialize",
+                json={
+                    "email": payment.email,
+                    "amount": payment.amount,
+                    "reference": reference,
+                    "callback_url": payment.callback_url,
+                    "metadata": {
+                        "booking_id": payment.booking_id,
+                        "user_id": user["user_id"],
+                        **(payment.metadata or {})
                     }
-                else:
-                    raise HTTPException(status_code=400, detail=paystack_data.get("message", "Failed to initialize payment"))
-        except httpx.HTTPError as e:
+                },
+                headers={
+                    "Authorization": f"Bearer {PAYSTACK_SECRET_KEY}",
+                    "Content-Type": "application/json"
+                }
+            )
+            response.raise_for_status()
+            paystack_data = response.json()
+            
+            if paystack_data.get("status"):
+                return {
+                    "status": True,
+                    "message": "Payment initialized",
+                    "data": {
+                        "authorization_url": paystack_data["data"]["authorization_url"],
+                        "access_code": paystack_data["data"]["access_code"],
+                        "reference": reference
+                    }
+                }
+            else:
+                raise HTTPException(status_code=400, detail=paystack_data.get("message", "Failed to initialize payment"))
+        except CircuitOpenError:
+            raise HTTPException(status_code=503, detail="Payment service temporarily unavailable", headers={"Retry-After": str(int(CIRCUIT_OPEN_SECONDS))})
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
             logger.error(f"Paystack API error: {e}")
             raise HTTPException(status_code=502, detail="Payment service unavailable")
     else:
@@ -3178,45 +4673,46 @@ async def verify_paystack_payment(request: Request, verification: PaystackVerify
     if PAYSTACK_SECRET_KEY and PAYSTACK_SECRET_KEY.startswith('sk_'):
         # Real Paystack verification
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"https://api.paystack.co/transaction/verify/{reference}",
-                    headers={
-                        "Authorization": f"Bearer {PAYSTACK_SECRET_KEY}"
-                    },
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                paystack_data = response.json()
-                
-                if paystack_data.get("status") and paystack_data["data"]["status"] == "success":
-                    # Update booking status
-                    payment_record = await db.payment_transactions.find_one({"reference": reference})
-                    if payment_record:
-                        await db.bookings.update_one(
-                            {"booking_id": payment_record["booking_id"]},
-                            {
-                                "$set": {
-                                    "payment_status": "paid",
-                                    "status": "confirmed",
-                                    "payment_reference": reference,
-                                    "updated_at": datetime.now(timezone.utc).isoformat()
-                                }
+            response = await paystack_request(
+                "GET",
+                f"https://api.paystack.co/transaction/verify/{reference}",
+                headers={
+                    "Authorization": f"Bearer {PAYSTACK_SECRET_KEY}"
+                }
+            )
+            response.raise_for_status()
+            paystack_data = response.json()
+            
+            if paystack_data.get("status") and paystack_data["data"]["status"] == "success":
+                # Update booking status
+                payment_record = await db.payment_transactions.find_one({"reference": reference})
+                if payment_record:
+                    await db.bookings.update_one(
+                        {"booking_id": payment_record["booking_id"]},
+                        {
+                            "$set": {
+                                "payment_status": "paid",
+                                "status": "confirmed",
+                                "payment_reference": reference,
+                                "updated_at": datetime.now(timezone.utc).isoformat()
                             }
-                        )
-                    
-                    return {
-                        "status": True,
-                        "message": "Payment verified successfully",
-                        "data": paystack_data["data"]
-                    }
-                else:
-                    return {
-                        "status": False,
-                        "message": "Payment verification failed",
-                        "data": paystack_data.get("data")
-                    }
-        except httpx.HTTPError as e:
+                        }
+                    )
+                
+                return {
+                    "status": True,
+                    "message": "Payment verified successfully",
+                    "data": paystack_data["data"]
+                }
+            else:
+                return {
+                    "status": False,
+                    "message": "Payment verification failed",
+                    "data": paystack_data.get("data")
+                }
+        except CircuitOpenError:
+            raise HTTPException(status_code=503, detail="Payment verification service temporarily unavailable", headers={"Retry-After": str(int(CIRCUIT_OPEN_SECONDS))})
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
             logger.error(f"Paystack verification error: {e}")
             raise HTTPException(status_code=502, detail="Payment verification service unavailable")
     else:
@@ -3523,69 +5019,85 @@ async def stripe_webhook(request: Request):
 
 # =============== GALLERY ROUTES ===============
 
+GALLERY_CATALOG = [
+    {
+        "type": "image",
+        "url": "https://images.unsplash.com/photo-1653959747793-c7c3775665f0?w=800",
+        "thumbnail": "https://images.unsplash.com/photo-1653959747793-c7c3775665f0?w=400",
+        "title": "Tropical Paradise",
+        "location": "Maldives",
+        "category": "Beaches"
+    },
+    {
+        "type": "image",
+        "url": "https://images.unsplash.com/photo-1516426122078-c23e76319801?w=800",
+        "thumbnail": "https://images.unsplash.com/photo-1516426122078-c23e76319801?w=400",
+        "title": "African Safari",
+        "location": "Serengeti",
+        "category": "Wildlife"
+    },
+    {
+        "type": "image",
+        "url": "https://images.unsplash.com/photo-1531366936337-7c912a4589a7?w=800",
+        "thumbnail": "https://images.unsplash.com/photo-1531366936337-7c912a4589a7?w=400",
+        "title": "Northern Lights",
+        "location": "Norway",
+        "category": "Nature"
+    },
+    {
+        "type": "image",
+        "url": "https://images.unsplash.com/photo-1540959733332-eab4deabeeaf?w=800",
+        "thumbnail": "https://images.unsplash.com/photo-1540959733332-eab4deabeeaf?w=400",
+        "title": "Tokyo Nights",
+        "location": "Japan",
+        "category": "Cities"
+    },
+    {
+        "type": "image",
+        "url": "https://images.unsplash.com/photo-1587595431973-160d0d94add1?w=800",
+        "thumbnail": "https://images.unsplash.com/photo-1587595431973-160d0d94add1?w=400",
+        "title": "Machu Picchu",
+        "location": "Peru",
+        "category": "Historical"
+    },
+    {
+        "type": "image",
+        "url": "https://images.unsplash.com/photo-1467269204594-9661b134dd2b?w=800",
+        "thumbnail": "https://images.unsplash.com/photo-1467269204594-9661b134dd2b?w=400",
+        "title": "Swiss Alps",
+        "location": "Switzerland",
+        "category": "Mountains"
+    }
+]
+
 @api_router.get("/gallery")
 async def get_gallery(category: Optional[str] = None, limit: int = Query(default=20, le=50)):
-    gallery_items = [
-        {
-            "id": f"gal_{uuid.uuid4().hex[:8]}",
-            "type": "image",
-            "url": "https://images.unsplash.com/photo-1653959747793-c7c3775665f0?w=800",
-            "thumbnail": "https://images.unsplash.com/photo-1653959747793-c7c3775665f0?w=400",
-            "title": "Tropical Paradise",
-            "location": "Maldives",
-            "category": "Beaches"
-        },
-        {
-            "id": f"gal_{uuid.uuid4().hex[:8]}",
-            "type": "image",
-            "url": "https://images.unsplash.com/photo-1516426122078-c23e76319801?w=800",
-            "thumbnail": "https://images.unsplash.com/photo-1516426122078-c23e76319801?w=400",
-            "title": "African Safari",
-            "location": "Serengeti",
-            "category": "Wildlife"
-        },
-        {
-            "id": f"gal_{uuid.uuid4().hex[:8]}",
-            "type": "image",
-            "url": "https://images.unsplash.com/photo-1531366936337-7c912a4589a7?w=800",
-            "thumbnail": "https://images.unsplash.com/photo-1531366936337-7c912a4589a7?w=400",
-            "title": "Northern Lights",
-            "location": "Norway",
-            "category": "Nature"
-        },
-        {
-            "id": f"gal_{uuid.uuid4().hex[:8]}",
-            "type": "image",
-            "url": "https://images.unsplash.com/photo-1540959733332-eab4deabeeaf?w=800",
-            "thumbnail": "https://images.unsplash.com/photo-1540959733332-eab4deabeeaf?w=400",
-            "title": "Tokyo Nights",
-            "location": "Japan",
-            "category": "Cities"
-        },
-        {
-            "id": f"gal_{uuid.uuid4().hex[:8]}",
-            "type": "image",
-            "url": "https://images.unsplash.com/photo-1587595431973-160d0d94add1?w=800",
-            "thumbnail": "https://images.unsplash.com/photo-1587595431973-160d0d94add1?w=400",
-            "title": "Machu Picchu",
-            "location": "Peru",
-            "category": "Historical"
-        },
-        {
-            "id": f"gal_{uuid.uuid4().hex[:8]}",
-            "type": "image",
-            "url": "https://images.unsplash.com/photo-1467269204594-9661b134dd2b?w=800",
-            "thumbnail": "https://images.unsplash.com/photo-1467269204594-9661b134dd2b?w=400",
-            "title": "Swiss Alps",
-            "location": "Switzerland",
-            "category": "Mountains"
-        }
-    ]
-    
+    query = {}
     if category:
-        gallery_items = [g for g in gallery_items if category.lower() in g["category"].lower()]
-    
-    return {"items": gallery_items[:limit], "total": len(gallery_items)}
+        query["category"] = {"$regex": re.escape(category), "$options": "i"}
+    
+    gallery_items, total = await query_catalog("gallery", query, limit)
+    return {"items": gallery_items, "total": total}
+
+CATALOGS = {
+    "events": {"collection": "events", "id_field": "event_id", "prefix": "evt", "name_field": "title",
+               "seed": EVENT_CATALOG, "indexes": ["category_key", "sort_order"]},
+    "vehicles": {"collection": "vehicles", "id_field": "vehicle_id", "prefix": "veh", "name_field": "name",
+                 "seed": VEHICLE_CATALOG, "indexes": ["type", "sort_order"]},
+    "visa_packages": {"collection": "visa_packages", "id_field": "package_id", "prefix": "visa", "name_field": ("country", "visa_type"),
+                      "seed": VISA_PACKAGE_CATALOG, "indexes": ["sort_order"]},
+    "products": {"collection": "products", "id_field": "product_id", "prefix": "prod", "name_field": "name",
+                 "seed": PRODUCT_CATALOG, "indexes": ["effective_price", "sort_order"]},
+    "gallery": {"collection": "gallery", "id_field": "id", "prefix": "gal", "name_field": "title",
+                "seed": GALLERY_CATALOG, "indexes": ["sort_order"]},
+}
+
+@api_router.post("/admin/catalogs/refresh")
+async def refresh_catalogs(request: Request):
+    """Re-seed missing catalog items and drop this worker's catalog cache"""
+    await require_admin(request)
+    await seed_catalogs()
+    return {"message": "Catalogs refreshed", "catalogs": list(CATALOGS)}
 
 # =============== ADMIN ROUTES ===============
 
@@ -3651,6 +5163,9 @@ async def update_booking_status(request: Request, booking_id: str):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Booking not found")
     
+    if status == "cancelled":
+        await release_booking_inventory(booking_id)
+    
     return {"message": "Booking status updated"}
 
 # =============== DESTINATIONS (Featured) ===============
@@ -3809,6 +5324,8 @@ async def update_admin_user(request: Request, user_id: str):
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_caches(user_id)
+    await revoke_user_sessions(user_id)
     
     return {"message": "User updated successfully"}
 
@@ -3824,6 +5341,8 @@ async def delete_admin_user(request: Request, user_id: str):
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_caches(user_id)
+    await revoke_user_sessions(user_id)
     
     # Also delete related data
     await db.bookings.delete_many({"user_id": user_id})
@@ -3832,6 +5351,15 @@ async def delete_admin_user(request: Request, user_id: str):
     
     return {"message": "User deleted successfully"}
 
+async def admin_user_summaries(user_ids) -> Dict[str, dict]:
+    """Name and email for each user, fetched with one $in query"""
+    user_ids = list(set(user_ids))
+    users = await db.users.find(
+        {"user_id": {"$in": user_ids}},
+        {"_id": 0, "user_id": 1, "name": 1, "email": 1}
+    ).to_list(len(user_ids))
+    return {user.pop("user_id"): user for user in users}
+
 @api_router.get("/admin/bookings")
 async def get_admin_bookings(
     request: Request,
@@ -3857,12 +5385,9 @@ async def get_admin_bookings(
     ).skip(skip).limit(limit).sort("created_at", -1).to_list(limit)
     
     # Enrich with user info
+    users = await admin_user_summaries(booking["user_id"] for booking in bookings)
     for booking in bookings:
-        user = await db.users.find_one(
-            {"user_id": booking["user_id"]},
-            {"_id": 0, "name": 1, "email": 1}
-        )
-        booking["user"] = user
+        booking["user"] = users.get(booking["user_id"])
     
     return {
         "bookings": bookings,
@@ -3893,6 +5418,9 @@ async def update_admin_booking(request: Request, booking_id: str):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Booking not found")
     
+    if update_data.get("status") == "cancelled":
+        await release_booking_inventory(booking_id)
+    
     return {"message": "Booking updated successfully"}
 
 @api_router.get("/admin/orders")
@@ -3917,12 +5445,9 @@ async def get_admin_orders(
     ).skip(skip).limit(limit).sort("created_at", -1).to_list(limit)
     
     # Enrich with user info
+    users = await admin_user_summaries(order["user_id"] for order in orders)
     for order in orders:
-        user = await db.users.find_one(
-            {"user_id": order["user_id"]},
-            {"_id": 0, "name": 1, "email": 1}
-        )
-        order["user"] = user
+        order["user"] = users.get(order["user_id"])
     
     return {
         "orders": orders,
@@ -3967,6 +5492,8 @@ async def make_user_admin(request: Request, user_id: str):
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_caches(user_id)
+    await revoke_user_sessions(user_id)
     
     return {"message": "User is now an admin"}
 
@@ -3985,11 +5512,44 @@ async def revoke_user_admin(request: Request, user_id: str):
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_caches(user_id)
+    await revoke_user_sessions(user_id)
     
     return {"message": "Admin privileges revoked"}
 
 # =============== ADMIN REPORTS & SETTINGS ===============
 
+@api_router.get("/admin/metrics")
+async def get_admin_metrics(request: Request):
+    """Runtime metrics for upstream adapters and caches"""
+    await require_admin(request)
+    return {
+        "amadeus": amadeus_adapter.stats(),
+        "caches": {
+            "flight_search": flight_search_cache.stats(),
+            "hotel_city_codes": hotel_city_code_cache.stats(),
+            "city_hotel_ids": city_hotel_ids_cache.stats(),
+            "catalogs": catalog_cache.stats(),
+            "http": {path: cache.stats() for path, cache in http_response_caches.items()}
+        },
+        "single_flight": upstream_searches.stats(),
+        "user_profiles": user_profiles.stats(),
+        "auth": auth_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "http_clients": http_clients.stats(),
+        "circuits": {name: breaker.stats() for name, breaker in circuit_breakers.items()},
+        "sessions": {
+            "stateless": STATELESS_SESSIONS,
+            "revocation_filter_entries": session_revocations["filter"].count,
+            "revocation_checks": session_revocations["checks"],
+            "revocation_lookups": session_revocations["confirmations"],
+            "last_sync": session_revocations["last_sync"]
+        },
+        "seat_hold_sweeper": seat_hold_sweep_stats,
+        "public_settings": {"version": public_settings_state["version"], "source": public_settings_state["source"]},
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
 # Available user roles
 USER_ROLES = ["user", "moderator", "support", "manager", "admin", "super_admin"]
 
@@ -4135,6 +5695,8 @@ async def update_user_role(request: Request, user_id: str):
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_caches(user_id)
+    await revoke_user_sessions(user_id)
     
     return {"message": f"User role updated to {new_role}", "is_admin": is_admin}
 
@@ -4209,29 +5771,40 @@ async def update_app_settings(request: Request):
     body["updated_at"] = datetime.now(timezone.utc).isoformat()
     body.pop("_id", None)
     body.pop("setting_id", None)
+    body.pop("version", None)
     
+    # Other workers notice the version bump and reload their copy
     await db.app_settings.update_one(
         {"setting_id": "main"},
-        {"$set": body},
+        {"$set": body, "$inc": {"version": 1}},
         upsert=True
     )
+    await refresh_public_settings()
     
     return {"message": "Settings updated successfully"}
 
-# Public endpoint to get site settings (limited info)
-@api_router.get("/settings/public")
-async def get_public_settings():
-    """Get public site settings"""
-    settings = await db.app_settings.find_one({"setting_id": "main"})
-    
-    if not settings:
-        return {
-            "site_name": "Foster Tours",
-            "social_media": {},
-            "contact_whatsapp": "+2349058681268",
-            "maintenance_mode": False
-        }
-    
+# Public settings are served from memory; writes bump app_settings.version and
+# every worker reloads on the change stream event or its next version poll
+PUBLIC_SETTINGS_POLL_SECONDS = float(os.environ.get('PUBLIC_SETTINGS_POLL_SECONDS', '1'))
+DEFAULT_PUBLIC_SETTINGS = {
+    "site_name": "Foster Tours",
+    "social_media": {},
+    "contact_whatsapp": "+2349058681268",
+    "maintenance_mode": False
+}
+public_settings_state = {"loaded": False, "version": None, "settings": DEFAULT_PUBLIC_SETTINGS, "source": "poll"}
+
+def settings_version(settings: Optional[dict]) -> Optional[int]:
+    return settings.get("version", 0) if settings else None
+
+async def refresh_public_settings():
+    """Reload this worker's copy of the public settings"""
+    settings = await db.app_settings.find_one({"setting_id": "main"}, {"_id": 0})
+    public_settings_state["settings"] = public_settings_view(settings) if settings else DEFAULT_PUBLIC_SETTINGS
+    public_settings_state["version"] = settings_version(settings)
+    public_settings_state["loaded"] = True
+
+def public_settings_view(settings: dict) -> dict:
     return {
         "site_name": settings.get("site_name", "Foster Tours"),
         "site_description": settings.get("site_description", ""),
@@ -4245,6 +5818,14 @@ async def get_public_settings():
         "promo_banner": settings.get("promo_banner", {})
     }
 
+# Public endpoint to get site settings (limited info)
+@api_router.get("/settings/public")
+async def get_public_settings():
+    """Get public site settings"""
+    if not public_settings_state["loaded"]:
+        await refresh_public_settings()
+    return public_settings_state["settings"]
+
 # =============== ADVERTISEMENTS ===============
 
 @api_router.get("/ads")
@@ -4290,6 +5871,7 @@ async def create_advertisement(request: Request):
     }
     
     await db.advertisements.insert_one(ad)
+    invalidate_http_cache("/api/ads")
     return {"message": "Advertisement created", "ad_id": ad["ad_id"]}
 
 @api_router.put("/admin/ads/{ad_id}")
@@ -4310,6 +5892,7 @@ async def update_advertisement(request: Request, ad_id: str):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Advertisement not found")
     
+    invalidate_http_cache("/api/ads")
     return {"message": "Advertisement updated"}
 
 @api_router.delete("/admin/ads/{ad_id}")
@@ -4322,6 +5905,7 @@ async def delete_advertisement(request: Request, ad_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Advertisement not found")
     
+    invalidate_http_cache("/api/ads")
     return {"message": "Advertisement deleted"}
 
 @api_router.post("/ads/{ad_id}/click")
@@ -4362,72 +5946,311 @@ AIRCRAFT_CONFIGS = {
     }
 }
 
+def build_seat_template(aircraft_type: str) -> dict:
+    """Static seat layout and pricing for an aircraft type"""
+    config = AIRCRAFT_CONFIGS[aircraft_type]
+    seats = []
+    layout = config["layout"].replace("_", "")
+    
+    for row in range(1, config["rows"] + 1):
+        for seat_letter in layout:
+            seat_number = f"{row}{seat_letter}"
+            
+            # Determine seat type and price
+            is_window = seat_letter in ['A', 'F', 'K']
+            is_aisle = seat_letter in ['C', 'D', 'G', 'H']
+            is_middle = seat_letter in ['B', 'E', 'J']
+            is_business = row in config["business_rows"]
+            is_exit = row in config["exit_rows"]
+            is_extra_legroom = row in config["extra_legroom_rows"]
+            
+            # Calculate price premium
+            base_price = 0
+            if is_business:
+                base_price = 150
+            elif is_extra_legroom:
+                base_price = 50
+            elif is_exit:
+                base_price = 40
+            elif is_window:
+                base_price = 15
+            elif is_aisle:
+                base_price = 10
+            
+            seats.append({
+                "seat_number": seat_number,
+                "row": row,
+                "column": seat_letter,
+                "is_window": is_window,
+                "is_aisle": is_aisle,
+                "is_middle": is_middle,
+                "is_business": is_business,
+                "is_exit_row": is_exit,
+                "is_extra_legroom": is_extra_legroom,
+                "price": base_price
+            })
+    
+    return {
+        "template_id": f"{aircraft_type}-v1",
+        "aircraft_type": aircraft_type,
+        "layout": config["layout"],
+        "total_rows": config["rows"],
+        "seat_count": len(seats),
+        "seats": seats
+    }
+
+# Built once; flights only store availability bitmaps against these
+SEAT_TEMPLATES = {aircraft_type: build_seat_template(aircraft_type) for aircraft_type in AIRCRAFT_CONFIGS}
+SEAT_TEMPLATE_INDEX = {
+    aircraft_type: {seat["seat_number"]: i for i, seat in enumerate(template["seats"])}
+    for aircraft_type, template in SEAT_TEMPLATES.items()
+}
+DEFAULT_AIRCRAFT_TYPE = "narrow_body"
+
+# Seat state lives in db.seat_inventory as two bitmaps per flight (held, booked),
+# split into 32-bit words so a multi-seat hold is one conditional update
+SEAT_WORD_BITS = 32
+SEAT_WORD_MASK = (1 << SEAT_WORD_BITS) - 1
+SEAT_HOLD_MINUTES = 15
+# Recently released selection IDs kept on each inventory so a repeated release is a no-op
+SEAT_RELEASE_LOG_SIZE = 1000
+SEAT_INVENTORY_PROJECTION = {"_id": 0, "released_holds": 0}
+
+def seat_position(aircraft_type: str, seat_number: str) -> Optional[int]:
+    """Bit position of a seat such as "12C", or None if it isn't on the aircraft"""
+    return SEAT_TEMPLATE_INDEX.get(aircraft_type, {}).get(seat_number)
+
+def seat_word_bits(positions: List[int]) -> Dict[int, List[int]]:
+    words: Dict[int, List[int]] = {}
+    for position in positions:
+        words.setdefault(position // SEAT_WORD_BITS, []).append(position % SEAT_WORD_BITS)
+    return words
+
+def seat_bits_query(field: str, words: Dict[int, List[int]], operator: str) -> dict:
+    return {f"{field}.w{word}": {operator: bits} for word, bits in words.items()}
+
+def seat_bits_update(field: str, words: Dict[int, List[int]], operator: str) -> dict:
+    update = {}
+    for word, bits in words.items():
+        mask = 0
+        for bit in bits:
+            mask |= 1 << bit
+        update[f"{field}.w{word}"] = {operator: Int64(mask if operator == "or" else ~mask & SEAT_WORD_MASK)}
+    return update
+
+def seat_is_set(inventory: dict, field: str, position: int) -> bool:
+    word = int(inventory.get(field, {}).get(f"w{position // SEAT_WORD_BITS}", 0))
+    return bool(word >> (position % SEAT_WORD_BITS) & 1)
+
+def seat_bitmap_bytes(inventory: dict, fields: List[str]) -> bytearray:
+    """OR the named bitmaps into bytes, seat position i at byte i // 8, bit i % 8"""
+    data = bytearray((inventory["seat_count"] + 7) // 8)
+    for field in fields:
+        for key, word in inventory.get(field, {}).items():
+            offset = int(key[1:]) * SEAT_WORD_BITS // 8
+            for i, byte in enumerate(int(word).to_bytes(SEAT_WORD_BITS // 8, "little")):
+                if offset + i < len(data):
+                    data[offset + i] |= byte
+    return data
+
+async def get_seat_inventory(flight_id: str, create: bool = True) -> Optional[dict]:
+    """Load the flight's seat bitmaps, creating them on first use"""
+    inventory = await db.seat_inventory.find_one({"flight_id": flight_id}, SEAT_INVENTORY_PROJECTION)
+    if inventory:
+        return inventory
+    
+    # Flights from before the inventory existed kept a full seat array in flight_seats
+    legacy = await db.flight_seats.find_one(
+        {"flight_id": flight_id},
+        {"_id": 0, "aircraft_type": 1, "seats.seat_number": 1, "seats.status": 1}
+    )
+    if not legacy and not create:
+        return None
+    
+    aircraft_type = (legacy or {}).get("aircraft_type", DEFAULT_AIRCRAFT_TYPE)
+    seat_count = SEAT_TEMPLATES[aircraft_type]["seat_count"]
+    word_count = (seat_count + SEAT_WORD_BITS - 1) // SEAT_WORD_BITS
+    held = [0] * word_count
+    booked = [0] * word_count
+    
+    # Carry over statuses written by the old per-seat updates
+    for seat in (legacy or {}).get("seats", []):
+        status = seat.get("status")
+        position = seat_position(aircraft_type, seat.get("seat_number", ""))
+        if position is None or status not in ("held", "booked"):
+            continue
+        target = held if status == "held" else booked
+        target[position // SEAT_WORD_BITS] |= 1 << (position % SEAT_WORD_BITS)
+    
+    inventory = {
+        "flight_id": flight_id,
+        "aircraft_type": aircraft_type,
+        "template_id": SEAT_TEMPLATES[aircraft_type]["template_id"],
+        "seat_count": seat_count,
+        "held": {f"w{i}": Int64(word) for i, word in enumerate(held)},
+        "booked": {f"w{i}": Int64(word) for i, word in enumerate(booked)},
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    try:
+        await db.seat_inventory.insert_one(dict(inventory))
+    except DuplicateKeyError:
+        # Another request created it first
+        inventory = await db.seat_inventory.find_one({"flight_id": flight_id}, SEAT_INVENTORY_PROJECTION)
+    return inventory
+
+async def flight_aircraft_type(flight_id: str) -> str:
+    inventory = await db.seat_inventory.find_one({"flight_id": flight_id}, {"_id": 0, "aircraft_type": 1})
+    return (inventory or {}).get("aircraft_type", DEFAULT_AIRCRAFT_TYPE)
+
+async def hold_seats(flight_id: str, positions: List[int]) -> bool:
+    """Atomically hold every seat in positions, or none if any is already taken"""
+    words = seat_word_bits(positions)
+    result = await db.seat_inventory.update_one(
+        {
+            "flight_id": flight_id,
+            **seat_bits_query("held", words, "$bitsAllClear"),
+            **seat_bits_query("booked", words, "$bitsAllClear")
+        },
+        {
+            "$bit": seat_bits_update("held", words, "or"),
+            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+        }
+    )
+    return result.matched_count == 1
+
+async def release_seats(flight_id: str, positions: List[int]):
+    if not positions:
+        return
+    words = seat_word_bits(positions)
+    await db.seat_inventory.update_one(
+        {"flight_id": flight_id},
+        {
+            "$bit": seat_bits_update("held", words, "and"),
+            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+        }
+    )
+
+async def selection_seat_positions(selection: dict) -> List[int]:
+    """Bit positions a selection holds; legacy selections are resolved from seat labels,
+    skipping any that aren't on the aircraft"""
+    positions = selection.get("seat_positions")
+    if positions is None:
+        aircraft_type = await flight_aircraft_type(selection["flight_id"])
+        positions = [p for p in (seat_position(aircraft_type, n) for n in selection["seats"]) if p is not None]
+    return positions
+
+async def book_held_seats(flight_id: str, positions: List[int]) -> bool:
+    """Move seats from held to booked, only if all of them are still held"""
+    words = seat_word_bits(positions)
+    result = await db.seat_inventory.update_one(
+        {"flight_id": flight_id, **seat_bits_query("held", words, "$bitsAllSet")},
+        {
+            "$bit": {**seat_bits_update("held", words, "and"), **seat_bits_update("booked", words, "or")},
+            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+        }
+    )
+    return result.matched_count == 1
+
+async def release_selection_seats(selection: dict) -> int:
+    """Clear a selection's held bits once, returning how many seats this call freed"""
+    positions = await selection_seat_positions(selection)
+    update = {
+        "$push": {"released_holds": {"$each": [selection["selection_id"]], "$slice": -SEAT_RELEASE_LOG_SIZE}},
+        "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+    }
+    if positions:
+        update["$bit"] = seat_bits_update("held", seat_word_bits(positions), "and")
+    result = await db.seat_inventory.update_one(
+        {"flight_id": selection["flight_id"], "released_holds": {"$ne": selection["selection_id"]}},
+        update
+    )
+    return len(positions) if result.modified_count == 1 else 0
+
+async def release_expired_seat_holds(flight_id: Optional[str] = None, batch_size: int = 500) -> int:
+    """Expire pending selections past their deadline and free their seats.
+    
+    Driven by the (status, expires_at) index, so the cost tracks the number of
+    expiring holds rather than the size of the inventory.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    query = {"status": "pending", "expires_at": {"$lte": now}}
+    if flight_id:
+        query["flight_id"] = flight_id
+    
+    expired = await db.seat_selections.find(
+        query,
+        {"_id": 0, "selection_id": 1, "flight_id": 1, "seats": 1, "seat_positions": 1}
+    ).limit(batch_size).to_list(batch_size)
+    
+    released = 0
+    for selection in expired:
+        # Seats are freed before the status flips, so a crash in between leaves the
+        # selection pending and the next sweep retries; the release log on the
+        # inventory keeps the retry (or a racing worker) from clearing the bits twice
+        released += await release_selection_seats(selection)
+        await db.seat_selections.update_one(
+            {"selection_id": selection["selection_id"], "status": "pending"},
+            {"$set": {"status": "expired", "expired_at": now}}
+        )
+    
+    return released
+
+@api_router.get("/flights/seat-templates/{aircraft_type}")
+async def get_seat_template(aircraft_type: str):
+    """Static seat layout and pricing for an aircraft type"""
+    template = SEAT_TEMPLATES.get(aircraft_type)
+    if not template:
+        raise HTTPException(status_code=404, detail="Seat template not found")
+    return template
+
 @api_router.get("/flights/{flight_id}/seats")
-async def get_flight_seats(flight_id: str):
-    """Get available seats for a flight"""
-    # Check if seat map exists for this flight
-    seat_map = await db.flight_seats.find_one({"flight_id": flight_id})
-    
-    if not seat_map:
-        # Generate seat map based on aircraft type
-        config = AIRCRAFT_CONFIGS["narrow_body"]
-        seats = []
-        layout = config["layout"].replace("_", "")
-        
-        for row in range(1, config["rows"] + 1):
-            for seat_letter in layout:
-                seat_number = f"{row}{seat_letter}"
-                
-                # Determine seat type and price
-                is_window = seat_letter in ['A', 'F', 'K']
-                is_aisle = seat_letter in ['C', 'D', 'G', 'H']
-                is_middle = seat_letter in ['B', 'E', 'J']
-                is_business = row in config["business_rows"]
-                is_exit = row in config["exit_rows"]
-                is_extra_legroom = row in config["extra_legroom_rows"]
-                
-                # Calculate price premium
-                base_price = 0
-                if is_business:
-                    base_price = 150
-                elif is_extra_legroom:
-                    base_price = 50
-                elif is_exit:
-                    base_price = 40
-                elif is_window:
-                    base_price = 15
-                elif is_aisle:
-                    base_price = 10
-                
-                seat = {
-                    "seat_number": seat_number,
-                    "row": row,
-                    "column": seat_letter,
-                    "is_available": True,
-                    "is_window": is_window,
-                    "is_aisle": is_aisle,
-                    "is_middle": is_middle,
-                    "is_business": is_business,
-                    "is_exit_row": is_exit,
-                    "is_extra_legroom": is_extra_legroom,
-                    "price": base_price,
-                    "status": "available"
-                }
-                seats.append(seat)
-        
-        seat_map = {
+async def get_flight_seats(
+    flight_id: str,
+    format: str = Query(default="full", description="Format: full, compact")
+):
+    """Get available seats for a flight.
+    
+    The compact format returns the template id plus a base64 availability bitmap
+    (seat i of the template at byte i // 8, bit i % 8; 1 means available).
+    """
+    inventory = await get_seat_inventory(flight_id)
+    template = SEAT_TEMPLATES[inventory["aircraft_type"]]
+    unavailable = seat_bitmap_bytes(inventory, ["held", "booked"])
+    
+    if format == "compact":
+        available = bytes(~byte & 0xFF for byte in unavailable)
+        # Clear the padding bits past the last seat
+        if template["seat_count"] % 8:
+            available = available[:-1] + bytes([available[-1] & ((1 << (template["seat_count"] % 8)) - 1)])
+        return {
             "flight_id": flight_id,
-            "aircraft_type": "narrow_body",
-            "layout": config["layout"],
-            "total_rows": config["rows"],
-            "seats": seats,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "format": "compact",
+            "template_id": template["template_id"],
+            "aircraft_type": template["aircraft_type"],
+            "seat_count": template["seat_count"],
+            "available": base64.b64encode(available).decode("ascii")
         }
-        
-        await db.flight_seats.insert_one(seat_map)
     
-    seat_map.pop("_id", None)
-    return seat_map
+    booked = seat_bitmap_bytes(inventory, ["booked"])
+    seats = []
+    for i, seat in enumerate(template["seats"]):
+        status = "available"
+        if booked[i // 8] >> (i % 8) & 1:
+            status = "booked"
+        elif unavailable[i // 8] >> (i % 8) & 1:
+            status = "held"
+        seats.append({**seat, "is_available": status == "available", "status": status})
+    
+    return {
+        "flight_id": flight_id,
+        "aircraft_type": template["aircraft_type"],
+        "template_id": template["template_id"],
+        "layout": template["layout"],
+        "total_rows": template["total_rows"],
+        "seats": seats,
+        "created_at": inventory.get("created_at")
+    }
 
 @api_router.post("/flights/{flight_id}/seats/select")
 async def select_flight_seats(request: Request, flight_id: str):
@@ -4442,25 +6265,43 @@ async def select_flight_seats(request: Request, flight_id: str):
     
     if len(selected_seats) != passenger_count:
         raise HTTPException(status_code=400, detail=f"Please select exactly {passenger_count} seats")
+    if len(set(selected_seats)) != len(selected_seats):
+        raise HTTPException(status_code=400, detail="Each seat can only be selected once")
     
     # Get seat map
-    seat_map = await db.flight_seats.find_one({"flight_id": flight_id})
-    if not seat_map:
+    inventory = await get_seat_inventory(flight_id, create=False)
+    if not inventory:
         raise HTTPException(status_code=404, detail="Flight seat map not found")
     
-    # Verify seats are available
+    template = SEAT_TEMPLATES[inventory["aircraft_type"]]
+    
     total_seat_price = 0
     seat_details = []
+    positions = []
     
     for seat_num in selected_seats:
-        seat = next((s for s in seat_map["seats"] if s["seat_number"] == seat_num), None)
-        if not seat:
+        position = seat_position(inventory["aircraft_type"], seat_num)
+        if position is None:
             raise HTTPException(status_code=400, detail=f"Seat {seat_num} not found")
-        if not seat["is_available"]:
-            raise HTTPException(status_code=400, detail=f"Seat {seat_num} is not available")
         
+        seat = template["seats"][position]
         total_seat_price += seat["price"]
-        seat_details.append(seat)
+        seat_details.append({**seat, "status": "held", "is_available": False})
+        positions.append(position)
+    
+    # Hold all seats in one conditional update, so either every seat is held or none is
+    held = await hold_seats(flight_id, positions)
+    if not held and await release_expired_seat_holds(flight_id):
+        # Some seats were blocked by holds that lapsed before the sweeper got to them
+        held = await hold_seats(flight_id, positions)
+    if not held:
+        inventory = await db.seat_inventory.find_one({"flight_id": flight_id}, SEAT_INVENTORY_PROJECTION)
+        taken = [
+            seat_num for seat_num, position in zip(selected_seats, positions)
+            if seat_is_set(inventory, "held", position) or seat_is_set(inventory, "booked", position)
+        ]
+        detail = f"Seat {', '.join(taken)} is not available" if taken else "Selected seats are no longer available"
+        raise HTTPException(status_code=400, detail=detail)
     
     # Create seat selection record
     selection_id = str(uuid.uuid4())
@@ -4469,22 +6310,16 @@ async def select_flight_seats(request: Request, flight_id: str):
         "flight_id": flight_id,
         "user_id": user["user_id"],
         "seats": selected_seats,
+        "seat_positions": positions,
         "seat_details": seat_details,
         "total_seat_price": total_seat_price,
         "status": "pending",
-        "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=15)).isoformat(),
+        "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=SEAT_HOLD_MINUTES)).isoformat(),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
     await db.seat_selections.insert_one(selection)
     
-    # Temporarily mark seats as held
-    for seat_num in selected_seats:
-        await db.flight_seats.update_one(
-            {"flight_id": flight_id, "seats.seat_number": seat_num},
-            {"$set": {"seats.$.status": "held", "seats.$.held_by": user["user_id"]}}
-        )
-    
     return {
         "selection_id": selection_id,
         "seats": seat_details,
@@ -4503,33 +6338,37 @@ async def confirm_seat_selection(request: Request, flight_id: str):
     selection_id = body.get("selection_id")
     booking_id = body.get("booking_id")
     
-    # Get selection
-    selection = await db.seat_selections.find_one({
+    selection_query = {
         "selection_id": selection_id,
         "user_id": user["user_id"],
         "flight_id": flight_id
-    })
+    }
     
-    if not selection:
-        raise HTTPException(status_code=404, detail="Seat selection not found")
+    # Claim the selection while its hold is still live
+    selection = await db.seat_selections.find_one_and_update(
+        {**selection_query, "status": "pending", "expires_at": {"$gt": datetime.now(timezone.utc).isoformat()}},
+        {"$set": {"status": "confirmed", "booking_id": booking_id}},
+        projection={"_id": 0}
+    )
     
-    # Mark seats as booked
-    for seat_num in selection["seats"]:
-        await db.flight_seats.update_one(
-            {"flight_id": flight_id, "seats.seat_number": seat_num},
-            {"$set": {
-                "seats.$.status": "booked",
-                "seats.$.is_available": False,
-                "seats.$.booked_by": user["user_id"],
-                "seats.$.booking_id": booking_id
-            }}
+    if not selection:
+        existing = await db.seat_selections.find_one(selection_query, {"_id": 0, "status": 1})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Seat selection not found")
+        if existing.get("status") == "confirmed":
+            raise HTTPException(status_code=400, detail="Seat selection already confirmed")
+        raise HTTPException(status_code=400, detail="Seat selection has expired")
+    
+    positions = await selection_seat_positions(selection)
+    
+    # Mark seats as booked; a selection with no seats on the aircraft never held any
+    if not positions or not await book_held_seats(flight_id, positions):
+        logger.error(f"Seat hold lost for selection {selection_id} on flight {flight_id}")
+        await db.seat_selections.update_one(
+            {"selection_id": selection_id},
+            {"$set": {"status": "expired"}, "$unset": {"booking_id": ""}}
         )
-    
-    # Update selection status
-    await db.seat_selections.update_one(
-        {"selection_id": selection_id},
-        {"$set": {"status": "confirmed", "booking_id": booking_id}}
-    )
+        raise HTTPException(status_code=400, detail="Seat selection has expired")
     
     return {"message": "Seats confirmed successfully", "seats": selection["seats"]}
 
@@ -4554,7 +6393,11 @@ def send_email_sync(to_email: str, subject: str, html_content: str) -> bool:
     if not SENDGRID_API_KEY:
         logger.warning("SendGrid API key not configured")
         return False
+    if not sendgrid_breaker.allow():
+        logger.warning(f"SendGrid circuit open, skipping email to {to_email}")
+        return False
     
+    started = time.monotonic()
     try:
         message = Mail(
             from_email=Email(SENDER_EMAIL, "Foster Tours"),
@@ -4564,11 +6407,15 @@ def send_email_sync(to_email: str, subject: str, html_content: str) -> bool:
         )
         
         sg = SendGridAPIClient(SENDGRID_API_KEY)
+        sg.client.timeout = sendgrid_breaker.timeout()
         response = sg.send(message)
+        sendgrid_breaker.record(response.status_code < 500, time.monotonic() - started)
         
         logger.info(f"Email sent to {to_email}, status: {response.status_code}")
         return response.status_code == 202
     except Exception as e:
+        status = getattr(e, "status_code", None)
+        sendgrid_breaker.record(status is not None and status < 500, time.monotonic() - started)
         logger.error(f"Failed to send email: {e}")
         return False
 
@@ -4837,14 +6684,17 @@ async def chatbot_respond(data: ChatbotMessage):
             system_message=get_chatbot_system_prompt()
         ).with_model("openai", "gpt-5.2")
         
-        # Replay previous messages to restore context
-        for msg in history[:-1]:
-            if msg["role"] == "user":
-                await chat.send_message(UserMessage(text=msg["content"]))
+        async def reply():
+            # Replay previous messages to restore context
+            for msg in history[:-1]:
+                if msg["role"] == "user":
+                    await chat.send_message(UserMessage(text=msg["content"]))
+            
+            # Send current user message
+            return await chat.send_message(UserMessage(text=data.message))
         
-        # Send current user message
-        user_msg = UserMessage(text=data.message)
-        response = await chat.send_message(user_msg)
+        # The whole turn is one breaker sample, so a failed replay counts once
+        response = await llm_breaker.run(reply)
         
         # Add assistant response to history
         history.append({"role": "assistant", "content": response})
@@ -4856,7 +6706,8 @@ async def chatbot_respond(data: ChatbotMessage):
         }
         
     except Exception as e:
-        logger.error(f"Chatbot error: {e}")
+        if not isinstance(e, CircuitOpenError):
+            logger.error(f"Chatbot error: {e}")
         return {
             "response": "I'm having a little trouble right now. For immediate help, please reach out to us on WhatsApp at +234 9058 681 268 or Instagram @foster_tours. We're here to help! 🙏",
             "session_id": session_id
@@ -5123,13 +6974,13 @@ async def get_referral_history(request: Request):
         {"referrer_id": user["user_id"]}
     ).sort("created_at", -1).to_list(50)
     
+    profiles = await user_profiles.load(r.get("referred_user_id") for r in referrals)
     for r in referrals:
         r.pop("_id", None)
         # Get referred user info
-        if r.get("referred_user_id"):
-            referred_user = await db.users.find_one({"user_id": r["referred_user_id"]})
-            if referred_user:
-                r["referred_name"] = referred_user.get("name", "User")
+        referred_user = profiles.get(r.get("referred_user_id"))
+        if referred_user:
+            r["referred_name"] = referred_user.get("name", "User")
     
     return {"referrals": referrals}
 
@@ -5145,27 +6996,40 @@ async def get_conversations(request: Request):
         {"participants": user["user_id"]}
     ).sort("last_message_at", -1).to_list(50)
     
+    other_ids = {
+        conv["conversation_id"]: [p for p in conv["participants"] if p != user["user_id"]][0] if len(conv["participants"]) > 1 else None
+        for conv in conversations
+    }
+    profiles = await user_profiles.load(other_ids.values())
+    
+    # Unread counts for every conversation in one aggregation
+    unread_counts = {
+        row["_id"]: row["count"]
+        for row in await db.messages.aggregate([
+            {"$match": {
+                "conversation_id": {"$in": list(other_ids)},
+                "receiver_id": user["user_id"],
+                "read": False
+            }},
+            {"$group": {"_id": "$conversation_id", "count": {"$sum": 1}}}
+        ]).to_list(None)
+    }
+    
     result = []
     for conv in conversations:
         conv.pop("_id", None)
         
         # Get other participant info
-        other_id = [p for p in conv["participants"] if p != user["user_id"]][0] if len(conv["participants"]) > 1 else None
+        other_id = other_ids[conv["conversation_id"]]
         if other_id:
-            other_user = await db.users.find_one({"user_id": other_id})
+            other_user = profiles.get(other_id)
             conv["other_user"] = {
                 "user_id": other_id,
-                "name": other_user.get("name", "User") if other_user else "User",
+                "name": profile_name(other_user),
                 "avatar": other_user.get("avatar") if other_user else None
             }
         
-        # Get unread count
-        unread_count = await db.messages.count_documents({
-            "conversation_id": conv["conversation_id"],
-            "receiver_id": user["user_id"],
-            "read": False
-        })
-        conv["unread_count"] = unread_count
+        conv["unread_count"] = unread_counts.get(conv["conversation_id"], 0)
         
         result.append(conv)
     
@@ -5684,6 +7548,15 @@ async def send_message_with_media(
 
 # =============== TRAVEL STORIES ROUTES ===============
 
+async def story_interactions(stories: List[dict], user_id: str) -> tuple:
+    """IDs of the given stories the user has liked and viewed, as two sets"""
+    story_ids = [story["story_id"] for story in stories]
+    query = {"story_id": {"$in": story_ids}, "user_id": user_id}
+    projection = {"_id": 0, "story_id": 1}
+    liked = {doc["story_id"] for doc in await db.story_likes.find(query, projection).to_list(None)}
+    viewed = {doc["story_id"] for doc in await db.story_views.find(query, projection).to_list(None)}
+    return liked, viewed
+
 @api_router.get("/stories")
 async def get_stories(request: Request, user_id: Optional[str] = None):
     """Get active stories (not expired)"""
@@ -5696,6 +7569,9 @@ async def get_stories(request: Request, user_id: Optional[str] = None):
         query["user_id"] = user_id
     
     stories = await db.stories.find(query).sort("created_at", -1).to_list(100)
+    profiles = await user_profiles.load(story["user_id"] for story in stories)
+    if current_user:
+        liked, viewed = await story_interactions(stories, current_user["user_id"])
     
     # Group stories by user
     stories_by_user = {}
@@ -5703,25 +7579,17 @@ async def get_stories(request: Request, user_id: Optional[str] = None):
         story.pop("_id", None)
         uid = story["user_id"]
         if uid not in stories_by_user:
-            # Get user info
-            story_user = await db.users.find_one({"user_id": uid})
             stories_by_user[uid] = {
                 "user_id": uid,
-                "user_name": story_user.get("name", "User") if story_user else "User",
-                "user_avatar": story_user.get("picture") or story_user.get("avatar") if story_user else None,
+                "user_name": profile_name(profiles.get(uid)),
+                "user_avatar": profile_avatar(profiles.get(uid)),
                 "stories": []
             }
         
         # Check if current user liked/viewed
         if current_user:
-            story["is_liked"] = await db.story_likes.find_one({
-                "story_id": story["story_id"],
-                "user_id": current_user["user_id"]
-            }) is not None
-            story["is_viewed"] = await db.story_views.find_one({
-                "story_id": story["story_id"],
-                "user_id": current_user["user_id"]
-            }) is not None
+            story["is_liked"] = story["story_id"] in liked
+            story["is_viewed"] = story["story_id"] in viewed
         
         stories_by_user[uid]["stories"].append(story)
     
@@ -5743,6 +7611,8 @@ async def get_stories_feed(request: Request):
         "user_id": {"$in": following_ids},
         "expires_at": {"$gt": now}
     }).sort("created_at", -1).to_list(100)
+    profiles = await user_profiles.load(story["user_id"] for story in stories)
+    liked, viewed = await story_interactions(stories, user["user_id"])
     
     # Group stories by user
     stories_by_user = {}
@@ -5750,26 +7620,19 @@ async def get_stories_feed(request: Request):
         story.pop("_id", None)
         uid = story["user_id"]
         if uid not in stories_by_user:
-            story_user = await db.users.find_one({"user_id": uid})
             stories_by_user[uid] = {
                 "user_id": uid,
-                "user_name": story_user.get("name", "User") if story_user else "User",
-                "user_avatar": story_user.get("picture") or story_user.get("avatar") if story_user else None,
+                "user_name": profile_name(profiles.get(uid)),
+                "user_avatar": profile_avatar(profiles.get(uid)),
                 "stories": [],
                 "has_unseen": False
             }
         
         # Check if viewed
-        is_viewed = await db.story_views.find_one({
-            "story_id": story["story_id"],
-            "user_id": user["user_id"]
-        }) is not None
+        is_viewed = story["story_id"] in viewed
         
         story["is_viewed"] = is_viewed
-        story["is_liked"] = await db.story_likes.find_one({
-            "story_id": story["story_id"],
-            "user_id": user["user_id"]
-        }) is not None
+        story["is_liked"] = story["story_id"] in liked
         
         if not is_viewed:
             stories_by_user[uid]["has_unseen"] = True
@@ -5892,11 +7755,16 @@ async def get_story(request: Request, story_id: str):
         })
         
         if not existing_view:
-            await db.story_views.insert_one({
-                "story_id": story_id,
-                "user_id": user["user_id"],
-                "created_at": datetime.now(timezone.utc).isoformat()
-            })
+            try:
+                await db.story_views.insert_one({
+                    "story_id": story_id,
+                    "user_id": user["user_id"],
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                })
+            except DuplicateKeyError:
+                # A concurrent request already recorded this view
+                existing_view = True
+        if not existing_view:
             await db.stories.update_one(
                 {"story_id": story_id},
                 {"$inc": {"views_count": 1}}
@@ -6002,11 +7870,14 @@ async def like_story(request: Request, story_id: str):
         return {"liked": False, "message": "Story unliked"}
     else:
         # Like
-        await db.story_likes.insert_one({
-            "story_id": story_id,
-            "user_id": user["user_id"],
-            "created_at": datetime.now(timezone.utc).isoformat()
-        })
+        try:
+            await db.story_likes.insert_one({
+                "story_id": story_id,
+                "user_id": user["user_id"],
+                "created_at": datetime.now(timezone.utc).isoformat()
+            })
+        except DuplicateKeyError:
+            return {"liked": True, "message": "Story liked"}
         await db.stories.update_one(
             {"story_id": story_id},
             {"$inc": {"likes_count": 1}}
@@ -6014,26 +7885,29 @@ async def like_story(request: Request, story_id: str):
         return {"liked": True, "message": "Story liked"}
 
 @api_router.get("/stories/{story_id}/comments")
-async def get_story_comments(request: Request, story_id: str):
+async def get_story_comments(
+    request: Request,
+    story_id: str,
+    limit: int = Query(default=100, ge=1, le=100),
+    cursor: Optional[str] = None
+):
     """Get comments for a story"""
     story = await db.stories.find_one({"story_id": story_id})
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
     
-    comments = await db.story_comments.find(
-        {"story_id": story_id}
-    ).sort("created_at", -1).to_list(100)
+    comments, next_cursor = await page_comments(db.story_comments, {"story_id": story_id}, limit, cursor)
     
+    profiles = await user_profiles.load(comment["user_id"] for comment in comments)
     result = []
     for comment in comments:
-        comment.pop("_id", None)
         # Get commenter info
-        commenter = await db.users.find_one({"user_id": comment["user_id"]})
-        comment["user_name"] = commenter.get("name", "User") if commenter else "User"
-        comment["user_avatar"] = commenter.get("picture") or commenter.get("avatar") if commenter else None
+        commenter = profiles.get(comment["user_id"])
+        comment["user_name"] = profile_name(commenter)
+        comment["user_avatar"] = profile_avatar(commenter)
         result.append(comment)
     
-    return {"comments": result}
+    return {"comments": result, "next_cursor": next_cursor}
 
 @api_router.post("/stories/{story_id}/comments")
 async def add_story_comment(request: Request, story_id: str):
@@ -6116,9 +7990,7 @@ async def get_favorites(request: Request, item_type: Optional[str] = None):
             # Destinations are static, return the item_id as reference
             item_data = {"destination_id": fav["item_id"]}
         elif fav["item_type"] == "product":
-            item_data = await db.products.find_one({"product_id": fav["item_id"]})
-            if item_data:
-                item_data.pop("_id", None)
+            item_data = await db.products.find_one({"product_id": fav["item_id"]}, CATALOG_INTERNAL_FIELDS)
         elif fav["item_type"] == "blog_post":
             item_data = await db.blog_posts.find_one({"post_id": fav["item_id"]})
             if item_data:
@@ -6162,7 +8034,10 @@ async def add_favorite(request: Request):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.favorites.insert_one(favorite)
+    try:
+        await db.favorites.insert_one(favorite)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Already in favorites")
     favorite.pop("_id", None)
     
     return {"favorite": favorite, "message": "Added to favorites"}
@@ -6339,18 +8214,21 @@ async def get_call_history(request: Request, limit: int = Query(50)):
         ]
     }).sort("created_at", -1).limit(limit).to_list(limit)
     
+    profiles = await user_profiles.load(
+        call["receiver_id"] if call["caller_id"] == user["user_id"] else call["caller_id"] for call in calls
+    )
     result = []
     for call in calls:
         call.pop("_id", None)
         
         # Get other user info
         other_id = call["receiver_id"] if call["caller_id"] == user["user_id"] else call["caller_id"]
-        other_user = await db.users.find_one({"user_id": other_id})
+        other_user = profiles.get(other_id)
         
         call["other_user"] = {
             "user_id": other_id,
-            "name": other_user.get("name", "User") if other_user else "User",
-            "avatar": other_user.get("picture") or other_user.get("avatar") if other_user else None
+            "name": profile_name(other_user),
+            "avatar": profile_avatar(other_user)
         }
         call["is_outgoing"] = call["caller_id"] == user["user_id"]
         
@@ -6489,14 +8367,15 @@ async def get_friends_locations(request: Request):
         "sharing_enabled": True
     }).to_list(100)
     
+    profiles = await user_profiles.load(loc["user_id"] for loc in locations)
     result = []
     for loc in locations:
         loc.pop("_id", None)
         
         # Get user info
-        loc_user = await db.users.find_one({"user_id": loc["user_id"]})
-        loc["user_name"] = loc_user.get("name", "User") if loc_user else "User"
-        loc["user_avatar"] = loc_user.get("picture") or loc_user.get("avatar") if loc_user else None
+        loc_user = profiles.get(loc["user_id"])
+        loc["user_name"] = profile_name(loc_user)
+        loc["user_avatar"] = profile_avatar(loc_user)
         
         result.append(loc)
     
@@ -6520,8 +8399,9 @@ async def get_my_location_sharing(request: Request):
     
     # Get names of users we're sharing with
     shared_with = []
+    profiles = await user_profiles.load(location.get("visible_to", []))
     for uid in location.get("visible_to", []):
-        shared_user = await db.users.find_one({"user_id": uid})
+        shared_user = profiles.get(uid)
         if shared_user:
             shared_with.append({
                 "user_id": uid,
@@ -6713,6 +8593,62 @@ async def cleanup_expired_stories():
     
     return len(expired)
 
+SEAT_HOLD_SWEEP_SECONDS = int(os.environ.get('SEAT_HOLD_SWEEP_SECONDS', '30'))
+seat_hold_sweep_stats = {"runs": 0, "seats_released": 0, "last_run": None}
+
+async def seat_hold_sweeper():
+    """Background loop that releases expired seat holds"""
+    while True:
+        try:
+            while True:
+                released = await release_expired_seat_holds()
+                seat_hold_sweep_stats["seats_released"] += released
+                if not released:
+                    break
+            seat_hold_sweep_stats["runs"] += 1
+            seat_hold_sweep_stats["last_run"] = datetime.now(timezone.utc).isoformat()
+        except Exception as e:
+            logger.error(f"Seat hold sweep failed: {e}")
+        await asyncio.sleep(SEAT_HOLD_SWEEP_SECONDS)
+
+async def public_settings_watcher():
+    """Background loop that keeps this worker's public settings current"""
+    try:
+        async with db.app_settings.watch() as stream:
+            public_settings_state["source"] = "change_stream"
+            await refresh_public_settings()
+            async for _ in stream:
+                await refresh_public_settings()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # Change streams need a replica set; poll the version counter instead
+        logger.info(f"Settings change stream unavailable, polling: {e}")
+    
+    public_settings_state["source"] = "poll"
+    while True:
+        try:
+            settings = await db.app_settings.find_one({"setting_id": "main"}, {"_id": 0, "version": 1})
+            if not public_settings_state["loaded"] or settings_version(settings) != public_settings_state["version"]:
+                await refresh_public_settings()
+        except Exception as e:
+            logger.error(f"Settings poll failed: {e}")
+        await asyncio.sleep(PUBLIC_SETTINGS_POLL_SECONDS)
+
+async def session_revocation_sync():
+    """Background loop that folds other workers' session revocations into the filter"""
+    last_rebuild = time.time()
+    while True:
+        await asyncio.sleep(SESSION_REVOCATION_SYNC_SECONDS)
+        try:
+            # Rebuild hourly so expired revocations drop out of the filter
+            full = time.time() - last_rebuild > 3600
+            await load_session_revocations(full=full)
+            if full:
+                last_rebuild = time.time()
+        except Exception as e:
+            logger.error(f"Session revocation sync failed: {e}")
+
 @api_router.post("/admin/cleanup-stories")
 async def admin_cleanup_stories(request: Request):
     """Admin endpoint to manually trigger story cleanup"""
@@ -6725,13 +8661,243 @@ async def admin_cleanup_stories(request: Request):
 # Health check endpoint
 @api_router.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
+    circuits = {name: breaker.stats() for name, breaker in circuit_breakers.items()}
+    degraded = any(circuit["state"] != "closed" for circuit in circuits.values())
+    return {
+        "status": "degraded" if degraded else "healthy",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "circuits": circuits
+    }
 
 # Root endpoint
 @api_router.get("/")
 async def root():
     return {"message": "Travel & Tours API", "version": "1.0.0"}
 
+# =============== INDEXES ===============
+
+# Every index the queries above rely on, as (collection, keys, options).
+# Applied at startup; INDEX_PROVISIONING=dry_run only logs what is missing
+# and =off skips the check entirely
+INDEX_PROVISIONING = os.environ.get('INDEX_PROVISIONING', 'apply').lower()
+
+INDEX_REGISTRY = [
+    # Users and auth
+    ("users", [("user_id", 1)], {"unique": True}),
+    ("users", [("email", 1)], {"unique": True}),
+    ("users", [("referral_code", 1)], {"unique": True, "partialFilterExpression": {"referral_code": {"$type": "string"}}}),
+    ("users", [("created_at", -1)], {}),
+    ("user_sessions", [("session_token", 1)], {"unique": True}),
+    ("session_revocations", [("key", 1)], {"unique": True}),
+    ("session_revocations", [("revoked_at", 1)], {}),
+    ("session_revocations", [("expires_at", 1)], {"expireAfterSeconds": 0}),
+    ("ai_sessions", [("session_id", 1)], {}),
+    ("ai_sessions", [("user_id", 1), ("updated_at", -1)], {}),
+    # Social
+    ("follows", [("follower_id", 1), ("following_id", 1)], {"unique": True}),
+    ("follows", [("following_id", 1)], {}),
+    ("post_likes", [("post_id", 1), ("user_id", 1)], {"unique": True}),
+    ("post_shares", [("post_id", 1)], {}),
+    ("post_comments", [("post_id", 1), ("created_at", -1), ("comment_id", -1)], {}),
+    ("post_comments", [("comment_id", 1)], {"unique": True}),
+    ("post_stats", [("post_id", 1)], {"unique": True}),
+    ("stories", [("story_id", 1)], {"unique": True}),
+    ("stories", [("user_id", 1), ("expires_at", 1)], {}),
+    ("stories", [("expires_at", 1)], {}),
+    ("story_likes", [("story_id", 1), ("user_id", 1)], {"unique": True}),
+    ("story_views", [("story_id", 1), ("user_id", 1)], {"unique": True}),
+    ("story_comments", [("story_id", 1), ("created_at", -1), ("comment_id", -1)], {}),
+    ("story_comments", [("comment_id", 1)], {"unique": True}),
+    ("favorites", [("user_id", 1), ("item_type", 1), ("item_id", 1)], {"unique": True}),
+    ("referrals", [("referrer_id", 1), ("created_at", -1)], {}),
+    # Messaging, calls and location
+    ("conversations", [("conversation_id", 1)], {"unique": True}),
+    ("conversations", [("participants", 1), ("last_message_at", -1)], {}),
+    ("messages", [("conversation_id", 1), ("receiver_id", 1), ("read", 1)], {}),
+    ("messages", [("conversation_id", 1), ("created_at", -1)], {}),
+    ("calls", [("call_id", 1)], {"unique": True}),
+    ("calls", [("caller_id", 1), ("created_at", -1)], {}),
+    ("calls", [("receiver_id", 1), ("created_at", -1)], {}),
+    ("user_locations", [("user_id", 1)], {"unique": True}),
+    ("user_locations", [("visible_to", 1), ("sharing_enabled", 1)], {}),
+    ("upload_sessions", [("upload_id", 1)], {"unique": True}),
+    # Commerce
+    ("bookings", [("booking_id", 1)], {"unique": True}),
+    ("bookings", [("user_id", 1), ("created_at", -1)], {}),
+    ("bookings", [("created_at", -1)], {}),
+    ("bookings", [("payment_status", 1)], {}),
+    ("store_orders", [("order_id", 1)], {"unique": True}),
+    ("store_orders", [("user_id", 1), ("created_at", -1)], {}),
+    ("store_orders", [("created_at", -1)], {}),
+    ("store_orders", [("payment_status", 1)], {}),
+    ("payment_transactions", [("reference", 1)], {}),
+    ("payment_transactions", [("session_id", 1)], {}),
+    ("carts", [("user_id", 1)], {"unique": True}),
+    ("wallet_transactions", [("user_id", 1), ("created_at", -1)], {}),
+    ("rewards_transactions", [("user_id", 1), ("created_at", -1)], {}),
+    ("itineraries", [("itinerary_id", 1)], {"unique": True}),
+    ("itineraries", [("user_id", 1), ("created_at", -1)], {}),
+    ("advertisements", [("ad_id", 1)], {"unique": True}),
+    ("advertisements", [("is_active", 1), ("priority", -1)], {}),
+    ("app_settings", [("setting_id", 1)], {"unique": True}),
+    # Inventory
+    ("seat_inventory", [("flight_id", 1)], {"unique": True}),
+    ("seat_selections", [("selection_id", 1)], {"unique": True}),
+    ("seat_selections", [("status", 1), ("expires_at", 1)], {}),
+    ("hotel_inventory", [("hotel_id", 1), ("room_type", 1), ("month", 1)], {"unique": True}),
+] + [
+    (config["collection"], [(field, 1)], {"unique": field == config["id_field"]})
+    for config in CATALOGS.values()
+    for field in [config["id_field"], *config["indexes"]]
+]
+
+async def plan_indexes() -> List[dict]:
+    """Compare the registry against the live indexes without changing anything"""
+    existing: Dict[str, dict] = {}
+    report = []
+    for collection, keys, options in INDEX_REGISTRY:
+        if collection not in existing:
+            try:
+                existing[collection] = await db[collection].index_information()
+            except Exception:
+                # Collections that don't exist yet have no indexes
+                existing[collection] = {}
+        entry = {"collection": collection, "keys": keys, "unique": options.get("unique", False), "status": "missing"}
+        for name, info in existing[collection].items():
+            if [tuple(key) for key in info["key"]] == keys:
+                entry["name"] = name
+                entry["status"] = "present" if info.get("unique", False) == entry["unique"] else "conflict"
+                break
+        report.append(entry)
+    return report
+
+async def provision_indexes(dry_run: bool = False) -> List[dict]:
+    """Create missing registry indexes, or just report them when dry_run is set"""
+    report = await plan_indexes()
+    for entry, (collection, keys, options) in zip(report, INDEX_REGISTRY):
+        if entry["status"] != "missing" or dry_run:
+            continue
+        try:
+            entry["name"] = await db[collection].create_index(keys, **options)
+            entry["status"] = "created"
+        except Exception as e:
+            # Usually existing duplicates blocking a unique index
+            entry["status"] = "failed"
+            entry["error"] = str(e)
+    
+    counts: Dict[str, int] = {}
+    for entry in report:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        if entry["status"] in ("missing", "conflict", "failed"):
+            logger.warning(f"Index {entry['collection']} {entry['keys']}: {entry['status']} {entry.get('error', '')}".rstrip())
+    logger.info(f"Index provisioning{' (dry run)' if dry_run else ''}: {counts}")
+    return report
+
+@api_router.get("/admin/indexes")
+async def get_index_report(request: Request):
+    """Dry-run report of registry indexes against the database"""
+    await require_admin(request)
+    report = await plan_indexes()
+    return {"indexes": report, "missing": sum(1 for entry in report if entry["status"] != "present")}
+
+@api_router.post("/admin/indexes/apply")
+async def apply_indexes(request: Request):
+    """Create any missing registry indexes"""
+    await require_admin(request)
+    report = await provision_indexes()
+    return {"indexes": report, "failed": sum(1 for entry in report if entry["status"] == "failed")}
+
+# =============== HTTP CACHING ===============
+
+# Read-mostly endpoints: responses are cached as bytes per worker, tagged with a
+# strong ETag and sent with Cache-Control so browsers and CDNs can revalidate
+HTTP_STATIC_CACHE_CONTROL = "public, max-age=3600, stale-while-revalidate=86400"
+HTTP_CACHE_RULES = {
+    "/api/airlines": {"cache_control": HTTP_STATIC_CACHE_CONTROL, "ttl": 3600},
+    "/api/popular-routes": {"cache_control": HTTP_STATIC_CACHE_CONTROL, "ttl": 3600},
+    "/api/popular-destinations": {"cache_control": HTTP_STATIC_CACHE_CONTROL, "ttl": 3600},
+    "/api/destinations/featured": {"cache_control": HTTP_STATIC_CACHE_CONTROL, "ttl": 3600},
+    "/api/rewards/tiers": {"cache_control": HTTP_STATIC_CACHE_CONTROL, "ttl": 3600},
+    "/api/settings/public": {"cache_control": "public, max-age=60", "ttl": 60,
+                             "version": lambda: public_settings_state["version"]},
+    "/api/ads": {"cache_control": "public, max-age=60", "ttl": 60},
+}
+http_response_caches = {
+    path: ResultCache(f"http:{path}", 64, rule["ttl"], cacheable=lambda response: response["status"] == 200)
+    for path, rule in HTTP_CACHE_RULES.items()
+}
+
+def invalidate_http_cache(path: str):
+    http_response_caches[path].invalidate()
+
+def http_cache_is_fresh(request_headers: Headers, entry: dict) -> bool:
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or entry["etag"] in tags or f"W/{entry['etag']}" in tags
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(parsedate_to_datetime(if_modified_since).timestamp()) >= int(entry["stored_at"])
+        except (TypeError, ValueError):
+            return False
+    return False
+
+class HTTPCacheMiddleware:
+    """Serve cached bytes with ETag/Last-Modified and answer conditional GETs with 304"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        rule = HTTP_CACHE_RULES.get(scope["path"]) if scope["type"] == "http" else None
+        if rule is None or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        
+        async def render():
+            response = {"status": 500, "headers": [], "body": b""}
+            
+            async def capture(message):
+                if message["type"] == "http.response.start":
+                    response["status"] = message["status"]
+                    response["headers"] = [
+                        (name, value) for name, value in message.get("headers", [])
+                        if name.lower() != b"content-length"
+                    ]
+                elif message["type"] == "http.response.body":
+                    response["body"] += message.get("body", b"")
+            
+            await self.app(scope, receive, capture)
+            response["etag"] = f'"{hashlib.blake2b(response["body"], digest_size=16).hexdigest()}"'
+            response["stored_at"] = time.time()
+            return response
+        
+        version = rule["version"]() if "version" in rule else None
+        key = f"{version}|{scope['path']}?{scope.get('query_string', b'').decode('latin-1')}"
+        entry = await http_response_caches[scope["path"]].get_or_fetch(key, render)
+        if entry["status"] != 200:
+            headers = entry["headers"] + [(b"content-length", str(len(entry["body"])).encode())]
+            await send({"type": "http.response.start", "status": entry["status"], "headers": headers})
+            await send({"type": "http.response.body", "body": entry["body"]})
+            return
+        
+        cache_headers = [
+            (b"etag", entry["etag"].encode()),
+            (b"last-modified", formatdate(entry["stored_at"], usegmt=True).encode()),
+            (b"cache-control", rule["cache_control"].encode()),
+        ]
+        if http_cache_is_fresh(Headers(scope=scope), entry):
+            await send({"type": "http.response.start", "status": 304, "headers": cache_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        
+        headers = entry["headers"] + cache_headers + [(b"content-length", str(len(entry["body"])).encode())]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": entry["body"]})
+
+app.add_middleware(HTTPCacheMiddleware)
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -6739,7 +8905,12 @@ app.include_router(api_router)
 @app.get("/health")
 async def health_check():
     """Health check endpoint for Kubernetes liveness and readiness probes"""
-    return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
+    # An open circuit has a local fallback, so it is reported but never fails the probe
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "circuits": {name: breaker.state for name, breaker in circuit_breakers.items()}
+    }
 
 app.add_middleware(
     CORSMiddleware,
@@ -6749,6 +8920,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Long-running loops started with the app, cancelled on shutdown
+app_background_tasks: set = set()
+
+@app.on_event("startup")
+async def startup_tasks():
+    if INDEX_PROVISIONING != "off":
+        try:
+            await provision_indexes(dry_run=INDEX_PROVISIONING == "dry_run")
+        except Exception as e:
+            logger.error(f"Failed to provision indexes: {e}")
+    try:
+        await seed_catalogs()
+    except Exception as e:
+        logger.error(f"Failed to seed catalogs: {e}")
+    app_background_tasks.add(asyncio.create_task(seat_hold_sweeper()))
+    app_background_tasks.add(asyncio.create_task(public_settings_watcher()))
+    if STATELESS_SESSIONS:
+        try:
+            await load_session_revocations(full=True)
+        except Exception as e:
+            logger.error(f"Failed to load session revocations: {e}")
+        app_background_tasks.add(asyncio.create_task(session_revocation_sync()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in app_background_tasks:
+        task.cancel()
+    amadeus_adapter.shutdown()
+    password_hasher.shutdown()
+    await http_clients.aclose()
     client.close()
@@ -0,0 +1,83 @@
+"""Fixtures for the backend unit tests.
+
+Tests import backend/server.py directly. Database-backed tests run against
+MongoDB at MONGO_URL when it is reachable, otherwise against mongomock.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "fostertours")
+
+import bson  # noqa: E402
+from motor import motor_asyncio  # noqa: E402
+from pymongo import MongoClient  # noqa: E402
+
+import server  # noqa: E402
+
+
+def register_mongomock_bitwise():
+    """mongomock has no $bitsAllSet/$bitsAllClear queries or $bit updates, which the seat inventory uses"""
+    import mongomock.collection
+    import mongomock.filtering
+
+    operators = mongomock.filtering._filterer_inst._operator_map
+    operators["$bitsAllSet"] = lambda value, bits: isinstance(value, int) and all((value >> b) & 1 for b in bits)
+    operators["$bitsAllClear"] = lambda value, bits: isinstance(value, int) and not any((value >> b) & 1 for b in bits)
+
+    apply_update = mongomock.collection.Collection._apply_update_document
+
+    def apply_with_bit(self, existing, spec, document, was_insert):
+        document = dict(document)
+        for path, ops in document.pop("$bit", {}).items():
+            *parents, leaf = path.split(".")
+            node = existing
+            for part in parents:
+                node = node.setdefault(part, {})
+            value = int(node.get(leaf, 0))
+            for op, operand in ops.items():
+                value = {"and": value & operand, "or": value | operand, "xor": value ^ operand}[op]
+            node[leaf] = bson.Int64(value)
+        if document:
+            return apply_update(self, existing, spec, document, was_insert)
+
+    mongomock.collection.Collection._apply_update_document = apply_with_bit
+
+
+@pytest.fixture(scope="session")
+def mongo_url():
+    """MONGO_URL if a server answers there, else None after preparing mongomock"""
+    url = os.environ["MONGO_URL"]
+    try:
+        MongoClient(url, serverSelectionTimeoutMS=1000).admin.command("ping")
+        return url
+    except Exception:
+        pytest.importorskip("mongomock_motor")
+        register_mongomock_bitwise()
+        return None
+
+
+@pytest.fixture
+def run_db(monkeypatch, mongo_url):
+    """Run an async test body against a throwaway database swapped in for server.db"""
+    def run(body):
+        async def main():
+            if mongo_url:
+                client = motor_asyncio.AsyncIOMotorClient(mongo_url)
+            else:
+                import mongomock_motor
+                client = mongomock_motor.AsyncMongoMockClient()
+            name = f"{os.environ['DB_NAME']}_test_{uuid.uuid4().hex[:8]}"
+            monkeypatch.setattr(server, "db", client[name])
+            try:
+                return await body()
+            finally:
+                await client.drop_database(name)
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    monkeypatch.setattr(server, "CIRCUIT_MIN_CALLS", 4)
+    monkeypatch.setattr(server, "CIRCUIT_FAILURE_RATE", 0.5)
+    monkeypatch.setattr(server, "CIRCUIT_OPEN_SECONDS", 30)
+    return server.CircuitBreaker("test", min_timeout=0.5, max_timeout=10.0)
+
+
+def trip(breaker):
+    for _ in range(server.CIRCUIT_MIN_CALLS):
+        breaker.record(False, 0.1)
+
+
+def test_opens_once_error_rate_crosses_threshold(breaker):
+    breaker.record(True, 0.1)
+    breaker.record(True, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == "closed"
+    breaker.record(False, 0.1)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_open_breaker_fails_fast_without_calling(breaker):
+    trip(breaker)
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+
+    with pytest.raises(server.CircuitOpenError):
+        asyncio.run(breaker.run(upstream))
+    assert not calls
+
+
+def test_half_open_admits_one_probe(breaker, monkeypatch):
+    trip(breaker)
+    monkeypatch.setattr(server, "CIRCUIT_OPEN_SECONDS", 0)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes(breaker, monkeypatch):
+    trip(breaker)
+    monkeypatch.setattr(server, "CIRCUIT_OPEN_SECONDS", 0)
+    assert breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state == "closed"
+    # The window restarts from the probe
+    assert breaker.stats()["window_calls"] == 1
+
+
+def test_failed_probe_reopens(breaker, monkeypatch):
+    trip(breaker)
+    monkeypatch.setattr(server, "CIRCUIT_OPEN_SECONDS", 0)
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == "open"
+    assert breaker.stats()["trips"] == 2
+
+
+def test_timeout_follows_p95_within_bounds(breaker):
+    assert breaker.timeout() == breaker.max_timeout
+    for _ in range(server.CIRCUIT_MIN_CALLS):
+        breaker.record(True, 1.0)
+    assert breaker.timeout() == pytest.approx(server.CIRCUIT_TIMEOUT_MULTIPLIER * 1.0)
+    for _ in range(50):
+        breaker.record(True, 0.01)
+    assert breaker.timeout() == breaker.min_timeout
+
+
+def test_timeouts_count_as_failures(breaker):
+    async def slow():
+        await asyncio.sleep(1)
+
+    for _ in range(server.CIRCUIT_MIN_CALLS):
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(breaker.run(slow, timeout=0.01))
+    assert breaker.state == "open"
+
+
+def test_chatbot_turn_is_one_sample(monkeypatch):
+    """Replays and the final send share one breaker call, so a failed replay counts once"""
+    from fastapi.testclient import TestClient
+
+    breaker = server.CircuitBreaker("llm", min_timeout=0.5, max_timeout=10.0)
+    monkeypatch.setattr(server, "llm_breaker", breaker)
+    monkeypatch.setattr(server, "chatbot_sessions", {})
+    monkeypatch.setenv("EMERGENT_LLM_KEY", "test-key")
+    sent = []
+
+    class FailingChat:
+        def __init__(self, **kwargs):
+            pass
+
+        def with_model(self, *args):
+            return self
+
+        async def send_message(self, message):
+            sent.append(message.text)
+            raise RuntimeError("LLM unavailable")
+
+    monkeypatch.setattr("emergentintegrations.llm.chat.LlmChat", FailingChat)
+    client = TestClient(server.app)
+    for text in ("first", "second", "third"):
+        response = client.post("/api/chatbot/message", json={"message": text, "session_id": "s1"})
+        assert "WhatsApp" in response.json()["response"]
+    # Each turn stopped at its first failed send and was recorded once
+    assert sent == ["first", "first", "first"]
+    assert breaker.stats()["window_calls"] == 3
@@ -0,0 +1,50 @@
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+import server
+
+
+def search(**kwargs) -> server.FlightSearch:
+    return server.FlightSearch(origin="LOS", destination="LHR", departure_date="2027-03-01", **kwargs)
+
+
+def flights():
+    return server.generate_mock_flights("LOS", "LHR", "2027-03-01", 1)
+
+
+def test_pages_cover_every_flight_once_in_order():
+    all_flights = flights()
+    seen, cursor = [], None
+    while True:
+        page = server.page_flights(all_flights, search(sort_by="price", limit=3, cursor=cursor))
+        seen.extend(page["flights"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(f["flight_id"] for f in seen) == sorted(f["flight_id"] for f in all_flights)
+    assert [f["price"] for f in seen] == sorted(f["price"] for f in seen)
+
+
+def test_descending_order():
+    page = server.page_flights(flights(), search(sort_by="duration", sort_order="desc", limit=5))
+    durations = [f["duration_minutes"] for f in page["flights"]]
+    assert durations == sorted(durations, reverse=True)
+
+
+@pytest.mark.parametrize("kwargs", [{"limit": 0}, {"limit": -2}, {"limit": server.FLIGHT_PAGE_MAX + 1}, {"sort_order": "down"}])
+def test_invalid_page_parameters_are_rejected(kwargs):
+    with pytest.raises(ValidationError):
+        search(**kwargs)
+
+
+@pytest.mark.parametrize("cursor", [
+    {"sort": ["price", "desc"], "after": [100, "fl_x"]},
+    {"sort": ["price", "asc"], "after": ["x", 1]},
+    {"sort": ["price", "asc"], "after": [True, "fl_x"]},
+    {"sort": ["price", "asc"], "after": [100]}
+])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        server.page_flights(flights(), search(sort_by="price", limit=3, cursor=server.encode_cursor(cursor)))
+    assert error.value.status_code == 400
@@ -0,0 +1,89 @@
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+from starlette.requests import Request
+
+import server
+
+ROOM = "Standard Room"
+
+
+def test_stay_nights_split_across_months():
+    assert server.stay_nights_by_month("2027-01-30", "2027-02-02") == {"2027-01": [29, 30], "2027-02": [0]}
+
+
+def test_rooms_must_be_positive():
+    with pytest.raises(ValidationError):
+        server.HotelAvailabilityRequest(hotel_ids=["h1"], check_in="2027-01-01", check_out="2027-01-02", rooms=0)
+    with pytest.raises(ValidationError):
+        server.HotelSearch(location="Lagos", check_in="2027-01-01", check_out="2027-01-02", rooms=-3)
+
+
+def test_reserve_and_release(run_db):
+    capacity = server.hotel_room_capacity(ROOM)
+
+    async def body():
+        assert await server.reserve_hotel_rooms("h1", ROOM, "2027-01-30", "2027-02-02", 2)
+        availability = await server.get_hotel_availability(["h1"], "2027-01-30", "2027-02-02", 1, [ROOM])
+        assert availability["h1"]["room_types"][ROOM] == capacity - 2
+        await server.release_hotel_rooms("h1", ROOM, "2027-01-30", "2027-02-02", 2)
+        availability = await server.get_hotel_availability(["h1"], "2027-01-30", "2027-02-02", 1, [ROOM])
+        assert availability["h1"]["room_types"][ROOM] == capacity
+    run_db(body)
+
+
+def test_full_night_rolls_back_the_whole_stay(run_db):
+    capacity = server.hotel_room_capacity(ROOM)
+
+    async def body():
+        # Fill February 1st, then ask for a stay that spans it
+        assert await server.reserve_hotel_rooms("h1", ROOM, "2027-02-01", "2027-02-02", capacity)
+        assert not await server.reserve_hotel_rooms("h1", ROOM, "2027-01-30", "2027-02-02", 1)
+        availability = await server.get_hotel_availability(["h1"], "2027-01-30", "2027-02-01", 1, [ROOM])
+        assert availability["h1"]["room_types"][ROOM] == capacity
+        assert not await server.reserve_hotel_rooms("h1", ROOM, "2027-02-01", "2027-02-02", 1)
+    run_db(body)
+
+
+def test_every_listed_room_type_has_a_capacity():
+    listed = [tier["type"] for tier in server.HOTEL_ROOM_TIERS] + [room["type"] for room in server.FEATURED_HOTEL_ROOM_TYPES]
+    assert all(room_type in server.HOTEL_DEFAULT_ROOM_CAPACITY for room_type in listed)
+    assert server.hotel_room_capacity("Presidential Suite") == 2
+
+
+def booking_request(user_id: str) -> Request:
+    token = server.create_token(user_id, f"{user_id}@example.com")
+    return Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+
+def hotel_booking(rooms) -> server.BookingCreate:
+    return server.BookingCreate(
+        booking_type="hotel", item_id="h1", total_amount=100, payment_method="wallet",
+        item_details={"room_type": "Presidential Suite", "check_in": "2027-01-01", "check_out": "2027-01-03", "rooms": rooms}
+    )
+
+
+def test_booking_rejects_bad_room_counts(run_db):
+    async def body():
+        await server.db.users.insert_one({"user_id": "u1", "email": "u1@example.com", "name": "U"})
+        for rooms in (-3, 0, "two", True):
+            with pytest.raises(HTTPException) as error:
+                await server.create_booking(booking_request("u1"), hotel_booking(rooms))
+            assert error.value.status_code == 400
+        assert await server.db.hotel_inventory.count_documents({}) == 0
+    run_db(body)
+
+
+def test_failed_booking_insert_releases_rooms(run_db, monkeypatch):
+    async def body():
+        await server.db.users.insert_one({"user_id": "u1", "email": "u1@example.com", "name": "U"})
+
+        async def failing_insert(*args, **kwargs):
+            raise RuntimeError("write failed")
+
+        monkeypatch.setattr(type(server.db.bookings), "insert_one", failing_insert)
+        with pytest.raises(RuntimeError):
+            await server.create_booking(booking_request("u1"), hotel_booking(2))
+        availability = await server.get_hotel_availability(["h1"], "2027-01-01", "2027-01-03", 1, ["Presidential Suite"])
+        assert availability["h1"]["room_types"]["Presidential Suite"] == 2
+    run_db(body)
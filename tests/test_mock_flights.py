@@ -0,0 +1,20 @@
+import server
+
+
+def test_same_search_gives_same_flights():
+    first = server.generate_mock_flights("LOS", "LHR", "2027-03-01", 1)
+    second = server.generate_mock_flights("los", "lhr", "2027-03-01", 1)
+    assert first == second
+
+
+def test_flight_ids_differ_across_routes_and_dates():
+    ids = [
+        {f["flight_id"] for f in server.generate_mock_flights(origin, destination, date, 1)}
+        for origin, destination, date in [("LOS", "LHR", "2027-03-01"), ("LOS", "JFK", "2027-03-01"), ("LOS", "LHR", "2027-03-02")]
+    ]
+    assert len(set.union(*ids)) == sum(len(group) for group in ids)
+
+
+def test_flight_ids_carry_the_full_search_seed():
+    seed = f"{server.mock_search_seed('LOS', 'LHR', '2027-03-01'):016x}"
+    assert all(f["flight_id"].startswith(f"fl_{seed}") for f in server.generate_mock_flights("LOS", "LHR", "2027-03-01", 1))
@@ -0,0 +1,13 @@
+import server
+
+
+def test_hotel_ids_are_stable_and_64_bit():
+    first = server.generate_mock_hotels("Lagos", "2027-01-01", "2027-01-03")
+    second = server.generate_mock_hotels("lagos", "2027-02-01", "2027-02-03")
+    assert {h["hotel_id"] for h in first} == {h["hotel_id"] for h in second}
+    assert all(len(h["hotel_id"]) == len("htl_") + 16 for h in first)
+
+
+def test_hotel_ids_differ_across_locations():
+    ids = [{h["hotel_id"] for h in server.generate_mock_hotels(location)} for location in ("Lagos", "London", "Dubai")]
+    assert len(set.union(*ids)) == sum(len(group) for group in ids)
@@ -0,0 +1,27 @@
+import server
+
+
+def test_first_write_seeds_from_existing_rows(run_db):
+    async def body():
+        # Engagement from before the counters existed
+        await server.db.post_likes.insert_many([{"post_id": "p1", "user_id": f"u{i}"} for i in range(3)])
+        await server.db.post_comments.insert_one({"post_id": "p1", "comment_id": "c1"})
+        assert await server.get_post_stats("p1") == {"likes_count": 3, "shares_count": 0, "comments_count": 1}
+
+        # The share row is written first, as in the share route, then counted exactly once
+        await server.db.post_shares.insert_one({"post_id": "p1", "user_id": "u0"})
+        stats = await server.bump_post_stat("p1", "shares_count", 1)
+        assert stats == {"likes_count": 3, "shares_count": 1, "comments_count": 1}
+
+        await server.db.post_likes.insert_one({"post_id": "p1", "user_id": "u9"})
+        assert (await server.bump_post_stat("p1", "likes_count", 1))["likes_count"] == 4
+    run_db(body)
+
+
+def test_first_write_can_be_a_removal(run_db):
+    async def body():
+        await server.db.post_likes.insert_many([{"post_id": "p1", "user_id": f"u{i}"} for i in range(2)])
+        await server.db.post_likes.delete_one({"post_id": "p1", "user_id": "u0"})
+        assert (await server.bump_post_stat("p1", "likes_count", -1))["likes_count"] == 1
+    run_db(body)
+
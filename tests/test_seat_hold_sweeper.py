@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+import server
+
+
+def test_sweep_releases_only_expired_holds(run_db):
+    async def body():
+        await server.get_seat_inventory("FL1")
+        await server.hold_seats("FL1", [3, 4])
+        now = datetime.now(timezone.utc)
+        await server.db.seat_selections.insert_many([
+            {"selection_id": "expired", "flight_id": "FL1", "seats": ["1D"], "seat_positions": [3],
+             "status": "pending", "expires_at": (now - timedelta(minutes=1)).isoformat()},
+            {"selection_id": "live", "flight_id": "FL1", "seats": ["1E"], "seat_positions": [4],
+             "status": "pending", "expires_at": (now + timedelta(minutes=10)).isoformat()},
+            # Legacy selection with a seat that isn't on the aircraft
+            {"selection_id": "legacy", "flight_id": "FL1", "seats": ["99Z"],
+             "status": "pending", "expires_at": (now - timedelta(minutes=1)).isoformat()}
+        ])
+        assert await server.release_expired_seat_holds("FL1") == 1
+        inventory = await server.get_seat_inventory("FL1")
+        assert not server.seat_is_set(inventory, "held", 3)
+        assert server.seat_is_set(inventory, "held", 4)
+        statuses = {s["selection_id"]: s["status"] async for s in server.db.seat_selections.find({}, {"_id": 0})}
+        assert statuses == {"expired": "expired", "live": "pending", "legacy": "expired"}
+    run_db(body)
+
+
+def test_sweep_after_a_crash_does_not_free_seats_twice(run_db):
+    async def body():
+        await server.get_seat_inventory("FL1")
+        await server.hold_seats("FL1", [5])
+        expired = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+        selection = {"selection_id": "s1", "flight_id": "FL1", "seats": ["1F"], "seat_positions": [5],
+                     "status": "pending", "expires_at": expired}
+        await server.db.seat_selections.insert_one(dict(selection))
+
+        # The sweeper freed the seat and died before marking the selection expired
+        assert await server.release_selection_seats(selection) == 1
+        # Someone else takes the seat in the meantime
+        assert await server.hold_seats("FL1", [5])
+
+        assert await server.release_expired_seat_holds("FL1") == 0
+        inventory = await server.get_seat_inventory("FL1")
+        assert server.seat_is_set(inventory, "held", 5)
+        assert (await server.db.seat_selections.find_one({"selection_id": "s1"}))["status"] == "expired"
+    run_db(body)
@@ -0,0 +1,37 @@
+import server
+
+
+def test_seat_word_bits_splits_positions_by_word():
+    assert server.seat_word_bits([0, 31, 32, 70]) == {0: [0, 31], 1: [0], 2: [6]}
+
+
+def test_seat_position_unknown_seat_is_none():
+    assert server.seat_position(server.DEFAULT_AIRCRAFT_TYPE, "1A") == 0
+    assert server.seat_position(server.DEFAULT_AIRCRAFT_TYPE, "99Z") is None
+
+
+def test_hold_is_all_or_nothing(run_db):
+    async def body():
+        await server.get_seat_inventory("FL1")
+        assert await server.hold_seats("FL1", [0, 1])
+        # 1 is already held, so 2 must not be taken either
+        assert not await server.hold_seats("FL1", [1, 2])
+        inventory = await server.get_seat_inventory("FL1")
+        assert [server.seat_is_set(inventory, "held", p) for p in (0, 1, 2)] == [True, True, False]
+    run_db(body)
+
+
+def test_release_and_book(run_db):
+    async def body():
+        await server.get_seat_inventory("FL1")
+        await server.hold_seats("FL1", [0, 40])
+        await server.release_seats("FL1", [40])
+        assert await server.book_held_seats("FL1", [0])
+        # A seat that is no longer held cannot be booked
+        assert not await server.book_held_seats("FL1", [40])
+        inventory = await server.get_seat_inventory("FL1")
+        assert server.seat_is_set(inventory, "booked", 0)
+        assert not server.seat_is_set(inventory, "held", 0)
+        assert not server.seat_is_set(inventory, "held", 40)
+        assert not await server.hold_seats("FL1", [0])
+    run_db(body)